@@ -8,6 +8,7 @@ from .composite import composite
 from .conjugate import conjugate
 from .container import container
 from .simple import simple_problem
+from .telemetry import get_clock, debug_sink, ADMM_dtype
 
 #TODO: this is only written for linear compositions, need to add affine
 
@@ -61,14 +62,28 @@ class admm_problem(object):
         comp.coefs = self.container.coefs
         self.beta_solver = FISTA(comp)
 
-    def fit(self, tol = 1e-6, max_its = 500, debug=False):
+    def fit(self, tol = 1e-6, max_its = 500, debug=False, telemetry=None):
+        """
+        Run ADMM until the scaled primal and dual residuals
+        are below tol.
+
+        If telemetry is not None, it is called once per iteration with
+        a tuple with fields given by regreg.telemetry.ADMM_dtype.
+        If debug, the records are printed.
+        """
         coef_change = 1.
         itercount = 0
         mu = 10.
+        telemetry = debug_sink(telemetry, ADMM_dtype, debug)
+        clock = get_clock(telemetry)
+        start_time = clock()
         while coef_change > tol and itercount <= max_its:
             old_beta = self.beta.copy()
+            tic = clock()
             self.solve_beta()
+            toc = clock()
             self.solve_z()
+            beta_time, z_time = toc - tic, clock() - toc
             self.solve_u()
             #coef_change = np.linalg.norm(self.beta - old_beta) / np.linalg.norm(self.beta)
             coef_change = (self.residual_norm/self.p) + (self.dual_residual_norm/self.total_n)
@@ -80,9 +95,11 @@ class admm_problem(object):
                 self.rho /= 2.
                 for u in self.us:
                     u *= 2.
+            if telemetry is not None:
+                telemetry((itercount, coef_change, self.rho,
+                           self.residual_norm, self.dual_residual_norm,
+                           beta_time, z_time, clock() - start_time))
             itercount += 1
-            if debug:
-                print itercount, coef_change, self.rho
 
     def solve_beta(self, tol=1e-6):
         self.beta_solver.fit(tol=tol)
@@ -171,9 +188,6 @@ class node_problem(composite):
         else:
             self.coefs = initial
 
-        print ('coefs', self.coefs.shape, self.atom.primal_shape,
-               self.atom.dual_shape, self.atom)
-        
         self.simple_problem = simple_problem(self,
                                              self.atom)
         self.coefs = self.simple_problem.coefs
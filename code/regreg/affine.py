@@ -1,8 +1,14 @@
 from operator import add, mul
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+import weakref
+
 import numpy as np
 from scipy import sparse
 import warnings
 
+from .precision import cast
+
 def broadcast_first(a, b, op):
     """ apply binary operation `op`, broadcast `a` over axis 1 if necessary
 
@@ -65,8 +71,8 @@ class affine_transform(object):
             #Convert sparse offset to an array
             self.affine_offset = affine_offset.toarray()
         else:
-            self.affine_offset = affine_offset
-        self.linear_operator = linear_operator
+            self.affine_offset = cast(affine_offset)
+        linear_operator = self.linear_operator = cast(linear_operator)
 
         if linear_operator is None:
             self.noneD = True
@@ -217,7 +223,7 @@ class affine_transform(object):
             return broadcast_first(self.affine_offset, v, add)
         return v
 
-    def adjoint_map(self, u, copy=True):
+    def adjoint_map(self, u, copy=True, out=None):
         r"""Apply transpose of linear component to `u`
 
         Return :math:`D^Tu`
@@ -230,6 +236,9 @@ class affine_transform(object):
         copy : {True, False}, optional
             If True, in situations where return is identical to `u`, ensure
             returned value is a copy.
+        out : None or ndarray, optional
+            If not None, store the result in `out`. For a dense
+            linear operator the product is computed directly into `out`.
 
         Returns
         -------
@@ -241,6 +250,14 @@ class affine_transform(object):
         This routine is currently a matrix multiplication, but could
         also call FFTs if D is a DFT matrix, in a subclass.
         """
+        if out is not None:
+            if (not (self.noneD or self.sparseD or self.diagD or self.affineD)
+                and out.flags.c_contiguous
+                and out.dtype == self.linear_operator.dtype == u.dtype
+                and out.dtype in [np.float32, np.float64]):
+                return np.dot(self.linear_operator.T, u, out=out)
+            out[:] = self.adjoint_map(u, copy=False)
+            return out
         if self.noneD:
             # this might have to be a copy but we only multiply by D.T when
             # computing gradient -- this currently doesn't happen in seminorm or
@@ -376,7 +393,7 @@ class normalize(object):
     '''
 
     def __init__(self, M, center=True, scale=True, value=1, inplace=False,
-                 intercept_column=None):
+                 intercept_column=None, col_stds=None):
         '''
         Parameters
         ----------
@@ -402,6 +419,10 @@ class normalize(object):
             Which column is the intercept if any? This column is
             not centered or scaled.
 
+        col_stds : [ndarray,None]
+            Standard deviations of the columns of M (dividing by n),
+            centered if center==True. Computed from M if None.
+
         '''
         n, p = M.shape
         self.value = value
@@ -418,6 +439,11 @@ class normalize(object):
         if value != 1 and not scale:
             raise ValueError('setting value when not being asked to scale')
 
+        if col_stds is not None:
+            if not scale:
+                raise ValueError('col_stds given when not being asked to scale')
+            col_stds = np.asarray(col_stds, np.float).reshape(-1) / np.sqrt(self.value)
+
         # we divide by n instead of n-1 in the scalings
         # so that np.std is constant
         
@@ -425,18 +451,21 @@ class normalize(object):
             if inplace and self.sparseM:
                 raise ValueError('resulting matrix will not be sparse if centering performed inplace')
 
-            if not self.sparseM:
-                col_means = M.mean(0)
-            else:
-                tmp = M.copy()
-                col_means = np.asarray(tmp.mean(0)).reshape(-1)
-                tmp.data **= 2
+            if col_stds is None or inplace:
+                if not self.sparseM:
+                    col_means = M.mean(0)
+                else:
+                    tmp = M.copy()
+                    col_means = np.asarray(tmp.mean(0)).reshape(-1)
+                    tmp.data **= 2
 
-            if self.intercept_column is not None:
-                col_means[self.intercept_column] = 0
+                if self.intercept_column is not None:
+                    col_means[self.intercept_column] = 0
 
             if self.scale:
-                if not self.sparseM:
+                if col_stds is not None:
+                    self.col_stds = col_stds
+                elif not self.sparseM:
                     self.col_stds = np.sqrt((np.sum(M**2,0) - n * col_means**2) / n) / np.sqrt(self.value)
                 else:
                     self.col_stds = np.sqrt((np.asarray(tmp.sum(0)).reshape(-1) - n * col_means**2) / n) / np.sqrt(self.value)
@@ -452,12 +481,14 @@ class normalize(object):
                     self.col_stds = None
                     self.scale = False
         elif self.scale:
-            if not self.sparseM:
+            if col_stds is not None:
+                self.col_stds = col_stds
+            elif not self.sparseM:
                 self.col_stds = np.sqrt(np.sum(M**2,0) / n) / np.sqrt(self.value)
             else:
                 tmp = M.copy()
                 tmp.data **= 2
-                self.col_stds = np.sqrt((tmp.sum(0)) / n) / np.sqrt(self.value)
+                self.col_stds = np.sqrt(np.asarray(tmp.sum(0)).reshape(-1) / n) / np.sqrt(self.value)
             if self.intercept_column is not None:
                 self.col_stds[self.intercept_column] = 1. / np.sqrt(self.value)
             if inplace:
@@ -534,6 +565,60 @@ class normalize(object):
             v[self.intercept_column] = u_mean * u.shape[0]
         return v
 
+    def adjoint_map_columns(self, u, start, stop):
+        """
+        Entries start:stop of self.adjoint_map(u), for a 1D u,
+        using only those columns of self.M.
+        """
+        if self.center:
+            u_mean = u.mean()
+            u = u - u_mean
+        if self.sparseM:
+            if not sparse.isspmatrix_csc(self.M):
+                # converted once, rather than on each call
+                self.M = self.M.tocsc()
+            # the transpose of a CSC matrix is CSR, without a copy
+            v = self.M.T[start:stop] * u
+        else:
+            v = np.dot(u, self.M[:,start:stop])
+        if self.scale:
+            v /= self.col_stds[start:stop]
+        if (self.center and self.intercept_column is not None
+            and start <= self.intercept_column < stop):
+            v[self.intercept_column - start] = u_mean * u.shape[0]
+        return v
+
+    def gram_columns(self, columns):
+        """
+        Columns of the Gram matrix of the normalized design, an
+        ndarray with one column for each index in columns. They
+        are computed from the products of the columns of self.M,
+        without centering or scaling M, by applying the centering
+        and scaling to these products.
+        """
+        n = self.dual_shape[0]
+        if self.sparseM:
+            if not sparse.isspmatrix_csc(self.M):
+                # converted once, rather than on each call
+                self.M = self.M.tocsc()
+            G = np.asarray((self.M.T * self.M[:,columns]).todense())
+        else:
+            G = np.dot(self.M.T, self.M[:,columns])
+        if self.center:
+            if not hasattr(self, "_col_sums"):
+                self._col_sums = np.asarray(self.M.sum(0)).reshape(-1)
+            sums = self._col_sums
+            # the intercept column is not centered
+            means = sums / n
+            if self.intercept_column is not None:
+                means[self.intercept_column] = 0
+            G = G - (np.multiply.outer(sums, means[columns]) +
+                     np.multiply.outer(means, sums[columns]) -
+                     n * np.multiply.outer(means, means[columns]))
+        if self.scale:
+            G /= np.multiply.outer(self.col_stds, self.col_stds[columns])
+        return G
+
     def slice_columns(self, index_obj):
         """
 
@@ -589,10 +674,10 @@ class normalize(object):
         # explicitly assumes there is no intercept column
         new_obj.intercept_column = None
         new_obj.value = self.value
-        try:
-            new_obj.M = self.M[:,index_obj]
-        except TypeError: # sparse matrix is of wrong format
-            new_obj.M = self.M.tolil()[:,index_obj].tocsc()
+        if self.sparseM and not sparse.isspmatrix_csc(self.M):
+            # converted once, rather than on each call
+            self.M = self.M.tocsc()
+        new_obj.M = self.M[:,index_obj]
 
         new_obj.primal_shape = (new_obj.M.shape[1],)
         new_obj.dual_shape = (self.M.shape[0],)
@@ -602,7 +687,307 @@ class normalize(object):
             new_obj.col_stds = self.col_stds[index_obj]
         new_obj.affine_offset = self.affine_offset
         return new_obj
-        
+
+class mmap_normalize(object):
+
+    '''
+    A normalized design, as in normalize, for a dense M too large
+    to be held in memory, e.g. an np.memmap. M is only read a block
+    of block_size columns at a time, so the design can be stored
+    in Fortran order for each block to be contiguous on disk.
+
+    The statistics of the columns are computed in one pass over the
+    blocks. Constant columns, which are zero once centered, are given
+    col_stds of 1 rather than 0, so no columns need to be dropped.
+    '''
+
+    def __init__(self, M, center=True, scale=True, value=1,
+                 intercept=False, col_stds=None, block_size=1000):
+        '''
+        Parameters
+        ----------
+        M : ndarray
+            The matrix to be normalized, e.g. an np.memmap. It is
+            not modified.
+
+        center : bool
+            Center the columns?
+
+        scale : bool
+            Scale the columns?
+
+        value : float
+            Set the std of the columns to be value.
+
+        intercept : bool
+            If True, the design has a column of ones, which is not
+            stored, before the columns of M. It is not centered or
+            scaled and self.intercept_column is 0.
+
+        col_stds : [ndarray,None]
+            Standard deviations of the columns of M (dividing by n),
+            centered if center==True. Computed from M if None.
+
+        block_size : int
+            Number of columns of M read at a time.
+        '''
+        n, p = M.shape
+        if value != 1 and not scale:
+            raise ValueError('setting value when not being asked to scale')
+        if col_stds is not None and not scale:
+            raise ValueError('col_stds given when not being asked to scale')
+
+        self.M = M
+        self.value = value
+        self.center = center
+        self.scale = scale
+        self.block_size = block_size
+        self.sparseM = False
+        self.affine_offset = None
+        # the intercept, if any, is column 0 and the columns of M follow
+        self.intercept_column = 0 if intercept else None
+        self._offset = 1 if intercept else 0
+        self.dual_shape = (n,)
+        self.primal_shape = (p + self._offset,)
+
+        # sums of squares of the (centered) columns of M,
+        # in one pass over the blocks
+        sums2 = np.zeros(p)
+        for start, stop, block in self._blocks():
+            sums2[start:stop] = (block**2).sum(0)
+            if center:
+                sums2[start:stop] -= block.sum(0)**2 / n
+        sums2 = np.maximum(sums2, 0)
+
+        # the column of ones of the intercept is not centered
+        self._sums2 = np.hstack([[n], sums2]) if intercept else sums2
+        if scale:
+            if col_stds is None:
+                col_stds = np.sqrt(sums2 / n)
+            col_stds = np.asarray(col_stds, np.float).reshape(-1).copy()
+            col_stds[col_stds == 0] = 1
+            col_stds /= np.sqrt(value)
+            if intercept:
+                col_stds = np.hstack([1. / np.sqrt(value), col_stds])
+            self.col_stds = col_stds
+        else:
+            self.col_stds = np.ones(self.primal_shape)
+
+        # the intercept column is multiplied by this
+        self._intercept_scale = np.sqrt(value) if scale else 1.
+
+    def _blocks(self, start=0, stop=None):
+        """
+        Blocks of block_size columns of M, as (start, stop, block)
+        with block an ndarray holding M[:,start:stop].
+        """
+        if stop is None:
+            stop = self.M.shape[1]
+        for block_start in range(start, stop, self.block_size):
+            block_stop = min(block_start + self.block_size, stop)
+            yield (block_start, block_stop,
+                   np.asarray(self.M[:,block_start:block_stop], np.float))
+
+    def column_norms(self):
+        """
+        Euclidean norms of the columns of the normalized design.
+        """
+        norms = np.sqrt(self._sums2)
+        if self.scale:
+            norms = norms / self.col_stds
+        return norms
+
+    def linear_map(self, x):
+        if x.ndim not in [1, 2]:
+            raise ValueError('normalize only implemented for 1D and 2D inputs')
+        if self.intercept_column is not None:
+            x_intercept = x[0] * self._intercept_scale
+            x = x[1:]
+        if self.scale:
+            scale = self.col_stds[self._offset:]
+            if x.ndim == 1:
+                x = x / scale
+            else:
+                x = x / scale[:,np.newaxis]
+        v = np.zeros(self.dual_shape + x.shape[1:])
+        nonzero = x.reshape((x.shape[0], -1)).any(1)
+        for start in range(0, x.shape[0], self.block_size):
+            stop = min(start + self.block_size, x.shape[0])
+            # blocks with no nonzero coefficients are not read
+            if nonzero[start:stop].any():
+                v += np.dot(np.asarray(self.M[:,start:stop], np.float), x[start:stop])
+        if self.center:
+            v -= v.mean(0)
+        if self.intercept_column is not None:
+            v += x_intercept
+        return v
+
+    def affine_map(self, x):
+        return self.linear_map(x)
+
+    def offset_map(self, x):
+        return x
+
+    def adjoint_map(self, u):
+        return self.adjoint_map_columns(u, 0, self.primal_shape[0])
+
+    def adjoint_map_columns(self, u, start, stop):
+        """
+        Entries start:stop of self.adjoint_map(u), reading
+        only those columns of self.M.
+        """
+        if u.ndim not in [1, 2]:
+            raise ValueError('normalize only implemented for 1D and 2D inputs')
+        v = np.empty((stop - start,) + u.shape[1:])
+        u_sum = u.sum(0)
+        if self.center:
+            u = u - u.mean(0)
+        offset = self._offset
+        for block_start, block_stop, block in self._blocks(max(start - offset, 0),
+                                                           stop - offset):
+            v[block_start + offset - start:block_stop + offset - start] = np.dot(u.T, block).T
+        if self.scale:
+            scale = self.col_stds[start:stop]
+            if v.ndim == 1:
+                v /= scale
+            else:
+                v /= scale[:,np.newaxis]
+        if self.intercept_column is not None and start == 0:
+            v[0] = u_sum * self._intercept_scale
+        return v
+
+    def slice_columns(self, index_obj):
+        """
+        A normalize, held in memory, which agrees with self restricted
+        to the columns in index_obj, a slice, list or boolean array.
+        As for normalize.slice_columns, its intercept_column
+        is None and must be set by hand.
+        """
+        columns = np.arange(self.primal_shape[0])[index_obj]
+        if self.intercept_column is not None:
+            M_columns = columns[columns > 0] - 1
+        else:
+            M_columns = columns
+        M = np.asarray(self.M[:,M_columns], np.float)
+        if self.intercept_column is not None and columns.shape[0] and columns[0] == 0:
+            M = np.hstack([np.ones((M.shape[0], 1)), M])
+
+        new_obj = normalize.__new__(normalize)
+        new_obj.sparseM = False
+        new_obj.intercept_column = None
+        new_obj.value = self.value
+        new_obj.M = M
+        new_obj.primal_shape = (M.shape[1],)
+        new_obj.dual_shape = self.dual_shape
+        new_obj.scale = self.scale
+        new_obj.center = self.center
+        if self.scale:
+            new_obj.col_stds = self.col_stds[columns]
+        new_obj.affine_offset = None
+        return new_obj
+
+class parallel_transform(object):
+
+    '''
+    A linear transform for a scipy.sparse matrix or ndarray M whose
+    products are computed by a pool of threads. M is split into
+    blocks of rows, for linear_map, and blocks of columns, for
+    adjoint_map, with about the same number of nonzero entries, and
+    each thread writes the product of a block into its slice of the
+    output. The sparse products of scipy release the GIL, so the
+    blocks are multiplied concurrently.
+    '''
+
+    def __init__(self, M, threads=None, nblock=None):
+        '''
+        Parameters
+        ----------
+        M : ndarray or scipy.sparse
+            The matrix of the transform.
+
+        threads : int
+            Number of threads, the number of CPUs if None.
+
+        nblock : int
+            Number of blocks of rows and of columns, threads if None.
+        '''
+        if threads is None:
+            threads = cpu_count()
+        if nblock is None:
+            nblock = threads
+        self.threads = threads
+        self.nblock = nblock
+        self.M = M
+        self.dual_shape = (M.shape[0],)
+        self.primal_shape = (M.shape[1],)
+        self.affine_offset = None
+
+        if sparse.issparse(M):
+            # the rows of the transpose in CSR format are the columns of M
+            rows = M.tocsr()
+            columns = M.tocsc().T
+            self._row_blocks = self._split(rows, rows.indptr)
+            self._column_blocks = self._split(columns, columns.indptr)
+        else:
+            M = np.asarray(M, np.float)
+            self._row_blocks = self._split(M, np.arange(M.shape[0] + 1))
+            self._column_blocks = self._split(M.T, np.arange(M.shape[1] + 1))
+
+    def _split(self, M, indptr):
+        """
+        Blocks of rows of M with about the same number of nonzero
+        entries, as (start, stop, M[start:stop]), where indptr[i]
+        counts the entries before row i.
+        """
+        bounds = np.searchsorted(indptr, np.linspace(0, indptr[-1], self.nblock + 1))
+        bounds[0], bounds[-1] = 0, M.shape[0]
+        bounds = np.unique(bounds)
+        return [(start, stop, M[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    @property
+    def pool(self):
+        if not hasattr(self, "_pool"):
+            self._pool = ThreadPool(self.threads)
+        return self._pool
+
+    def close(self):
+        """
+        Stop the threads of the pool, if it was started.
+        """
+        if hasattr(self, "_pool"):
+            self._pool.close()
+            self._pool.join()
+            del(self._pool)
+
+    def _multiply(self, blocks, x, out):
+        def multiply_block(block):
+            start, stop, M = block
+            if sparse.issparse(M):
+                out[start:stop] = M * x
+            else:
+                np.dot(M, x, out=out[start:stop])
+        if self.threads > 1 and len(blocks) > 1:
+            self.pool.map(multiply_block, blocks)
+        else:
+            map(multiply_block, blocks)
+        return out
+
+    def linear_map(self, x):
+        x = np.ascontiguousarray(x, np.float)
+        return self._multiply(self._row_blocks, x,
+                              np.empty(self.dual_shape + x.shape[1:]))
+
+    def affine_map(self, x):
+        return self.linear_map(x)
+
+    def offset_map(self, x):
+        return x
+
+    def adjoint_map(self, u):
+        u = np.ascontiguousarray(u, np.float)
+        return self._multiply(self._column_blocks, u,
+                              np.empty(self.primal_shape + u.shape[1:]))
+
 class identity(object):
 
     def __init__(self, primal_shape):
@@ -767,28 +1152,119 @@ class hstack(object):
             result[g] = t.adjoint_map(u).reshape(-1)
         return result
 
-def power_L(transform, max_its=500,tol=1e-8, debug=False):
+def power_L(transform, max_its=500, tol=1e-8, debug=False,
+            bound=True, delta=1.e-6, bound_tol=0.05, cache=True):
     """
     Approximate the largest singular value (squared) of the linear part of
-    a transform using power iterations
-    
+    a transform, i.e. the Lipschitz constant of the gradient of
+    :math:`\|Xv\|^2_2/2`, with the Lanczos algorithm applied to :math:`X^TX`
+    (the block_krylov engine of regreg.factored_matrix with a block of size 1).
+
+    With bound=True (the default) the value returned is an upper bound
+    that holds with probability at least 1-delta over the random
+    starting vector: after k Lanczos steps on a p dimensional space
+    the largest Ritz value theta satisfies
+    theta >= (1 - eps) * L with eps = (log(1.648 * sqrt(p) / delta) / (2k-1))**2
+    (Kuczynski & Wozniakowski, 1992), so theta / (1 - eps) >= L. Iteration
+    stops when this bound is within a factor 1+bound_tol of theta, or
+    the Krylov space is exhausted, in which case theta is exact.
+    With bound=False, the largest Ritz value is returned
+    once its relative change is below tol.
+
+    Values are cached per transform, see lipschitz_cache, so calling this
+    again with the same transform does not recompute it. After modifying
+    a transform in place, call invalidate_lipschitz(transform).
+
     TODO: should this be the largest singular value instead (i.e. not squared?)
     """
-
-    transform = astransform(transform)
-    v = np.random.standard_normal(transform.primal_shape)
-    old_norm = 0.
-    norm = 1.
-    itercount = 0
-    while np.fabs(norm-old_norm)/norm > tol and itercount < max_its:
-        v = transform.adjoint_map(transform.linear_map(v))
-        old_norm = norm
-        norm = np.linalg.norm(v)
-        v /= norm
+    if cache:
+        key = (bound, delta, bound_tol)
+        value = _lipschitz_cache.get(transform, key)
+        if value is not None:
+            return value
+
+    # factored_matrix imports this module
+    from factored_matrix import block_krylov
+    linear = astransform(transform)
+    engine = block_krylov(linear, block_size=1)
+    p = engine._primal_size
+    theta = old_theta = 0.
+    for itercount in range(1, max_its+1):
+        theta = engine.ritz_values()[0]
         if debug:
-            print "L", norm
-        itercount += 1
-    return norm
+            print "L", theta
+        if itercount >= p or not engine.extend():
+            # Krylov space is invariant: theta is an eigenvalue,
+            # only round-off separates it from the largest one
+            value = theta * (1 + tol)
+            break
+        if bound:
+            eps = (np.log(1.648 * np.sqrt(p) / delta) / (2 * itercount - 1))**2
+            value = theta / (1 - eps) if eps < 1 else np.inf
+            if value <= (1 + bound_tol) * theta:
+                break
+        else:
+            value = theta
+            if np.fabs(theta - old_theta) <= tol * theta:
+                break
+        old_theta = theta
+
+    if cache:
+        _lipschitz_cache.set(transform, key, value)
+    return value
+
+class lipschitz_cache(object):
+
+    """
+    Values of power_L, keyed on the transform object (held through
+    a weak reference, so the entry goes away with the transform).
+    The contents of the transform are not checked: after modifying
+    a transform in place, call invalidate_lipschitz(transform) to
+    discard its values.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, transform, key):
+        entry = self._entries.get(id(transform))
+        if entry is not None:
+            ref, values = entry
+            if ref() is transform:
+                return values.get(key)
+
+    def set(self, transform, key, value):
+        idx = id(transform)
+        def remove(ref, entries=self._entries):
+            if idx in entries and entries[idx][0] is ref:
+                del entries[idx]
+        entry = self._entries.get(idx)
+        if entry is None or entry[0]() is not transform:
+            try:
+                ref = weakref.ref(transform, remove)
+            except TypeError: # can't be cached
+                return
+            entry = (ref, {})
+            self._entries[idx] = entry
+        entry[1][key] = value
+
+    def invalidate(self, transform):
+        entry = self._entries.get(id(transform))
+        if entry is not None and entry[0]() is transform:
+            del self._entries[id(transform)]
+
+    def clear(self):
+        self._entries.clear()
+
+_lipschitz_cache = lipschitz_cache()
+
+def invalidate_lipschitz(transform):
+    """
+    Discard the cached values of power_L(transform), e.g. after
+    modifying the transform in place. Transforms built from it,
+    such as compositions, have entries of their own.
+    """
+    _lipschitz_cache.invalidate(transform)
 
 def astransform(X):
     """
@@ -1,7 +1,10 @@
 import numpy as np
 import warnings
+import inspect
 
 from .identity_quadratic import identity_quadratic as sq
+from .telemetry import get_clock, debug_sink, FISTA_dtype, batch_FISTA_dtype
+from .precision import sum_squares, inner
 
 class algorithm(object):
 
@@ -9,6 +12,7 @@ class algorithm(object):
         self.composite = composite
         self.debug = False
         self.inv_step = None
+        self.duality_gap = None
 
     @property
     def output(self):
@@ -44,7 +48,11 @@ class FISTA(algorithm):
             monotonicity_restart=True,
             debug = None,
             prox_control=None,
-            attempt_decrease = False):
+            attempt_decrease = False,
+            inplace=False,
+            gap_tol=None,
+            gap_freq=10,
+            telemetry=None):
 
         """
         Use the FISTA (or ISTA) algorithm to fit the problem
@@ -79,6 +87,27 @@ class FISTA(algorithm):
               A dictionary of arguments for fit(), used when the composite.proximal_step itself is a FISTA problem
         attempt_decrease : bool
               If True, attempt to decrease inv_step on the first iteration
+        inplace : bool
+              If True, the solver allocates a fixed set of work buffers
+              the shape of composite.coefs and reuses them on every iteration.
+              Gradients and proximal steps are written into these buffers
+              when the composite's smooth_objective and proximal accept
+              an `out` argument, and composite.coefs is updated in place.
+        gap_tol : float
+              If not None, stop based on a duality gap instead of objective value:
+              every gap_freq iterations composite.duality_gap is evaluated
+              and the algorithm stops when the gap is below
+              gap_tol times max(1, |objective|). The last gap computed
+              is stored as self.duality_gap. The gap is also evaluated
+              at the initial coefs, so composites whose gap is not
+              implemented fail before iterating.
+        gap_freq : int
+              How often the duality gap is evaluated if gap_tol is not None.
+        telemetry : callable
+              If not None, called once per iteration with a tuple
+              with fields given by regreg.telemetry.FISTA_dtype, e.g.
+              a regreg.telemetry.recorder. If self.debug, the records
+              are also printed.
     
         Returns
         -------
@@ -91,6 +120,19 @@ class FISTA(algorithm):
         if debug is not None:
             self.debug = debug
         set_prox_control = prox_control is not None
+        if gap_tol is not None and not hasattr(self.composite, 'duality_gap'):
+            raise ValueError('composite has no duality_gap method, so gap_tol cannot be used')
+        self.duality_gap = None
+        gap_current = False
+        if gap_tol is not None:
+            # raises before any iterations if the gap is not
+            # implemented for the losses or penalty of the composite
+            self.duality_gap = self.composite.duality_gap(self.composite.coefs)
+
+        telemetry = debug_sink(telemetry, FISTA_dtype, self.debug)
+        clock = get_clock(telemetry)
+        start_time = clock()
+        restarted = 0
 
         objective_hist = np.zeros(max_its)
         
@@ -98,10 +140,36 @@ class FISTA(algorithm):
             #If inv_step is not available from last fit use start_inv_step
             self.inv_step = start_inv_step
 
-        r = self.composite.coefs
         t_old = 1.
 
-        beta = self.composite.coefs
+        if inplace:
+            coefs = self.composite.coefs
+            if not (isinstance(coefs, np.ndarray) and coefs.flags.c_contiguous):
+                raise ValueError('inplace mode needs composite.coefs to be a contiguous ndarray')
+            if not coefs.flags.writeable:
+                # e.g. the (frozen) result of the proximal map of an svd_atom
+                coefs = self.composite.coefs = coefs.copy()
+            # the work buffers: at most 5 arrays the size of coefs
+            r = coefs.copy()
+            beta = np.empty_like(coefs)
+            grad = np.empty_like(coefs)
+            work = np.empty_like(coefs)
+            trial_grad = None
+            proxq = sq(self.inv_step, r, grad, 0)
+            grad_out = accepts_out(self.composite.smooth_objective)
+            # work is free while the prox is computed
+            prox_kw = {'out':beta}
+            if self.composite.proximal_out_flags[1]:
+                prox_kw['work'] = work
+            if set_prox_control:
+                prox_kw['prox_control'] = prox_control
+        else:
+            r = self.composite.coefs
+            beta = self.composite.coefs
+            prox_kw = {}
+            if set_prox_control:
+                prox_kw['prox_control'] = prox_control
+
         current_f = self.composite.smooth_objective(r,mode='func')
         current_obj = current_f + self.composite.nonsmooth_objective(self.composite.coefs, check_feasibility=True)
         
@@ -109,12 +177,17 @@ class FISTA(algorithm):
         badstep = 0
         while itercount < max_its:
 
+            smooth_time = prox_time = 0.
+            backtracks = 0
+
             #Restart every 'restart' iterations
             if np.mod(itercount+1,restart)==0:
-                if self.debug:
-                    print "\tRestarting weights"
-                r = self.composite.coefs
+                if inplace:
+                    r[:] = coefs
+                else:
+                    r = self.composite.coefs
                 t_old = 1.
+                restarted = 1
 
             objective_hist[itercount] = current_obj
 
@@ -123,65 +196,128 @@ class FISTA(algorithm):
                 if np.mod(itercount+1,100)==0 or attempt_decrease:
                     self.inv_step *= 1/alpha
                     attempt_decrease = True
-                current_f, grad = self.composite.smooth_objective(r,mode='both')
+                tic = clock()
+                if inplace:
+                    current_f = _smooth_objective_out(self.composite, r, 'both', grad, grad_out)
+                else:
+                    current_f, grad = self.composite.smooth_objective(r,mode='both')
+                smooth_time += clock() - tic
                 stop = False
                 while not stop:
-                    if set_prox_control:
-                        beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0), prox_control=prox_control)
+                    tic = clock()
+                    if inplace:
+                        proxq.coef = self.inv_step
+                        self.composite.proximal_step(proxq, **prox_kw)
                     else:
-                        beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0))
+                        beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0), **prox_kw)
+                    toc = clock()
+                    prox_time += toc - tic
 
                     trial_f = self.composite.smooth_objective(beta,mode='func')
+                    smooth_time += clock() - toc
+
+                    if inplace:
+                        np.subtract(beta, r, out=work)
+                        step_norm2 = sum_squares(work)
+                    else:
+                        step_norm2 = sum_squares(beta-r)
 
                     if not np.isfinite(trial_f):
                         stop = False
                     elif np.fabs(trial_f - current_f)/np.max([1.,trial_f]) > 1e-10:
-                        stop = trial_f <= current_f + np.dot((beta-r).reshape(-1),grad.reshape(-1)) + 0.5*self.inv_step*np.linalg.norm(beta-r)**2
+                        if inplace:
+                            linear = inner(work, grad)
+                        else:
+                            linear = inner(beta-r, grad)
+                        stop = trial_f <= current_f + linear + 0.5*self.inv_step*step_norm2
                     else:
-                        trial_grad = self.composite.smooth_objective(beta,mode='grad')
-                        stop = np.fabs(np.dot((beta-r).reshape(-1),(grad-trial_grad).reshape(-1))) <= 0.5*self.inv_step*np.linalg.norm(beta-r)**2
+                        tic = clock()
+                        # the slack keeps round-off in the gradients from
+                        # failing the test forever when r is already optimal
+                        slack = 1.e-15 * np.max([1., np.fabs(current_f)])
+                        if inplace:
+                            if trial_grad is None:
+                                trial_grad = np.empty_like(coefs)
+                            _smooth_objective_out(self.composite, beta, 'grad', trial_grad, grad_out)
+                            np.subtract(trial_grad, grad, out=trial_grad)
+                            stop = np.fabs(inner(work, trial_grad)) <= 0.5*self.inv_step*step_norm2 + slack
+                        else:
+                            trial_grad = self.composite.smooth_objective(beta,mode='grad')
+                            stop = np.fabs(inner(beta-r, grad-trial_grad)) <= 0.5*self.inv_step*step_norm2 + slack
+                        smooth_time += clock() - tic
                     if not stop:
                         attempt_decrease = False
+                        backtracks += 1
                         self.inv_step *= alpha
                         if not np.isfinite(self.inv_step):
                             raise ValueError("inv_step overflowed")
-                        if self.debug:
-                            print "%i    Increasing inv_step to" % itercount, self.inv_step
                      
             else:
                 #Use specified Lipschitz constant
-                grad = self.composite.smooth_objective(r,mode='grad')
                 self.inv_step = self.composite.lipschitz
-                if set_prox_control:
-                    beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0), prox_control=prox_control)
+                tic = clock()
+                if inplace:
+                    _smooth_objective_out(self.composite, r, 'grad', grad, grad_out)
                 else:
-                    beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0))
+                    grad = self.composite.smooth_objective(r,mode='grad')
+                toc = clock()
+                smooth_time += toc - tic
+                if inplace:
+                    proxq.coef = self.inv_step
+                    self.composite.proximal_step(proxq, **prox_kw)
+                else:
+                    beta = self.composite.proximal_step(sq(self.inv_step, r, grad, 0), **prox_kw)
+                tic = clock()
+                prox_time += tic - toc
                 trial_f = self.composite.smooth_objective(beta,mode='func')
+                smooth_time += clock() - tic
                 
             trial_obj = trial_f + self.composite.nonsmooth_objective(beta)
 
+            if telemetry is not None:
+                telemetry((itercount, trial_obj, self.inv_step, backtracks,
+                           restarted, smooth_time, prox_time,
+                           clock() - start_time))
+            restarted = 0
+
             obj_change = np.fabs(trial_obj - current_obj)
             #obj_rel_change = obj_change/np.fabs(max(min(current_obj, trial_obj),0))
             obj_rel_change = obj_change/np.max([np.fabs(current_obj),1.])
             if coef_stop:
-                coef_rel_change = np.linalg.norm(self.composite.coefs - beta) / np.max([1.,np.linalg.norm(beta)])
-
-            if self.debug:
-                if coef_stop:
-                    print itercount, current_obj, self.inv_step, obj_rel_change, coef_rel_change, tol
+                if inplace:
+                    np.subtract(coefs, beta, out=work)
+                    coef_rel_change = np.sqrt(sum_squares(work)) / np.max([1.,np.sqrt(sum_squares(beta))])
                 else:
-                    print "%i    obj: %.6e    inv_step: %.2e    rel_obj_change: %.2e    tol: %.1e" % (itercount, current_obj, self.inv_step, obj_rel_change, tol)
+                    coef_rel_change = np.sqrt(sum_squares(self.composite.coefs - beta)) / np.max([1.,np.sqrt(sum_squares(beta))])
 
             if itercount >= min_its:
-                if coef_stop:
+                if gap_tol is not None:
+                    if np.mod(itercount, gap_freq) == 0:
+                        self.duality_gap = self.composite.duality_gap(beta)
+                        if self.duality_gap < gap_tol * np.max([np.fabs(trial_obj), 1.]):
+                            if inplace:
+                                coefs[:] = beta
+                            else:
+                                self.composite.coefs = beta
+                            gap_current = True
+                            if self.debug:
+                                print 'Success: Optimization stopped because duality gap was below tolerance'
+                            break
+                elif coef_stop:
                     if coef_rel_change < tol:
-                        self.composite.coefs = beta
+                        if inplace:
+                            coefs[:] = beta
+                        else:
+                            self.composite.coefs = beta
                         if self.debug:
                             print "Success: Optimization stopped because change in coefficients was below tolerance"
                         break
                 else:
                     if obj_rel_change < tol or obj_change < tol:
-                        self.composite.coefs = beta
+                        if inplace:
+                            coefs[:] = beta
+                        else:
+                            self.composite.coefs = beta
                         if self.debug:
                             print 'Success: Optimization stopped because decrease in objective was below tolerance'
                         break
@@ -189,22 +325,22 @@ class FISTA(algorithm):
             if FISTA:
                 #Use Nesterov weights
                 t_new = 0.5 * (1 + np.sqrt(1+4*(t_old**2)))
-                r = beta + ((t_old-1)/(t_new)) * (beta - self.composite.coefs)
+                # in inplace mode, r is updated in its buffer 
+                # after the monotonicity check below
+                if not inplace:
+                    r = beta + ((t_old-1)/(t_new)) * (beta - self.composite.coefs)
             else:
                 #Just do ISTA
                 t_new = 1.
-                r = beta
+                if not inplace:
+                    r = beta
 
             if itercount > 1 and current_obj < trial_obj and obj_rel_change > 1e-10 and monotonicity_restart:
                 #Adaptive restarting: restart if monotonicity violated
-                if self.debug:
-                    print "%i Restarting weights" % itercount
                 attempt_decrease = True
 
                 if t_old == 1.:
                     #Gradient step didn't decrease objective: tolerance composites or incorrect prox op... time to give up?
-                    if self.debug:
-                        print "%i  Badstep: current: %f, proposed %f" % (itercount, current_obj, trial_obj)
                     badstep += 1
                     if badstep > 3:
                         warnings.warn('prox is taking bad steps')
@@ -213,15 +349,31 @@ class FISTA(algorithm):
                         break
                 itercount += 1
                 t_old = 1.
-                r = self.composite.coefs
+                restarted = 1
+                if inplace:
+                    r[:] = coefs
+                else:
+                    r = self.composite.coefs
 
             else:
-                self.composite.coefs = beta
+                if inplace:
+                    if FISTA:
+                        np.subtract(beta, coefs, out=r)
+                        r *= (t_old-1)/(t_new)
+                        r += beta
+                    else:
+                        r[:] = beta
+                    coefs[:] = beta
+                else:
+                    self.composite.coefs = beta
                 t_old = t_new
                 itercount += 1
                 current_obj = trial_obj
 
 
+        if gap_tol is not None and not gap_current:
+            self.duality_gap = self.composite.duality_gap(self.composite.coefs)
+
         if self.debug:
             if itercount == max_its:
                 print "Optimization stopped because iteration limit was reached"
@@ -229,4 +381,461 @@ class FISTA(algorithm):
         if return_objective_hist:
             return objective_hist[:itercount]
 
+class SpaRSA(algorithm):
+
+    """
+    The SpaRSA generalized gradient algorithm of
+    Wright, Nowak and Figueiredo (2009): proximal gradient steps with
+    a spectral (Barzilai-Borwein) inverse step size, accepted by a
+    nonmonotone line search.
+    """
+
+    def fit(self,
+            max_its=10000,
+            min_its=5,
+            tol=1e-5,
+            eta=2.,
+            sigma=1.e-4,
+            memory=5,
+            start_inv_step=1.,
+            min_inv_step=1.e-30,
+            max_inv_step=1.e30,
+            coef_stop=False,
+            return_objective_hist = True,
+            debug = None,
+            prox_control=None,
+            telemetry=None):
+
+        """
+        Use the SpaRSA algorithm to fit the problem
+
+        Parameters
+        ----------
+        max_its : int
+              the maximum number of iterations
+        min_its : int
+              the minimum number of iterations
+        tol : float
+              the tolerance used in the stopping criterion
+        eta : float
+              used in the line search. If a step is rejected, self.inv_step is increased by a factor of eta
+        sigma : float
+              sufficient decrease constant of the line search
+        memory : int
+              A step is accepted if it decreases the maximum of the last memory objective values.
+              If memory is 1, the objective decreases monotonically.
+        start_inv_step : float
+              The starting value of self.inv_step, unless self.inv_step is already set.
+        min_inv_step, max_inv_step : float
+              The Barzilai-Borwein inverse step sizes are clipped to this range.
+        coef_stop : bool
+              Stop based on coefficient changes instead of objective value
+        return_objective_hist : bool
+              Return the sequence of objective values?
+        debug : bool
+              Resets self.debug, which controls whether convergence information is printed
+        prox_control : dict
+              A dictionary of arguments for fit(), used when the composite.proximal_step itself is a FISTA problem
+        telemetry : callable
+              If not None, called once per iteration with a tuple
+              with fields given by regreg.telemetry.FISTA_dtype.
+              The restart field is always 0. If self.debug, the
+              records are also printed.
+
+        Returns
+        -------
+
+        objective_hist : ndarray
+              A vector of objective values. Only return if return_objective_hist is True.
+
+        """
+
+        if debug is not None:
+            self.debug = debug
+        if prox_control is not None:
+            prox_kw = {'prox_control':prox_control}
+        else:
+            prox_kw = {}
+
+        telemetry = debug_sink(telemetry, FISTA_dtype, self.debug)
+        clock = get_clock(telemetry)
+        start_time = clock()
+
+        objective_hist = np.zeros(max_its)
+
+        if self.inv_step is None:
+            self.inv_step = start_inv_step
+
+        coefs = self.composite.coefs
+        current_f, grad = self.composite.smooth_objective(coefs, mode='both')
+        current_obj = current_f + self.composite.nonsmooth_objective(coefs)
+        recent_obj = [current_obj]
+
+        itercount = 0
+        while itercount < max_its:
+
+            objective_hist[itercount] = current_obj
+            reference_obj = max(recent_obj)
+
+            smooth_time = prox_time = 0.
+            backtracks = 0
+            while True:
+                tic = clock()
+                beta = self.composite.proximal_step(sq(self.inv_step, coefs, grad, 0), **prox_kw)
+                toc = clock()
+                prox_time += toc - tic
+                trial_f, trial_grad = self.composite.smooth_objective(beta, mode='both')
+                smooth_time += clock() - toc
+                trial_obj = trial_f + self.composite.nonsmooth_objective(beta)
+
+                step = beta - coefs
+                step_norm2 = (step**2).sum()
+                # with slack for round-off in the objective, as in FISTA
+                slack = 1.e-15 * max(1., np.fabs(reference_obj))
+                if trial_obj <= reference_obj - 0.5 * sigma * self.inv_step * step_norm2 + slack:
+                    break
+                if step_norm2 == 0:
+                    break
+                backtracks += 1
+                self.inv_step *= eta
+                if not np.isfinite(self.inv_step):
+                    raise ValueError("inv_step overflowed")
+
+            if telemetry is not None:
+                telemetry((itercount, trial_obj, self.inv_step, backtracks,
+                           0, smooth_time, prox_time,
+                           clock() - start_time))
+
+            obj_change = np.fabs(trial_obj - current_obj)
+            obj_rel_change = obj_change/np.max([np.fabs(current_obj),1.])
+            if coef_stop:
+                coef_rel_change = np.sqrt(step_norm2) / np.max([1.,np.linalg.norm(beta)])
+
+            # Barzilai-Borwein inverse step size for the next iteration
+            grad_change = trial_grad - grad
+            if step_norm2 > 0:
+                self.inv_step = np.clip((step * grad_change).sum() / step_norm2,
+                                        min_inv_step, max_inv_step)
+
+            self.composite.coefs = beta
+            coefs, grad = beta, trial_grad
+            current_obj = trial_obj
+            recent_obj.append(current_obj)
+            if len(recent_obj) > memory:
+                recent_obj.pop(0)
+            itercount += 1
+
+            if itercount >= min_its:
+                if coef_stop:
+                    if coef_rel_change < tol:
+                        if self.debug:
+                            print "Success: Optimization stopped because change in coefficients was below tolerance"
+                        break
+                elif obj_rel_change < tol or obj_change < tol:
+                    if self.debug:
+                        print 'Success: Optimization stopped because decrease in objective was below tolerance'
+                    break
+
+        if self.debug:
+            if itercount == max_its:
+                print "Optimization stopped because iteration limit was reached"
+            print "SpaRSA used", itercount, "of", max_its, "iterations"
+        if return_objective_hist:
+            return objective_hist[:itercount]
+
+def accepts_out(method, keyword='out'):
+    """
+    Does the (bound) method accept an `out` (or other) keyword argument?
+
+    This inspects the signature of method, so callers resolve it
+    once, not on every iteration.
+    """
+    try:
+        return keyword in inspect.getargspec(method).args
+    except TypeError:
+        return False
+
+def out_keywords(method):
+    """
+    The flags (accepts `out`, accepts `work`) of a method.
+    """
+    out = accepts_out(method)
+    return out, out and accepts_out(method, 'work')
+
+def _smooth_objective_out(composite, x, mode, out, grad_out):
+    """
+    Evaluate composite.smooth_objective, storing the gradient in out.
+    Returns the function value if mode == 'both'.
+    """
+    if grad_out:
+        value = composite.smooth_objective(x, mode=mode, out=out)
+        if mode == 'both':
+            return value[0]
+        return
+    if mode == 'both':
+        f, g = composite.smooth_objective(x, mode='both')
+        out[:] = g
+        return f
+    out[:] = composite.smooth_objective(x, mode=mode)
+
+class batch_FISTA(algorithm):
+
+    """
+    The FISTA generalized gradient algorithm applied
+    to K problems at once.
+
+    The composite's coefs should have shape (p,K), one column per problem,
+    and its smooth_objective, nonsmooth_objective and proximal methods
+    should accept a `columns` keyword and return one objective value
+    per column (see `regreg.simple.batch_problem`).
+
+    Each column keeps its own inverse step size, Nesterov weight,
+    restart state and convergence flag. Columns that have converged
+    are frozen and dropped from subsequent smooth_objective calls.
+    """
+
+    def fit(self,
+            max_its=10000,
+            min_its=5,
+            tol=1e-5,
+            backtrack=True,
+            FISTA=True,
+            alpha=1.1,
+            start_inv_step=1.,
+            restart=np.inf,
+            coef_stop=False,
+            return_objective_hist = True,
+            monotonicity_restart=True,
+            debug = None,
+            attempt_decrease = False,
+            telemetry=None):
+
+        """
+        Use the FISTA (or ISTA) algorithm to fit the K problems
+
+        Parameters
+        ----------
+        max_its : int
+              the maximum number of iterations
+        min_its : int
+              the minimum number of iterations
+        tol : float
+              the tolerance used in the stopping criterion
+        backtrack : bool
+              use backtracking?
+        FISTA : bool
+              use Nesterov weights? If False, this is just gradient descent
+        alpha : float
+              used in backtracking. If the backtraking constant (self.inv_step) is too small, it is increased by a factor of alpha
+        start_inv_step : float or ndarray
+              used in backtracking. This is the starting value of self.inv_step, 
+              either a scalar or one value per column
+        restart : int
+              Restart Nesterov weights every restart iterations. Default is never (np.inf)
+        coef_stop : bool
+              Stop based on coefficient changes instead of objective value
+        return_objective_hist : bool
+              Return the sequence of objective values?
+        monotonicity_restart : bool
+              If True, a column's Nesterov weights are restarted every time its objective value increases
+        debug : bool
+              Resets self.debug, which controls whether convergence information is printed
+        attempt_decrease : bool
+              If True, attempt to decrease inv_step on the first iteration
+        telemetry : callable
+              If not None, called once per iteration with a record
+              with fields given by regreg.telemetry.batch_FISTA_dtype.
+              If self.debug, the records are also printed.
+    
+        Returns
+        -------
 
+        objective_hist : ndarray
+              An array of objective values of shape (itercount, K). 
+              Only return if return_objective_hist is True.
+
+        """
+
+        if debug is not None:
+            self.debug = debug
+
+        telemetry = debug_sink(telemetry, batch_FISTA_dtype, self.debug)
+        clock = get_clock(telemetry)
+        start_time = clock()
+
+        coefs = self.composite.coefs
+        if coefs.ndim != 2:
+            raise ValueError('batch_FISTA expects coefs of shape (p,K)')
+        K = coefs.shape[1]
+
+        objective_hist = np.zeros((max_its, K))
+
+        if backtrack and (self.inv_step is None or 
+                          np.asarray(self.inv_step).shape != (K,)):
+            #If inv_step is not available from last fit use start_inv_step
+            self.inv_step = np.ones(K) * start_inv_step
+        elif not backtrack:
+            lipschitz = self.composite.lipschitz
+            if not (np.isfinite(lipschitz) and lipschitz > 0):
+                raise ValueError('backtrack=False needs a positive Lipschitz constant, '
+                                 'got %s' % repr(lipschitz))
+            self.inv_step = np.ones(K) * lipschitz
+        attempt_decrease = np.ones(K, np.bool) * attempt_decrease
+
+        # per column state
+        self.t = np.ones(K)
+        self.converged = np.zeros(K, np.bool)
+        self.iterations = np.zeros(K, np.int)
+        badstep = np.zeros(K, np.int)
+
+        r = coefs.copy()
+        beta = coefs.copy()
+        current_obj = (self.composite.smooth_objective(r, mode='func') + 
+                       self.composite.nonsmooth_objective(r, check_feasibility=True))
+        trial_f = np.zeros(K)
+        trial_obj = np.zeros(K)
+
+        itercount = 0
+        while itercount < max_its:
+
+            active = np.nonzero(~self.converged)[0]
+            if active.shape[0] == 0:
+                break
+
+            backtracks = 0
+            #Restart every 'restart' iterations
+            if np.mod(itercount+1,restart)==0:
+                r[:,active] = coefs[:,active]
+                self.t[active] = 1.
+
+            objective_hist[itercount] = current_obj
+
+            r_a = r[:,active]
+            if backtrack:
+                if np.mod(itercount+1,100)==0:
+                    attempt_decrease[active] = True
+                decrease = active[attempt_decrease[active]]
+                self.inv_step[decrease] /= alpha
+
+                current_f, grad = self.composite.smooth_objective(r_a, mode='both', columns=active)
+
+                # Backtracking loop, run only on the columns 
+                # whose step has not been accepted yet
+                pending = np.arange(active.shape[0])
+                while pending.shape[0]:
+                    cols = active[pending]
+                    inv_step = self.inv_step[cols]
+                    beta[:,cols] = self.composite.proximal(sq(inv_step, r_a[:,pending], grad[:,pending], 0), 
+                                                           columns=cols)
+                    f = self.composite.smooth_objective(beta[:,cols], mode='func', columns=cols)
+                    trial_f[cols] = f
+
+                    diff = beta[:,cols] - r_a[:,pending]
+                    diff_norm2 = (diff**2).sum(0)
+                    g = grad[:,pending]
+                    cur_f = current_f[pending]
+                    stop = np.zeros(pending.shape[0], np.bool)
+
+                    finite = np.isfinite(f)
+                    big_change = finite & (np.fabs(f - cur_f) / np.maximum(1., f) > 1e-10)
+                    stop[big_change] = (f <= cur_f + (diff * g).sum(0) + 0.5 * inv_step * diff_norm2)[big_change]
+
+                    small_change = finite & ~big_change
+                    if np.any(small_change):
+                        small = np.nonzero(small_change)[0]
+                        trial_grad = self.composite.smooth_objective(beta[:,cols[small]], mode='grad', 
+                                                                     columns=cols[small])
+                        # with slack for round-off, as in FISTA
+                        stop[small] = (np.fabs((diff[:,small] * (g[:,small] - trial_grad)).sum(0)) 
+                                       <= 0.5 * inv_step[small] * diff_norm2[small] + 
+                                       1.e-15 * np.maximum(1., np.fabs(cur_f[small])))
+
+                    failing = cols[~stop]
+                    attempt_decrease[failing] = False
+                    self.inv_step[failing] *= alpha
+                    if not np.all(np.isfinite(self.inv_step[failing])):
+                        raise ValueError("inv_step overflowed")
+                    backtracks += failing.shape[0]
+                    pending = pending[~stop]
+
+            else:
+                #Use specified Lipschitz constant
+                grad = self.composite.smooth_objective(r_a, mode='grad', columns=active)
+                beta[:,active] = self.composite.proximal(sq(self.inv_step[active], r_a, grad, 0),
+                                                         columns=active)
+                trial_f[active] = self.composite.smooth_objective(beta[:,active], mode='func', columns=active)
+
+            beta_a = beta[:,active]
+            trial_obj[active] = trial_f[active] + self.composite.nonsmooth_objective(beta_a, columns=active)
+
+            cur_obj = current_obj[active]
+            obj_change = np.fabs(trial_obj[active] - cur_obj)
+            obj_rel_change = obj_change / np.maximum(np.fabs(cur_obj), 1.)
+            if coef_stop:
+                coef_rel_change = (np.sqrt(((coefs[:,active] - beta_a)**2).sum(0)) / 
+                                   np.maximum(1., np.sqrt((beta_a**2).sum(0))))
+
+
+            self.iterations[active] += 1
+            if itercount >= min_its:
+                if coef_stop:
+                    done = coef_rel_change < tol
+                else:
+                    done = (obj_rel_change < tol) | (obj_change < tol)
+                finished = active[done]
+                coefs[:,finished] = beta[:,finished]
+                current_obj[finished] = trial_obj[finished]
+                self.converged[finished] = True
+            else:
+                done = np.zeros(active.shape[0], np.bool)
+
+            # update the columns still running
+
+            t_old = self.t[active]
+            if FISTA:
+                #Use Nesterov weights
+                t_new = 0.5 * (1 + np.sqrt(1+4*(t_old**2)))
+                new_r = beta_a + ((t_old-1)/(t_new)) * (beta_a - coefs[:,active])
+            else:
+                #Just do ISTA
+                t_new = np.ones(active.shape[0])
+                new_r = beta_a
+
+            increase = ((cur_obj < trial_obj[active]) & (obj_rel_change > 1e-10) & ~done)
+            if itercount > 1 and monotonicity_restart:
+                restarting = increase
+            else:
+                restarting = np.zeros(active.shape[0], np.bool)
+            accepted = ~restarting & ~done
+
+            #Adaptive restarting: restart if monotonicity violated
+            restart_cols = active[restarting]
+            attempt_decrease[restart_cols] = True
+            bad = restart_cols[self.t[restart_cols] == 1.]
+            badstep[bad] += 1
+            given_up = bad[badstep[bad] > 3]
+            if given_up.shape[0]:
+                warnings.warn('prox is taking bad steps')
+                self.converged[given_up] = True
+            self.t[restart_cols] = 1.
+            r[:,restart_cols] = coefs[:,restart_cols]
+
+            accept_cols = active[accepted]
+            coefs[:,accept_cols] = beta[:,accept_cols]
+            self.t[accept_cols] = t_new[accepted]
+            r[:,accept_cols] = new_r[:,accepted]
+            current_obj[accept_cols] = trial_obj[accept_cols]
+
+            if telemetry is not None:
+                telemetry((itercount, active.shape[0], obj_rel_change.max(), 
+                           backtracks, restart_cols.shape[0], done.sum(), 
+                           clock() - start_time))
+
+            itercount += 1
+
+        if self.debug:
+            if itercount == max_its:
+                print "Optimization stopped because iteration limit was reached"
+            print "batch FISTA used", itercount, "of", max_its, "iterations,", self.converged.sum(), "of", K, "columns converged"
+        if return_objective_hist:
+            return objective_hist[:itercount]
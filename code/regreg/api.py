@@ -14,18 +14,23 @@ from cones import (nonnegative, nonpositive,
 
 from linear_constraints import (projection, projection_complement)
 
-from affine import (identity, selector, affine_transform, normalize, linear_transform, composition as affine_composition, affine_sum,
-                    power_L)
+from affine import (identity, selector, affine_transform, normalize, mmap_normalize, parallel_transform, linear_transform, composition as affine_composition, affine_sum,
+                    power_L, invalidate_lipschitz)
 from smooth import (logistic_deviance, poisson_deviance, multinomial_deviance, smooth_atom, affine_smooth, logistic_loss, sum as smooth_sum)
-from quadratic import quadratic, cholesky, signal_approximator, squared_error
+from quadratic import quadratic, cholesky, signal_approximator, squared_error, gram_matrix, gram_squared_error
 
-from factored_matrix import (factored_matrix, compute_iterative_svd, soft_threshold_svd)
+from factored_matrix import (factored_matrix, compute_iterative_svd, soft_threshold_svd,
+                             low_rank_sparse, completion_problem, matrix_completion)
 
 from separable import separable, separable_problem
-from simple import simple_problem, gengrad, nesta, tfocs
+from simple import simple_problem, batch_problem, gengrad, nesta, tfocs
 from container import container
-from algorithms import FISTA
+from algorithms import FISTA, batch_FISTA, SpaRSA
 from admm import admm_problem
+from coordinate import coordinate_descent
+from telemetry import (recorder, printer, FISTA_dtype, batch_FISTA_dtype,
+                       path_dtype, ADMM_dtype)
+from precision import precision, set_default_dtype, default_dtype
 from blocks import blockwise
 
 from block_norms import l1_l2, linf_l2, l1_l1, linf_linf
@@ -42,5 +47,7 @@ from weighted_atoms import (l1norm as weighted_l1norm,
                             supnorm as weighted_supnorm)
 
 from paths import lasso, nesta as nesta_path, UNPENALIZED, L1_PENALTY, POSITIVE_PART
+from path_store import path_store
+from cross_validation import lasso_cv
 
 from group_lasso import group_lasso, group_lasso_conjugate
@@ -9,6 +9,8 @@ from .composite import nonsmooth, smooth, smooth_conjugate
 from .affine import (linear_transform, identity as identity_transform, 
                     affine_transform, selector)
 from .smooth import affine_smooth
+from .algorithms import out_keywords
+from .precision import default_dtype
 
 try:
     from .projl1_cython import projl1
@@ -23,6 +25,11 @@ class atom(nonsmooth):
     """
     tol = 1.0e-05
 
+    # do lagrange_prox (bound_prox) act separately on each column of
+    # a 2D argument, with lipschitz one entry per column?
+    _columnwise_lagrange_prox = False
+    _columnwise_bound_prox = False
+
     def __init__(self, primal_shape, lagrange=None, bound=None,
                  offset=None, quadratic=None, initial=None):
 
@@ -45,6 +52,18 @@ class atom(nonsmooth):
             self._bound = bound
             self._lagrange = None
         
+    @property
+    def columnwise_prox(self):
+        """
+        Can the proximal map be applied to the columns of a 2D array at
+        once? This is used by `regreg.simple.batch_problem`.
+        """
+        if self.offset is not None or not self.quadratic.iszero:
+            return False
+        if self.bound is not None:
+            return self._columnwise_bound_prox
+        return self._columnwise_lagrange_prox
+
     def latexify(self, var='x', idx=''):
         d = {}
         if self.offset is None or np.all(self.offset == 0):
@@ -215,7 +234,18 @@ class atom(nonsmooth):
         v += self.quadratic.objective(x, 'func')
         return v
 
-    def proximal(self, proxq, prox_control=None):
+    def _prox_out_flags(self, mode):
+        """
+        Whether self.bound_prox (mode='bound') or self.lagrange_prox
+        (mode='lagrange') accept `out` and `work` arguments,
+        resolved on first use.
+        """
+        if not hasattr(self, '_out_flags'):
+            self._out_flags = {'bound': out_keywords(self.bound_prox),
+                               'lagrange': out_keywords(self.lagrange_prox)}
+        return self._out_flags[mode]
+
+    def proximal(self, proxq, prox_control=None, out=None, work=None):
         r"""
         The proximal operator. If the atom is in
         Lagrange mode, this has the form
@@ -235,8 +265,38 @@ class atom(nonsmooth):
            v^{\lambda}(x) = \text{argmin}_{v \in \mathbb{R}^p} \frac{L}{2}
            \|x-v\|^2_2 + \langle v, \eta \rangle \text{s.t.} \   h(v+\alpha) \leq \lambda
 
+        If out is not None, the result is stored in out. When
+        the atom has no offset or quadratic and its prox accepts
+        an `out` argument, no temporary arrays are created
+        if the prox needs no scratch space or it is given
+        as `work`, an array the shape of out.
         """
 
+        if out is not None:
+            if self.bound is not None:
+                prox = self.bound_prox
+                prox_out, prox_work = self._prox_out_flags('bound')
+            else:
+                prox = self.lagrange_prox
+                prox_out, prox_work = self._prox_out_flags('lagrange')
+            if (self.offset is None and self.quadratic.iszero and 
+                proxq.coef > 0 and prox_out):
+                # out = center - linear_term / coef
+                if proxq.linear_term is None:
+                    out.fill(0)
+                else:
+                    np.divide(proxq.linear_term, -proxq.coef, out=out)
+                if proxq.center is not None:
+                    out += proxq.center
+                keywords = {'out':out}
+                if work is not None and prox_work:
+                    keywords['work'] = work
+                if self.bound is not None:
+                    return prox(out, lipschitz=proxq.coef, bound=self.bound, **keywords)
+                return prox(out, lipschitz=proxq.coef, lagrange=self.lagrange, **keywords)
+            out[:] = self.proximal(proxq, prox_control=prox_control)
+            return out
+
         offset, totalq = (self.quadratic + proxq).recenter(self.offset)
         if totalq.coef == 0:
             raise ValueError('lipschitz + quadratic coef must be positive')
@@ -383,6 +443,8 @@ class l1norm(atom):
     _doc_dict = copy(atom._doc_dict)
     _doc_dict['objective'] = objective_template % {'var': r'x + \alpha'}
 
+    _columnwise_lagrange_prox = True
+
     def seminorm(self, x, lagrange=None, check_feasibility=False):
         lagrange = atom.seminorm(self, x, 
                                  check_feasibility=check_feasibility, 
@@ -399,14 +461,22 @@ class l1norm(atom):
             return np.inf
     constraint.__doc__ = atom.constraint.__doc__ % _doc_dict
 
-    def lagrange_prox(self, x,  lipschitz=1, lagrange=None):
+    def lagrange_prox(self, x,  lipschitz=1, lagrange=None, out=None,
+                      work=None):
         lagrange = atom.lagrange_prox(self, x, lipschitz, lagrange)
-        return np.sign(x) * np.maximum(np.fabs(x)-lagrange/lipschitz, 0)
+        if out is None:
+            return np.sign(x) * np.maximum(np.fabs(x)-lagrange/lipschitz, 0)
+        # soft-thresholding as x - clip(x, -t, t), with
+        # the clipped values in work if it is given
+        t = lagrange / lipschitz
+        work = np.clip(x, -t, t, out=work)
+        np.subtract(x, work, out=out)
+        return out
     lagrange_prox.__doc__ = atom.lagrange_prox.__doc__ % _doc_dict
 
     def bound_prox(self, x, lipschitz=1, bound=None):
         bound = atom.bound_prox(self, x, lipschitz, bound)
-        x = np.asarray(x, np.float)
+        x = np.asarray(x, default_dtype())
         return projl1(x, self.bound)
     bound_prox.__doc__ = atom.bound_prox.__doc__ % _doc_dict
 
@@ -420,6 +490,7 @@ class supnorm(atom):
     _doc_dict = copy(atom._doc_dict)
     _doc_dict['objective'] = objective_template % {'var': r'\beta + \alpha'}
 
+    _columnwise_bound_prox = True
 
     def seminorm(self, x, lagrange=None, check_feasibility=False):
         lagrange = atom.seminorm(self, x, 
@@ -439,7 +510,7 @@ class supnorm(atom):
 
     def lagrange_prox(self, x,  lipschitz=1, lagrange=None):
         lagrange = atom.lagrange_prox(self, x, lipschitz, lagrange)
-        x = np.asarray(x, np.float)
+        x = np.asarray(x, default_dtype())
         d = projl1(x, lagrange/lipschitz)
         return x - d
     lagrange_prox.__doc__ = atom.lagrange_prox.__doc__ % _doc_dict
@@ -556,7 +627,7 @@ class positive_part(atom):
     def bound_prox(self, x,  lipschitz=1, bound=None):
         bound = atom.bound_prox(self, x, lipschitz, bound)
         x = np.asarray(x)
-        v = x.copy().astype(np.float)
+        v = x.astype(default_dtype())
         v = np.atleast_1d(v)
         pos = v > 0
         if np.any(pos):
@@ -574,6 +645,8 @@ class constrained_max(atom):
     _doc_dict['objective'] = objective_template % {'var': r'x + \alpha',
                                                    'shape':_doc_dict['shape']}
 
+    _columnwise_bound_prox = True
+
     def seminorm(self, x, lagrange=None, check_feasibility=False):
         lagrange = atom.seminorm(self, x, 
                                  check_feasibility=check_feasibility, 
@@ -598,7 +671,7 @@ class constrained_max(atom):
     def lagrange_prox(self, x,  lipschitz=1, lagrange=None):
         lagrange = atom.lagrange_prox(self, x, lipschitz, lagrange)
         x = np.asarray(x)
-        v = x.copy().astype(np.float)
+        v = x.astype(default_dtype())
         v = np.atleast_1d(v)
         pos = v > 0
         if np.any(pos):
@@ -649,7 +722,7 @@ class constrained_positive_part(atom):
     def lagrange_prox(self, x,  lipschitz=1, lagrange=None):
         lagrange = atom.lagrange_prox(self, x, lipschitz, lagrange)
         x = np.asarray(x)
-        v = np.zeros(x.shape)
+        v = np.zeros(x.shape, default_dtype())
         v = np.atleast_1d(v)
         pos = x > 0
         if np.any(pos):
@@ -661,7 +734,7 @@ class constrained_positive_part(atom):
     def bound_prox(self, x,  lipschitz=1, bound=None):
         bound = atom.bound_prox(self, x, lipschitz, bound)
         x = np.asarray(x)
-        v = np.zeros(x.shape, np.float)
+        v = np.zeros(x.shape, default_dtype())
         v = np.atleast_1d(v)
         pos = x > 0
         if np.any(pos):
@@ -679,6 +752,8 @@ class max_positive_part(atom):
     _doc_dict = copy(atom._doc_dict)
     _doc_dict['objective'] = objective_template % {'var': r'x + \alpha'}
 
+    _columnwise_bound_prox = True
+
     def seminorm(self, x, lagrange=None, check_feasibility=False):
         lagrange = atom.seminorm(self, x, 
                                  check_feasibility=check_feasibility, 
@@ -702,7 +777,7 @@ class max_positive_part(atom):
     def lagrange_prox(self, x,  lipschitz=1, lagrange=None):
         lagrange = atom.lagrange_prox(self, x, lipschitz, lagrange)
         x = np.asarray(x)
-        v = np.zeros(x.shape, np.float)
+        v = np.zeros(x.shape, default_dtype())
         v = np.atleast_1d(v)
         pos = x > 0
         if np.any(pos):
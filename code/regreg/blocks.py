@@ -79,7 +79,10 @@ class Block(object):
         return self.composite.coefs
 
     def set_coefs(self, coefs):
-        self.composite.coefs[:] = coefs
+        if self.composite.coefs.flags.writeable:
+            self.composite.coefs[:] = coefs
+        else:
+            self.composite.coefs = np.array(coefs)
 
     def get_coefs(self):
         return self.composite.coefs
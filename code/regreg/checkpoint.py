@@ -0,0 +1,31 @@
+"""
+Checkpoints of the state of a regularization path, so that a
+path that was interrupted can be resumed from its last checkpoint
+rather than from the start, see regreg.paths.lasso.resume.
+
+A checkpoint is a dict (the lagrange index reached, the
+solution, the partial path, ...), pickled to a local file. It is
+written to a temporary file which is then renamed, so an interruption
+while writing leaves the previous checkpoint intact.
+"""
+
+import os
+import cPickle as pickle
+
+def save_checkpoint(filename, state):
+    """
+    Write state, a picklable dict, to filename.
+    """
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'wb') as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmpname, filename)
+
+def load_checkpoint(filename):
+    """
+    Read the state written by save_checkpoint to filename.
+    """
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
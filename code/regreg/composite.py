@@ -5,7 +5,8 @@ import new
 # local imports
 
 from .identity_quadratic import identity_quadratic as sq
-from .algorithms import FISTA
+from .algorithms import FISTA, out_keywords
+from .precision import default_dtype, cast
 
 class composite(object):
     """
@@ -24,7 +25,7 @@ class composite(object):
 
         self.offset = offset
         if offset is not None:
-            self.offset = array(offset)
+            self.offset = cast(array(offset))
 
         if type(primal_shape) == type(1):
             self.primal_shape = (primal_shape,)
@@ -38,7 +39,7 @@ class composite(object):
             self.quadratic = sq(0,0,0,0)
 
         if initial is None:
-            self.coefs = zeros(self.primal_shape)
+            self.coefs = zeros(self.primal_shape, default_dtype())
         else:
             self.coefs = initial.copy()
 
@@ -88,17 +89,43 @@ class composite(object):
         else:
             return argmin, lipschitz * norm(x-argmin)**2 / 2. + self.nonsmooth_objective(argmin) + self.quadratic.objective(argmin, 'func') 
 
-    def proximal_step(self, quadratic, prox_control=None):
+    def proximal_step(self, quadratic, prox_control=None, out=None,
+                      work=None):
         """
         Compute the proximal optimization
 
         prox_control: If not None, then a dictionary of parameters for the prox procedure
+
+        out: If not None, an array in which to store the result. It is
+             passed on to self.proximal if it accepts an `out` argument.
+
+        work: If not None, a scratch array the shape of out, passed on to
+             self.proximal along with out if it accepts a `work` argument.
         """
         # This seems like a null op -- if all proximals accept optional prox_control
         if prox_control is None:
-            return self.proximal(quadratic)
+            keywords = {}
         else:
-            return self.proximal(quadratic, prox_control=prox_control)
+            keywords = {'prox_control':prox_control}
+        if out is None:
+            return self.proximal(quadratic, **keywords)
+        prox_out, prox_work = self.proximal_out_flags
+        if prox_out:
+            if work is not None and prox_work:
+                keywords['work'] = work
+            return self.proximal(quadratic, out=out, **keywords)
+        out[:] = self.proximal(quadratic, **keywords)
+        return out
+
+    @property
+    def proximal_out_flags(self):
+        """
+        Whether self.proximal accepts `out` and `work` arguments,
+        resolved on first use.
+        """
+        if not hasattr(self, '_proximal_out_flags'):
+            self._proximal_out_flags = out_keywords(self.proximal)
+        return self._proximal_out_flags
 
     def apply_offset(self, x):
         if self.offset is not None:
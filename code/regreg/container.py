@@ -6,11 +6,12 @@ from .composite import (composite, nonsmooth as nonsmooth_composite,
 from .affine import (vstack as afvstack, identity as afidentity, power_L,
                      selector as afselector)
 from .separable import separable
-from .dual_problem import dual_problem, stacked_dual
+from .dual_problem import dual_problem, stacked_dual, duality_gap
 from .atoms import affine_atom as nonsmooth_affine_atom
 from .cones import zero_constraint, zero as zero_nonsmooth, affine_cone
 
 from .identity_quadratic import identity_quadratic
+from .precision import default_dtype
 
 class container(composite):
     """
@@ -42,7 +43,7 @@ class container(composite):
             self.nonsmooth_atoms = [zero_nonsmooth(self.smooth_atoms[0].primal_shape)]
 
         self.transform, self.atom = stacked_dual(self.smooth_atoms[0].primal_shape, *self.nonsmooth_atoms)
-        self.coefs = np.zeros(self.transform.primal_shape)
+        self.coefs = np.zeros(self.transform.primal_shape, default_dtype())
 
         # add up all the smooth_atom quadratics
         # to be added to nonsmoooth_objective
@@ -56,7 +57,7 @@ class container(composite):
         The smooth_objective DOES NOT INCLUDE the identity
         quadratic of all the smooth atoms.
         """
-        value, grad = 0, np.zeros(x.shape)
+        value, grad = 0, np.zeros(x.shape, default_dtype())
         if mode == 'func':
             for atom in self.smooth_atoms:
                 value += atom.smooth_objective(x, mode=mode, 
@@ -119,8 +120,8 @@ class container(composite):
 
             #Approximate Lipschitz constant
             if not 'dual_reference_lipschitz' in prox_control.keys():
-                # shouldn't do this over and over
-                self.dual_reference_lipschitz = 1.05*power_L(transform, debug=prox_control['debug'])
+                # an upper bound, cached per transform
+                self.dual_reference_lipschitz = power_L(transform, debug=prox_control['debug'])
             else:
                 self.dual_reference_lipschitz = prox_control['dual_reference_lipschitz']
                 prox_control.pop('dual_reference_lipschitz')
@@ -157,6 +158,19 @@ class container(composite):
             else:
                 return primal.proximal(proxq)
 
+    def duality_gap(self, x):
+        """
+        A duality gap at x, see regreg.dual_problem.duality_gap.
+        Only implemented for a single nonsmooth atom
+        without a linear transform.
+        """
+        if (len(self.nonsmooth_atoms) != 1 or 
+            not isinstance(self.transform, afidentity)):
+            raise NotImplementedError('duality gap only implemented for a single nonsmooth atom without a linear transform')
+        if not self.quadratic.iszero:
+            raise NotImplementedError('duality gap not implemented with a quadratic term')
+        return duality_gap(x, self.smooth_atoms, self.nonsmooth_atoms[0])[0]
+
     def solve(self, quadratic=None, return_optimum=False, **fit_args):
         if quadratic is not None:
             oldq, newq = self.quadratic, self.quadratic + quadratic
@@ -165,6 +179,7 @@ class container(composite):
 
         solver = FISTA(self)
         solver.fit(**fit_args)
+        self.final_duality_gap = solver.duality_gap
 
         if return_optimum:
             value = (self.objective(self.coefs), self.coefs)
@@ -0,0 +1,445 @@
+"""
+Cyclic (block) coordinate descent for losses of a linear predictor
+with a group_lasso penalty.
+
+The design may be an ndarray, a scipy.sparse matrix or an
+`regreg.affine.normalize` instance. Its columns are formed once, and
+a column of a sparse design is kept sparse, with its centering
+as a constant shift, so a normalized design is never centered
+or scaled as a whole.
+
+The loss is replaced by a quadratic majorization at the current
+linear predictor, whose gradient is kept up to date after
+each coordinate update. For squared error the majorization is exact.
+"""
+
+import numpy as np
+import scipy.sparse
+from scipy.special import expit
+
+from .affine import normalize
+from .group_lasso import group_lasso, UNPENALIZED, L1_PENALTY, POSITIVE_PART
+
+def design_column(X, j):
+    """
+    Column j of a design matrix as a 1D ndarray.
+
+    Parameters
+    ----------
+    X : [ndarray, scipy.sparse, normalize]
+        Design matrix.
+
+    j : int
+        Which column?
+
+    Returns
+    -------
+    column : ndarray
+        Agrees with X.linear_map(e_j) if X is a normalize instance.
+    """
+    if isinstance(X, normalize):
+        column = _dense_column(X.M, j)
+        if X.center:
+            if j == X.intercept_column:
+                column = np.ones(column.shape)
+            else:
+                column = column - column.mean()
+        if X.scale:
+            column = column / X.col_stds[j]
+        return column
+    return _dense_column(X, j)
+
+def _dense_column(M, j):
+    if scipy.sparse.issparse(M):
+        return np.asarray(M[:,j].todense()).reshape(-1)
+    return np.asarray(M[:,j], np.float)
+
+def _design_columns(X):
+    """
+    The columns of a design matrix as tuples (indices, values, shift),
+    the column being values at indices plus shift in every row.
+    indices is None for a dense column, which is used unless
+    the design is sparse.
+    """
+    if isinstance(X, normalize):
+        M = X.M
+    else:
+        M = X
+    if not scipy.sparse.issparse(M):
+        return [(None, design_column(X, j), 0.) for j in range(M.shape[1])]
+
+    n, p = M.shape
+    M = scipy.sparse.csc_matrix(M)
+    columns = []
+    for j in range(p):
+        if isinstance(X, normalize) and X.center and j == X.intercept_column:
+            columns.append((None, design_column(X, j), 0.))
+            continue
+        start, stop = M.indptr[j], M.indptr[j+1]
+        idx, vals, shift = M.indices[start:stop], np.asarray(M.data[start:stop], np.float), 0.
+        if isinstance(X, normalize):
+            if X.center:
+                shift = -vals.sum() / n
+            if X.scale:
+                vals = vals / X.col_stds[j]
+                shift /= X.col_stds[j]
+        columns.append((idx, vals, shift))
+    return columns
+
+class squared_error_loss(object):
+    """
+    The loss coef/2 * ||eta - Y||^2 of the linear predictor eta,
+    as in `regreg.quadratic.squared_error`.
+    """
+
+    # the quadratic approximation is exact
+    quadratic = True
+
+    def __init__(self, Y, coef=1.):
+        self.Y = np.asarray(Y, np.float)
+        self.coef = coef
+
+    def value(self, eta):
+        return 0.5 * self.coef * ((eta - self.Y)**2).sum()
+
+    def gradient(self, eta):
+        return self.coef * (eta - self.Y)
+
+    def hessian(self, eta):
+        """
+        Diagonal of the Hessian, as a scalar.
+        """
+        return self.coef
+
+class logistic_loss(object):
+    """
+    The loss 2*coef/n * sum(trials*log(1+exp(eta)) - Y*eta)
+    of the linear predictor eta, as in `regreg.smooth.logistic_loss`.
+    """
+
+    quadratic = False
+    # smallest weight relative to the bound coef * trials / 4
+    min_weight = 1.e-5
+
+    def __init__(self, Y, trials=None, coef=1.):
+        self.Y = np.asarray(Y, np.float)
+        if trials is None:
+            trials = np.ones(self.Y.shape)
+        self.trials = trials
+        self.coef = 2. * coef / self.Y.shape[0]
+
+    def value(self, eta):
+        return self.coef * (self.trials * np.logaddexp(0, eta) - self.Y * eta).sum()
+
+    def gradient(self, eta):
+        return self.coef * (self.trials * expit(eta) - self.Y)
+
+    def hessian(self, eta):
+        """
+        Diagonal of the Hessian, bounded below.
+        """
+        prob = expit(eta)
+        return self.coef * self.trials * np.maximum(prob * (1 - prob), 
+                                                    self.min_weight / 4.)
+
+class coordinate_descent(object):
+
+    r"""
+    Minimize
+
+    .. math::
+
+       \ell(X\beta) + \mathcal{P}(\beta) + \frac{\rho}{2} \|\beta_P\|^2_2
+
+    over $\beta$, where $\mathcal{P}$ is a `regreg.group_lasso.group_lasso`
+    penalty and $\beta_P$ are the penalized coefficients.
+
+    Each coordinate with label `UNPENALIZED`, `L1_PENALTY` or
+    `POSITIVE_PART` is a block of its own, each group is one block.
+
+    The loss is replaced by its quadratic approximation at the
+    current linear predictor $\eta_0$
+
+    .. math::
+
+       \ell(\eta_0) + \nabla \ell(\eta_0)^T(\eta-\eta_0) +
+       \frac{1}{2} (\eta-\eta_0)^TW(\eta-\eta_0)
+
+    with $W$ the diagonal of the Hessian of the loss, and the
+    approximate problem is solved by coordinate descent (for logistic
+    loss this is an IRLS step, which is shortened if it does not
+    decrease the objective). The gradient of the approximation is
+    updated along with the linear predictor, at the cost of
+    one column for each coordinate whose value changes.
+    Each pass sweeps over all blocks, then over the nonzero blocks
+    until these have converged.
+    """
+
+    def __init__(self, X, loss, penalty, ridge=0., initial=None):
+        """
+        Parameters
+        ----------
+        X : [ndarray, scipy.sparse, normalize]
+            Design matrix.
+
+        loss : [squared_error_loss, logistic_loss]
+            Loss of the linear predictor.
+
+        penalty : group_lasso
+            Penalty, whose lagrange is read at each call to solve.
+
+        ridge : float
+            Ridge penalty for the penalized coefficients.
+
+        initial : ndarray
+            Initial coefficients, zero if None.
+        """
+        self.X = X
+        self.loss = loss
+        self.penalty = penalty
+        self.ridge = ridge
+
+        if isinstance(X, normalize):
+            n, p = X.dual_shape[0], X.primal_shape[0]
+        else:
+            n, p = X.shape
+        structure = np.asarray(penalty.penalty_structure)
+        if initial is None:
+            self.coefs = np.zeros(p)
+        else:
+            self.coefs = np.array(initial, np.float)
+
+        self._columns = _design_columns(X)
+        self.linear_predictor = np.zeros(n)
+        for j in np.nonzero(self.coefs)[0]:
+            self._add_column(j, self.coefs[j], self.linear_predictor)
+
+        self._scalar_blocks = [j for j in range(p) if structure[j] in 
+                               [UNPENALIZED, L1_PENALTY, POSITIVE_PART]]
+        self._group_blocks = [(label, np.nonzero(penalty._groups == label)[0]) 
+                              for label in np.unique(penalty._groups[penalty._groups >= 0])]
+        self._set_weights(loss.hessian(self.linear_predictor))
+
+    @classmethod
+    def squared_error(cls, X, Y, penalty, coef=1., **keyword_args):
+        return cls(X, squared_error_loss(Y, coef=coef), penalty, **keyword_args)
+
+    @classmethod
+    def logistic(cls, X, Y, penalty, trials=None, coef=1., **keyword_args):
+        return cls(X, logistic_loss(Y, trials=trials, coef=coef), penalty,
+                   **keyword_args)
+
+    def _dot_column(self, j, v, v_sum):
+        """
+        Inner product of column j with v, whose sum is v_sum.
+        """
+        idx, vals, shift = self._columns[j][:3]
+        if idx is None:
+            value = np.dot(vals, v)
+        else:
+            value = np.dot(vals, v[idx])
+        if shift:
+            value += shift * v_sum
+        return value
+
+    def _add_column(self, j, delta, v, weights=1.):
+        """
+        Add delta times weights times column j to v in place.
+        """
+        idx, vals, shift = self._columns[j][:3]
+        if idx is None:
+            v += delta * weights * vals
+        elif np.isscalar(weights):
+            v[idx] += (delta * weights) * vals
+        else:
+            v[idx] += delta * weights[idx] * vals
+        if shift:
+            v += (delta * shift) * weights
+
+    def _update_coef(self, j, delta):
+        """
+        Change coefficient j by delta, updating the linear predictor
+        and the gradient of the quadratic approximation.
+        """
+        self.coefs[j] += delta
+        self._add_column(j, delta, self.linear_predictor)
+        self._add_column(j, delta, self._gradient, self._weights)
+        self._gradient_sum += delta * self._weighted_sums[j]
+
+    def _set_weights(self, weights):
+        """
+        Set the diagonal W of the quadratic approximation, and the
+        blocks (label, indices, weight, curvature) where curvature
+        is the largest eigenvalue of the block of X^TWX.
+        """
+        self._weights = weights
+        n = self.linear_predictor.shape[0]
+        weights = np.ones(n) * weights
+        total = weights.sum()
+
+        # the sums of W times each column
+        self._weighted_sums = {}
+        self.blocks = []
+        for j in self._scalar_blocks:
+            idx, vals, shift = self._columns[j]
+            if idx is not None:
+                w = weights[idx]
+            else:
+                w = weights
+            self._weighted_sums[j] = np.dot(w, vals) + shift * total
+            curvature = np.dot(w, vals * (vals + 2 * shift)) + shift**2 * total
+            label = self.penalty.penalty_structure[j]
+            self.blocks.append((label, j, 1., curvature))
+        for label, group in self._group_blocks:
+            columns = np.zeros((n, group.shape[0]))
+            for i, j in enumerate(group):
+                self._add_column(j, 1., columns[:,i])
+            weighted = columns * weights[:,np.newaxis]
+            for i, j in enumerate(group):
+                self._weighted_sums[j] = weighted[:,i].sum()
+            hessian = np.dot(columns.T, weighted)
+            self.blocks.append((label, group, self.penalty._weight_array[label],
+                                np.linalg.eigvalsh(hessian).max()))
+
+    def _approximate(self):
+        """
+        Approximate the loss at the current linear predictor.
+        """
+        self._eta0 = self.linear_predictor.copy()
+        self._value0 = self.loss.value(self._eta0)
+        self._gradient0 = self.loss.gradient(self._eta0)
+        if not self.loss.quadratic:
+            self._set_weights(self.loss.hessian(self._eta0))
+        self._gradient = self._gradient0.copy()
+        self._gradient_sum = self._gradient.sum()
+
+    def _penalty_objective(self):
+        penalized = np.asarray(self.penalty.penalty_structure) != UNPENALIZED
+        return (self.penalty.nonsmooth_objective(self.coefs) +
+                0.5 * self.ridge * (self.coefs[penalized]**2).sum())
+
+    def _approximate_objective(self):
+        """
+        Objective with the loss replaced by its quadratic approximation.
+        """
+        # the gradient is gradient0 + W(eta-eta0)
+        loss = self._value0 + 0.5 * np.dot(self._gradient0 + self._gradient, 
+                                           self.linear_predictor - self._eta0)
+        return loss + self._penalty_objective()
+
+    def objective(self):
+        """
+        Objective at self.coefs.
+        """
+        return self.loss.value(self.linear_predictor) + self._penalty_objective()
+
+    def update_block(self, block, lagrange):
+        """
+        Update the coefficients of one block, returning True
+        if they are nonzero.
+        """
+        label, idx, weight, curvature = block
+        if curvature + self.ridge == 0: # the block does not change the objective
+            return False
+        if np.isscalar(idx):
+            grad = self._dot_column(idx, self._gradient, self._gradient_sum)
+            old = self.coefs[idx]
+            if label == UNPENALIZED:
+                if curvature == 0:
+                    return False
+                new = old - grad / curvature
+            else:
+                curvature += self.ridge
+                center = (curvature - self.ridge) * old - grad
+                if label == L1_PENALTY:
+                    new = np.sign(center) * max(np.fabs(center) - lagrange, 0) / curvature
+                else:
+                    new = max(center - lagrange, 0) / curvature
+            if new != old:
+                self._update_coef(idx, new - old)
+            return new != 0
+
+        old = self.coefs[idx].copy()
+        grad = np.array([self._dot_column(j, self._gradient, self._gradient_sum) 
+                         for j in idx]) + self.ridge * old
+        curvature += self.ridge
+        center = old - grad / curvature
+        norm = np.linalg.norm(center)
+        if norm > 0:
+            new = center * max(1 - lagrange * weight / (curvature * norm), 0)
+        else:
+            new = center
+        for j, delta in zip(idx, new - old):
+            if delta != 0:
+                self._update_coef(j, delta)
+        return np.any(new != 0)
+
+    def sweep(self, blocks):
+        """
+        Update each block in turn, returning the blocks
+        whose coefficients are nonzero.
+        """
+        lagrange = self.penalty.lagrange
+        return [block for block in blocks if self.update_block(block, lagrange)]
+
+    def solve(self, tol=1.e-5, max_its=1000, min_its=1, debug=False):
+        """
+        Run coordinate descent until a sweep over all blocks
+        changes the objective by less than tol, relative to
+        max(1, |objective|).
+
+        Parameters
+        ----------
+        tol : float
+              the tolerance used in the stopping criterion
+        max_its : int
+              the maximum number of sweeps over all blocks
+        min_its : int
+              the minimum number of sweeps over all blocks
+        debug : bool
+              Print the objective after each majorization is solved?
+
+        Returns
+        -------
+        coefs : ndarray
+              The solution, also stored as self.coefs.
+        """
+        current_obj = self.objective()
+        itercount = 0
+        while itercount < max_its:
+            self._approximate()
+            coefs0 = self.coefs.copy()
+            model_obj = current_obj
+            while itercount < max_its:
+                active = self.sweep(self.blocks)
+                itercount += 1
+                trial_obj = self._approximate_objective()
+                if itercount >= min_its and np.fabs(trial_obj - model_obj) < tol * max(np.fabs(model_obj), 1.):
+                    break
+                model_obj = trial_obj
+
+                # iterate on the active blocks
+                while active:
+                    active = self.sweep(active)
+                    active_obj = self._approximate_objective()
+                    if np.fabs(active_obj - model_obj) < tol * max(np.fabs(model_obj), 1.):
+                        model_obj = active_obj
+                        break
+                    model_obj = active_obj
+
+            trial_obj = self.objective()
+            if not self.loss.quadratic:
+                # shorten the step until the objective decreases
+                step = 1.
+                while trial_obj > current_obj and step > 1.e-10:
+                    step /= 2.
+                    self.coefs[:] = (self.coefs + coefs0) / 2.
+                    self.linear_predictor[:] = (self.linear_predictor + self._eta0) / 2.
+                    trial_obj = self.objective()
+            if debug:
+                print "%i    obj: %.6e    active blocks: %d" % (itercount, trial_obj, len(active))
+            if self.loss.quadratic or np.fabs(trial_obj - current_obj) < tol * max(np.fabs(current_obj), 1.):
+                break
+            current_obj = trial_obj
+        self.iterations = itercount
+        return self.coefs
@@ -0,0 +1,211 @@
+"""
+K-fold cross-validation of `regreg.paths.lasso`.
+
+All folds share the lagrange sequence and the Lipschitz constant
+of the full data. The column means and standard deviations of each
+training set are found by downdating those of the full data
+with column sums over each fold, computed once.
+Worker processes inherit the design from the parent process instead of
+receiving a copy with each fold, and each forms the design
+of its training rows once, through the rows argument of lasso.
+"""
+
+from copy import copy
+from multiprocessing import Pool
+
+import numpy as np
+import scipy.sparse
+
+from .paths import lasso, logistic_factory, squared_error_factory, _single_threaded
+
+# design and response for the workers of lasso_cv.main, set before
+# the process pool is created so that workers share them with the parent
+_shared = {}
+
+class lasso_cv(object):
+
+    def __init__(self, loss_factory, X, nfold=10, folds=None, **lasso_keywords):
+        """
+        Parameters
+        ----------
+        loss_factory : regreg.paths.loss_factory
+            Loss factory for the full data.
+
+        X : [ndarray, scipy.sparse]
+            Design matrix, without an intercept column.
+
+        nfold : int
+            Number of folds if folds is None.
+
+        folds : ndarray
+            Fold label of each row of X, in range(nfold). Random if None.
+
+        lasso_keywords : dict
+            Keyword arguments for regreg.paths.lasso.
+        """
+        self.loss_factory = loss_factory
+        self.X = X
+        self.lasso_keywords = lasso_keywords
+        n = X.shape[0]
+        if folds is None:
+            folds = np.random.permutation(np.arange(n) % nfold)
+        self.folds = np.asarray(folds)
+        self.nfold = self.folds.max() + 1
+
+        # the path for the full data
+        self.path = lasso(loss_factory, X, **lasso_keywords)
+
+        # sums of the columns and their squares over each fold
+        indicators = scipy.sparse.csr_matrix((np.ones(n), (self.folds, np.arange(n))),
+                                             shape=(self.nfold, n))
+        if scipy.sparse.issparse(X):
+            self._fold_sums = np.asarray((indicators * X).todense())
+            self._fold_sums2 = np.asarray((indicators * X.multiply(X)).todense())
+        else:
+            self._fold_sums = indicators * X
+            self._fold_sums2 = indicators * X**2
+
+    @property
+    def lagrange_sequence(self):
+        return self.path.lagrange_sequence
+
+    def fold_moments(self, fold):
+        """
+        Column means and standard deviations (dividing by n)
+        of X with the rows in fold removed, as used by normalize.
+        """
+        n = self.X.shape[0] - (self.folds == fold).sum()
+        sums = self._fold_sums.sum(0) - self._fold_sums[fold]
+        sums2 = self._fold_sums2.sum(0) - self._fold_sums2[fold]
+        means = sums / n
+        if self.path.center:
+            stds = np.sqrt(np.maximum(sums2 / n - means**2, 0))
+        else:
+            stds = np.sqrt(sums2 / n)
+        return means, stds
+
+    def main(self, inner_tol=1.e-5, processes=None):
+        """
+        Compute the cross-validation error curve along
+        self.lagrange_sequence.
+
+        Parameters
+        ----------
+        inner_tol : float
+            Tolerance for the path of each fold.
+
+        processes : int
+            Number of worker processes, as in multiprocessing.Pool.
+            If 1, the folds are fitted in this process.
+
+        Returns
+        -------
+        output : dict
+            'lagrange': the lagrange sequence,
+            'cvm': mean prediction error for each lagrange,
+            'cvsd': its standard error,
+            'fold_errors': mean prediction error in each fold,
+            'lagrange_min': lagrange with smallest cvm,
+            'lagrange_1se': largest lagrange whose cvm is within
+            one standard error of the smallest.
+        """
+        lseq = self.lagrange_sequence
+        # only a starting guess for the inverse step size in each fold
+        self.path.lipschitz
+
+        global _shared
+        _shared['cv'] = self
+        _shared['inner_tol'] = inner_tol
+        try:
+            if processes == 1:
+                results = map(_fit_fold, range(self.nfold))
+            else:
+                pool = Pool(processes, initializer=_init_worker)
+                try:
+                    results = pool.map(_fit_fold, range(self.nfold))
+                    pool.close()
+                except:
+                    pool.terminate()
+                    raise
+                finally:
+                    pool.join()
+        finally:
+            _shared.clear()
+
+        error_sums = np.array([r[0] for r in results])
+        sizes = np.array([r[1] for r in results], np.float)
+        fold_errors = error_sums / sizes[:,np.newaxis]
+        cvm = error_sums.sum(0) / sizes.sum()
+        cvsd = np.sqrt((sizes[:,np.newaxis] * (fold_errors - cvm)**2).sum(0) /
+                       sizes.sum() / (self.nfold - 1))
+
+        idx_min = np.argmin(cvm)
+        # lseq is decreasing
+        idx_1se = np.nonzero(cvm <= cvm[idx_min] + cvsd[idx_min])[0].min()
+        return {'lagrange': lseq,
+                'cvm': cvm,
+                'cvsd': cvsd,
+                'fold_errors': fold_errors,
+                'lagrange_min': lseq[idx_min],
+                'lagrange_1se': lseq[idx_1se]}
+
+    # Some common loss factories
+
+    @classmethod
+    def logistic(cls, X, Y, *args, **keyword_args):
+        return cls(logistic_factory(Y), X, *args, **keyword_args)
+
+    @classmethod
+    def squared_error(cls, X, Y, *args, **keyword_args):
+        return cls(squared_error_factory(Y), X, *args, **keyword_args)
+
+def _init_worker():
+    """
+    Initializer of the workers of lasso_cv.main: the paths of
+    the folds inherit the settings of cv.path.
+    """
+    _single_threaded(_shared['cv'].path)
+
+def _fit_fold(fold):
+    """
+    Fit the path with one fold held out for lasso_cv.main, returning
+    the sum of the prediction errors in the fold for each
+    lagrange and the size of the fold.
+    """
+    cv = _shared['cv']
+    test = cv.folds == fold
+    train = ~test
+    means, stds = cv.fold_moments(fold)
+
+    train_factory = copy(cv.loss_factory)
+    train_factory.response = cv.loss_factory.response[train]
+    keywords = dict(cv.lasso_keywords)
+    if cv.path.scale:
+        keywords['col_stds'] = stds
+    path = lasso(train_factory, cv.X, rows=np.nonzero(train)[0], **keywords)
+    path.threads, path.KKT_threads = cv.path.threads, cv.path.KKT_threads
+    path._lipschitz = cv.path._lipschitz
+    path.lagrange_sequence = cv.lagrange_sequence
+    output = path.main(inner_tol=_shared['inner_tol'])
+
+    # coefficients on the original scale
+    beta = output['beta'].toarray()
+    scalings = output['scalings']
+    beta[scalings > 0] /= scalings[scalings > 0][:,np.newaxis]
+
+    if path.intercept:
+        intercept, beta = beta[0], beta[1:]
+    else:
+        intercept = 0
+    if path.center:
+        intercept = intercept - np.dot(means, beta)
+
+    X_test = cv.X[test]
+    if scipy.sparse.issparse(X_test):
+        linear_predictor = X_test * beta + intercept
+    else:
+        linear_predictor = np.dot(X_test, beta) + intercept
+
+    test_factory = copy(cv.loss_factory)
+    test_factory.response = cv.loss_factory.response[test]
+    return test_factory.errors(linear_predictor).sum(0), test.sum()
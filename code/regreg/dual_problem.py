@@ -10,9 +10,10 @@ from .affine import (vstack as afvstack, identity as afidentity, power_L,
                      scalar_multiply, adjoint)
 from .separable import separable
 from .smooth import smooth_atom, affine_smooth
-from .atoms import affine_atom as nonsmooth_affine_atom
+from .atoms import affine_atom as nonsmooth_affine_atom, atom as seminorm_atom
 from .cones import zero_constraint, zero as zero_nonsmooth, affine_cone
 from .identity_quadratic import identity_quadratic
+from .precision import default_dtype
 
 class dual_problem(composite):
     """
@@ -44,7 +45,7 @@ class dual_problem(composite):
 
         # the dual problem has f^*(-D^Tu) as objective
         self.affine_fc = affine_smooth(self.f_conjugate, scalar_multiply(adjoint(self.transform), -1))
-        self.coefs = np.zeros(self.affine_fc.primal_shape)
+        self.coefs = np.zeros(self.affine_fc.primal_shape, default_dtype())
 
     # the quadratic is delegated to 
     @property
@@ -131,3 +132,97 @@ def stacked_dual(shape, *primary_atoms):
         _dual = (transforms[0], dual_atoms[0])
     return _dual
 
+
+def duality_gap(x, smooth_atoms, atom):
+    r"""
+    Compute a duality gap at x for the problem
+
+    .. math::
+
+       \minimize_x \sum_k f_k(D_kx+\alpha_k) + h(x)
+
+    where each :math:`f_k` is a smooth atom (or an affine_smooth
+    wrapping one) and :math:`h` is a nonsmooth atom. The dual problem is
+
+    .. math::
+
+       \maximize_{u_k} -\sum_k \left(f_k^*(u_k) - u_k^T\alpha_k\right) 
+       - h^*\left(-\sum_k D_k^Tu_k\right)
+
+    and the dual point is :math:`u_k=s \nabla f_k(D_kx+\alpha_k)`
+    where :math:`s \in [0,1]` is chosen so that
+    :math:`h^*` is finite when :math:`h` is a seminorm in Lagrange form.
+    The gap bounds the suboptimality of x, and it converges to 0
+    as x converges to the primal optimum.
+
+    Parameters
+    ----------
+
+    x : np.ndarray
+        Primal point.
+
+    smooth_atoms : [smooth_atom]
+        Smooth atoms implementing conjugate_objective, possibly
+        composed with affine transforms through affine_smooth.
+
+    atom : nonsmooth
+        A nonsmooth atom without offset or quadratic.
+
+    Returns
+    -------
+
+    gap : float
+        Difference of primal and dual objectives.
+
+    primal_value : float
+        Primal objective at x.
+
+    dual_value : float
+        Dual objective at the dual point.
+
+    """
+    if atom.offset is not None or not atom.quadratic.iszero:
+        raise NotImplementedError('duality gap only implemented for atoms without offset or quadratic')
+
+    primal_value = atom.nonsmooth_objective(x)
+    grad = np.zeros(x.shape)
+    duals = []
+    for f in smooth_atoms:
+        if not f.quadratic.iszero:
+            raise NotImplementedError('duality gap only implemented for smooth atoms without quadratic')
+        if isinstance(f, affine_smooth):
+            loss, transform = f.sm_atom, f.affine_transform
+            v, u = loss.smooth_objective(f.linear_predictor(x), 'both')
+            grad += transform.adjoint_map(u).reshape(x.shape)
+            duals.append((loss, u, getattr(transform, 'affine_offset', None)))
+        else:
+            v, u = f.smooth_objective(x, 'both')
+            grad += u
+            duals.append((f, u, None))
+        primal_value += v
+
+    scale, dual_value = _scale_dual(atom, -grad)
+    dual_value = -dual_value
+    for loss, u, offset in duals:
+        dual_value -= loss.conjugate_objective(scale * u)
+        if offset is not None:
+            dual_value += scale * np.sum(u * offset)
+    return primal_value - dual_value, primal_value, dual_value
+
+def _scale_dual(atom, w):
+    r"""
+    Return a scaling :math:`s \in [0,1]` and the value :math:`h^*(sw)`
+    for the conjugate of a nonsmooth atom :math:`h`.
+    Seminorms in Lagrange form have :math:`h^*(sw)=0` after scaling,
+    other atoms are not scaled.
+    """
+    if hasattr(atom, 'dual_seminorm'):
+        norm, lagrange = atom.dual_seminorm(w), atom.lagrange
+    elif isinstance(atom, seminorm_atom) and atom.bound is None:
+        norm = atom.conjugate.seminorm(w, lagrange=1., check_feasibility=True)
+        lagrange = atom.lagrange
+    else:
+        return 1., atom.conjugate.nonsmooth_objective(w, check_feasibility=True)
+    if norm > lagrange:
+        return lagrange / norm, 0.
+    return 1., 0.
@@ -5,12 +5,14 @@ problems.
 
 """
 import numpy as np
+from scipy import sparse
 from atoms import atom, conjugate_seminorm_pairs
 import warnings
 from affine import linear_transform, composition, affine_sum, power_L
 from smooth import smooth_atom
 from composite import composite
 from algorithms import FISTA
+from precision import default_dtype
 
 try:
     from projl1_cython import projl1
@@ -100,6 +102,252 @@ class factored_matrix(object):
         else:
             return self.linear_map(x) + affine_offset
 
+class block_krylov(object):
+
+    """
+    Leading singular triplets of a linear transform X by a restarted
+    block Lanczos iteration on :math:`X^TX` with full reorthogonalization.
+
+    Along with an orthonormal basis K of the Krylov space, W = XK,
+    G = X^TXK and T = W^TW are kept, so Rayleigh-Ritz approximations and their
+    residuals :math:`\|X^Tu - dv\|_2` cost no products with X.
+    Leading triplets whose residual is below tol times the largest
+    singular value are locked: they are kept aside and deflated, the basis
+    being orthogonal to their right singular vectors. When the basis
+    is full it is restarted from the leading unconverged Ritz vectors.
+    Locked triplets and the basis persist between calls to svd,
+    so asking for a larger rank continues from the subspace found.
+
+    The number of products of X or X^T with a vector is kept in matvecs.
+    """
+
+    # number of blocks added to the basis before a restart
+    max_blocks = 8
+
+    def __init__(self, transform, block_size=1, initial=None, debug=False):
+        """
+        Parameters
+        ----------
+
+        transform : ndarray or affine_transform
+
+        block_size : int
+            Number of random starting vectors if initial is None.
+
+        initial : ndarray
+            Approximate left singular vectors, as for partial_svd:
+            the starting block is X^T initial.
+
+        debug : bool
+        """
+        if isinstance(transform, np.ndarray):
+            transform = linear_transform(transform)
+        self.transform = transform
+        self.debug = debug
+        self.matvecs = 0
+        self._primal_size = int(np.prod(transform.primal_shape))
+        q = self._primal_size
+        self.K = np.zeros((q,0))
+        self.G = np.zeros((q,0))
+        self.W = None
+        self.T = np.zeros((0,0))
+        self.locked = [None, np.zeros(0), np.zeros((q,0))]
+        if initial is not None and initial.size:
+            initial = initial.reshape((initial.shape[0], -1))
+            start = self._adjoint(initial)
+        else:
+            start = np.random.standard_normal((q, block_size))
+        self.block_size = start.shape[1]
+        self._last = slice(0, self._add(start))
+
+    def _linear(self, V):
+        self.matvecs += V.shape[1]
+        T = self.transform
+        if V.shape[1] > 1 and len(T.primal_shape) == 1:
+            return T.linear_map(V)
+        return np.array([T.linear_map(v.reshape(T.primal_shape)).reshape(-1)
+                         for v in V.T]).T
+
+    def _adjoint(self, U):
+        self.matvecs += U.shape[1]
+        T = self.transform
+        if U.shape[1] > 1 and len(T.primal_shape) == 1:
+            return T.adjoint_map(U)
+        return np.array([T.adjoint_map(u.reshape(T.dual_shape)).reshape(-1)
+                         for u in U.T]).T
+
+    def _add(self, block):
+        """
+        Orthogonalize block against the locked right singular vectors
+        and the basis and append what is left of it to the basis.
+        Returns the number of columns added.
+        """
+        scale = np.linalg.norm(block)
+        if scale == 0:
+            return 0
+        V = self.locked[2]
+        for _ in range(2):
+            block = block - np.dot(V, np.dot(V.T, block))
+            block = block - np.dot(self.K, np.dot(self.K.T, block))
+        Q, S, _ = np.linalg.svd(block, full_matrices=0)
+        Q = Q[:,S > 1.e-10 * scale]
+        if not Q.shape[1]:
+            return 0
+        XQ = self._linear(Q)
+        if self.W is None:
+            self.W = XQ
+            self.T = np.dot(XQ.T, XQ)
+        else:
+            cross = np.dot(self.W.T, XQ)
+            self.T = np.vstack([np.hstack([self.T, cross]),
+                                np.hstack([cross.T, np.dot(XQ.T, XQ)])])
+            self.W = np.hstack([self.W, XQ])
+        self.K = np.hstack([self.K, Q])
+        self.G = np.hstack([self.G, self._adjoint(XQ)])
+        return Q.shape[1]
+
+    def extend(self):
+        """
+        Add the next block :math:`X^TXQ` of the Krylov space, Q being
+        the last block added. Returns the number of columns added,
+        0 once the space is invariant.
+        """
+        start = self.K.shape[1]
+        added = self._add(self.G[:,self._last])
+        self._last = slice(start, start + added)
+        return added
+
+    def ritz_values(self):
+        """
+        Eigenvalues of :math:`K^TX^TXK`, the squares of the Ritz
+        approximations to the singular values, in decreasing order.
+        """
+        return np.linalg.eigvalsh(self.T)[::-1]
+
+    def ritz(self):
+        """
+        Rayleigh-Ritz approximations from the basis: U, D, V with
+        XV = U diag(D) (exactly), the residuals
+        :math:`\|X^Tu_i - d_iv_i\|_2` and the coordinates Z of V in the basis.
+        """
+        U, D, ZT = np.linalg.svd(self.W, full_matrices=0)
+        Z = ZT.T
+        V = np.dot(self.K, Z)
+        R = np.dot(self.G, Z) - V * D**2
+        resid = np.sqrt(np.sum(R**2, 0)) / np.maximum(D, np.finfo(float).tiny)
+        return U, D, V, resid, Z
+
+    def _restart(self, Z, U, D, keep):
+        """
+        Restart the basis from the Ritz vectors KZ[:,keep].
+        The next block is spanned by their residuals.
+        """
+        self.K = np.dot(self.K, Z[:,keep])
+        self.W = U[:,keep] * D[keep]
+        self.T = np.diag(D[keep]**2)
+        self.G = np.dot(self.G, Z[:,keep])
+        self._last = slice(0, self.K.shape[1])
+
+    def svd(self, r, tol=1.e-8, extra_rank=2, max_its=1000):
+        """
+        The leading r singular triplets of X as U, D, VT, in the format
+        of partial_svd, with fewer triplets if the rank of X is below r.
+
+        Parameters
+        ----------
+
+        r : int
+            Number of triplets.
+
+        tol : float
+            Triplets are locked when their residual is below tol times
+            the largest singular value.
+
+        extra_rank : int
+            Number of Ritz vectors, beyond those still needed, kept
+            at a restart.
+
+        max_its : int
+            Maximum number of blocks added to the basis.
+        """
+        its = 0
+        while self.locked[1].shape[0] < r:
+            needed = r - self.locked[1].shape[0]
+            max_basis = needed + extra_rank + self.max_blocks * self.block_size
+            invariant = False
+            if not self.K.shape[1]:
+                # the last invariant subspace is locked, deflate it
+                # and start again from a random block
+                start = np.random.standard_normal((self._primal_size, self.block_size))
+                if not self._add(start):
+                    break
+                self._last = slice(0, self.K.shape[1])
+            while self.K.shape[1] < max_basis and its < max_its:
+                if not self.extend():
+                    invariant = True
+                    break
+                its += 1
+            if self.W is None or not self.W.shape[1]:
+                break
+            U, D, V, resid, Z = self.ritz()
+            scale = max(D.max(), self.locked[1].max() if self.locked[1].shape[0] else 0)
+            if scale == 0:
+                break
+            if invariant or its >= max_its:
+                # the triplets are exact, or as good as they get
+                nlock = D.shape[0]
+            else:
+                converged = resid <= tol * scale
+                nlock = np.argmin(np.hstack([converged, False]))
+            nlock = min(nlock, needed)
+            if self.debug:
+                print 'block_krylov', its, self.matvecs, nlock, D[:5]
+            if nlock:
+                Ul, Dl, Vl = self.locked
+                self.locked = [U[:,:nlock] if Ul is None else np.hstack([Ul, U[:,:nlock]]),
+                               np.hstack([Dl, D[:nlock]]),
+                               np.hstack([Vl, V[:,:nlock]])]
+            self._restart(Z, U, D, slice(nlock, needed + extra_rank))
+            if its >= max_its:
+                break
+        U, D, V = self.locked
+        if U is None:
+            p = int(np.prod(self.transform.dual_shape))
+            U = np.zeros((p,0))
+        order = np.argsort(-D)[:r]
+        return U[:,order], D[order], V[:,order].T
+
+def block_krylov_svd(transform,
+                     r=1,
+                     extra_rank=2,
+                     max_its=1000,
+                     tol=1e-8,
+                     initial=None,
+                     return_full=False,
+                     return_matvecs=False,
+                     debug=False):
+
+    """
+    Compute the partial SVD of the linear_transform X with block_krylov,
+    a drop-in replacement for partial_svd. With return_matvecs, the
+    number of products with X or X^T is returned as well.
+    """
+
+    engine = block_krylov(transform, block_size=r + extra_rank, 
+                          initial=initial, debug=debug)
+    if return_full:
+        r = r + extra_rank
+    U, D, VT = engine.svd(r, tol=tol, extra_rank=extra_rank, max_its=max_its)
+    nonzero = D > 1e-12
+    if nonzero.sum():
+        value = U[:,nonzero], D[nonzero], VT[nonzero]
+    else:
+        n = int(np.prod(engine.transform.dual_shape))
+        value = np.zeros(n), np.zeros((1,1)), np.zeros(engine._primal_size)
+    if return_matvecs:
+        return value + (engine.matvecs,)
+    return value
+
 def compute_iterative_svd(transform,
                           initial_rank = None,
                           initial = None,
@@ -108,7 +356,8 @@ def compute_iterative_svd(transform,
                           debug=False):
 
     """
-    Compute the SVD of a matrix using partial_svd
+    Compute the SVD of a matrix using block_krylov, doubling the rank
+    until a singular value below min_singular is found.
     """
 
     if isinstance(transform, np.ndarray):
@@ -118,21 +367,20 @@ def compute_iterative_svd(transform,
     p = transform.primal_shape[0]
     
     if initial_rank is None:
-        r = np.round(np.min([n,p]) * 0.1) + 1
+        r = int(np.round(np.min([n,p]) * 0.1) + 1)
     else:
-        r = np.max([initial_rank,1])
+        r = int(np.max([initial_rank,1]))
 
-    min_so_far = 1.
-    D = [np.inf]
-    while D[-1] >= min_singular:
+    # the engine keeps the triplets found when the rank is doubled
+    engine = block_krylov(transform, block_size=r + 5, initial=initial, debug=debug)
+    while True:
         if debug:
             print "Trying rank", r
-        U, D, VT = partial_svd(transform, r=r, extra_rank=5, tol=tol, initial=initial, return_full=True, debug=debug)
-        if D[0] < min_singular:
-            return U[:,0], np.zeros((1,1)), VT[0,:]
-        if len(D) < r:
+        U, D, VT = engine.svd(r, tol=tol, extra_rank=5)
+        if not D.shape[0] or D[0] < min_singular:
+            return np.zeros(n), np.zeros((1,1)), np.zeros(p)
+        if D.shape[0] < r or D[-1] < min_singular or r >= min(n, p):
             break
-        initial = 1. * U 
         r *= 2
 
     ind = np.where(D >= min_singular)[0]
@@ -166,6 +414,8 @@ def partial_svd(transform,
             U = initial
         elif len(initial.shape) == 1:
             U = np.hstack([initial.reshape((initial.shape[0],1)), np.random.standard_normal((n,q-1))])            
+        elif initial.shape[1] >= q:
+            U = initial[:,:q]
         else:
             U = np.hstack([initial, np.random.standard_normal((n,q-initial.shape[1]))])            
     else:
@@ -219,3 +469,275 @@ def soft_threshold_svd(X, c=0.):
     return X
 
 
+class low_rank_sparse(factored_matrix):
+
+    """
+    A p x q matrix stored as low-rank factors plus a sparse correction,
+
+    .. math::
+
+       U \text{diag}(D) V^T + S
+
+    with U of shape (p,r), D of shape (r,), VT of shape (r,q) and S
+    a scipy.sparse matrix (or None), taking O((p+q)r + \text{nnz}(S))
+    memory. Unlike factored_matrix, the factors need not be an SVD.
+
+    This is the iterate of completion_problem: the proximal gradient step
+    from a low-rank iterate only changes it on the observed entries,
+    and the SVD in the proximal map of the nuclear norm is computed
+    with linear_map and adjoint_map, see nuclear_norm.truncated_svd.
+
+    Sums keep the factors of their terms as a list of blocks, and
+    blocks with the same U and VT arrays are merged, so the FISTA
+    extrapolation :math:`\beta + w(\beta - X)` has the rank of
+    :math:`\beta` plus that of :math:`X`. The blocks are stacked
+    into SVD when it is first used.
+    """
+
+    entries_chunk = 2**18
+
+    def __init__(self, U, D, VT, S=None):
+        self.affine_offset = None
+        if S is not None:
+            S = sparse.csr_matrix(S)
+        self.S = S
+        self.SVD = [U, D, VT]
+
+    def copy(self):
+        U, D, VT = self.SVD
+        S = self.S
+        if S is not None:
+            S = S.copy()
+        return low_rank_sparse(U.copy(), D.copy(), VT.copy(), S)
+
+    def _getSVD(self):
+        if self._SVD is None:
+            if len(self._blocks) == 1:
+                self._SVD = list(self._blocks[0])
+            else:
+                Us, Ds, VTs = zip(*self._blocks)
+                self._SVD = [np.hstack(Us), np.hstack(Ds), np.vstack(VTs)]
+        return self._SVD
+    def _setSVD(self, SVD):
+        U, D, VT = SVD
+        self.rankone = False
+        self.primal_shape = (VT.shape[1],)
+        self.dual_shape = (U.shape[0],)
+        self._blocks = [(U, np.asarray(D).reshape(-1), VT)]
+        self._SVD = None
+    SVD = property(_getSVD, _setSVD)
+
+    def _from_blocks(self, blocks, S):
+        value = low_rank_sparse(*blocks[0], S=S)
+        value._blocks = blocks
+        return value
+
+    @property
+    def rank(self):
+        """
+        The number of columns of U.
+        """
+        return sum([D.shape[0] for _, D, _ in self._blocks])
+
+    def _getX(self):
+        U, D, VT = self.SVD
+        X = np.dot(U * D, VT)
+        if self.S is not None:
+            X += self.S.toarray()
+        return X
+    X = property(_getX)
+
+    def linear_map(self, x):
+        U, D, VT = self.SVD
+        value = np.dot(U * D, np.dot(VT, x))
+        if self.S is not None:
+            value += self.S * x
+        return value
+
+    def adjoint_map(self, x):
+        U, D, VT = self.SVD
+        value = np.dot(VT.T, np.dot((U * D).T, x))
+        if self.S is not None:
+            value += self.S.T * x
+        return value
+
+    def entries(self, rows, cols):
+        """
+        The entries of the matrix at (rows[i], cols[i]).
+        """
+        U, D, VT = self.SVD
+        UD = U * D
+        value = np.empty(rows.shape[0], UD.dtype)
+        # in chunks of about entries_chunk numbers: gathering the
+        # factors of all entries at once takes len(rows) * rank numbers
+        chunk = max(self.entries_chunk // max(self.rank, 1), 1)
+        for start in range(0, rows.shape[0], chunk):
+            idx = slice(start, start + chunk)
+            value[idx] = np.einsum('ij,ji->i', UD[rows[idx]], VT[:,cols[idx]])
+        if self.S is not None:
+            value += np.asarray(self.S[rows, cols]).reshape(-1)
+        return value
+
+    def __add__(self, other):
+        if self.S is None:
+            S = other.S
+        elif other.S is None:
+            S = self.S
+        else:
+            S = self.S + other.S
+        blocks = list(self._blocks)
+        for oU, oD, oVT in other._blocks:
+            for i, (U, D, VT) in enumerate(blocks):
+                if U is oU and VT is oVT:
+                    blocks[i] = (U, D + oD, VT)
+                    break
+            else:
+                blocks.append((oU, oD, oVT))
+        return self._from_blocks(blocks, S)
+
+    def __mul__(self, scalar):
+        if scalar == 0:
+            # e.g. the first FISTA extrapolation, whose weight is 0
+            U, D, VT = self._blocks[0]
+            return low_rank_sparse(U[:,:0], D[:0], VT[:0])
+        S = self.S
+        if S is not None:
+            S = S * scalar
+        return self._from_blocks([(U, D * scalar, VT) for U, D, VT in self._blocks], S)
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return self * -1
+
+    def __sub__(self, other):
+        return self + (-other)
+
+
+class completion_problem(composite):
+
+    r"""
+    The matrix completion problem
+
+    .. math::
+
+       \text{minimize}_X \frac{1}{2} \|P_{\Omega}(X - Y)\|^2_F + \lambda \|X\|_*
+
+    as a composite whose coefs are low_rank_sparse matrices, so
+    regreg.algorithms.FISTA solves it without forming a p x q array.
+    The gradient :math:`P_{\Omega}(X-Y)` is a low_rank_sparse matrix with
+    only a sparse part, and the proximal map is the truncated proximal map
+    of the nuclear norm, whose results are SVDs with no sparse part.
+
+    :math:`P_{\Omega}` has norm 1, so the Lipschitz constant is 1 and
+    FISTA is run with backtrack=False. Neither inplace mode nor
+    coef_stop apply to low_rank_sparse coefs.
+    """
+
+    def __init__(self, observed, lagrange, initial_rank=10):
+        from svd_norms import nuclear_norm
+
+        observed = sparse.coo_matrix(observed)
+        self.rows, self.cols, self.Y = observed.row, observed.col, observed.data
+        self.shape = observed.shape
+        self.lagrange = lagrange
+
+        self.penalty = nuclear_norm(self.shape, lagrange=lagrange)
+        self.penalty.truncated_prox = True
+        self.penalty.truncated_initial_rank = initial_rank
+
+        self.coefs = self.zero()
+        self.lipschitz = 1.
+
+    def zero(self):
+        """
+        The p x q zero matrix, with rank 0.
+        """
+        p, q = self.shape
+        dtype = default_dtype()
+        return low_rank_sparse(np.zeros((p,0), dtype), np.zeros(0, dtype), 
+                               np.zeros((0,q), dtype))
+
+    def smooth_objective(self, X, mode='both', check_feasibility=False):
+        resid = X.entries(self.rows, self.cols) - self.Y
+        if mode == 'func':
+            return 0.5 * np.sum(resid**2)
+        G = self.zero()
+        G.S = sparse.csr_matrix((resid, (self.rows, self.cols)), shape=self.shape)
+        if mode == 'grad':
+            return G
+        elif mode == 'both':
+            return 0.5 * np.sum(resid**2), G
+        else:
+            raise ValueError("mode incorrectly specified")
+
+    def nonsmooth_objective(self, X, check_feasibility=False):
+        """
+        The nuclear norm term, for X an SVD with no sparse part,
+        as the results of the proximal map are.
+        """
+        return self.lagrange * np.sum(X.SVD[1])
+
+    def proximal(self, proxq, prox_control=None):
+        prox_arg = proxq.center
+        if proxq.linear_term is not None:
+            prox_arg = prox_arg - proxq.linear_term * (1. / proxq.coef)
+        return self.penalty.lagrange_prox(prox_arg, lipschitz=proxq.coef)
+
+    def solve(self, **fit_args):
+        solver = FISTA(self)
+        fit_args['backtrack'] = False
+        solver.fit(**fit_args)
+        return self.coefs
+
+
+def matrix_completion(observed, lagrange, 
+                      initial_rank=10,
+                      max_its=500,
+                      tol=1.e-6,
+                      debug=False,
+                      telemetry=None):
+
+    r"""
+    Solve the matrix completion problem
+
+    .. math::
+
+       \text{minimize}_X \frac{1}{2} \|P_{\Omega}(X - Y)\|^2_F + \lambda \|X\|_*
+
+    with FISTA, keeping the iterates as low_rank_sparse matrices, so
+    no p x q array is formed, see completion_problem.
+
+    Parameters
+    ----------
+
+    observed : scipy.sparse matrix
+        The observed entries of the p x q matrix Y, whose positions are
+        :math:`\Omega`.
+
+    lagrange : float
+        The Lagrange parameter :math:`\lambda`.
+
+    initial_rank : int
+        The rank of the SVD computed in the first proximal step.
+
+    max_its : int
+
+    tol : float
+        Relative decrease in objective at which the algorithm stops.
+
+    debug : bool
+        Print the records of FISTA, see regreg.telemetry.
+
+    telemetry : callable
+        A telemetry sink for FISTA, see regreg.telemetry.
+
+    Returns
+    -------
+
+    solution : low_rank_sparse
+        An SVD of the solution, with no sparse part.
+    """
+
+    problem = completion_problem(observed, lagrange, initial_rank=initial_rank)
+    return problem.solve(max_its=max_its, tol=tol, debug=debug,
+                         telemetry=telemetry)
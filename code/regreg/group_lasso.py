@@ -8,6 +8,7 @@ from .affine import linear_transform, identity as identity_transform, selector
 from .identity_quadratic import identity_quadratic
 from .atoms import _work_out_conjugate
 from .smooth import affine_smooth
+from .precision import default_dtype
 
 # Constants used below
 
@@ -20,7 +21,11 @@ try:
                                      seminorm_group_lasso,
                                      seminorm_group_lasso_conjugate,
                                      strong_set_group_lasso,
-                                     check_KKT_group_lasso)
+                                     check_KKT_group_lasso,
+                                     prox_group_lasso_grouped,
+                                     project_group_lasso_grouped,
+                                     seminorm_group_lasso_grouped,
+                                     check_KKT_group_lasso_grouped)
 except ImportError:
     raise ImportError('need cython module group_lasso_cython')
 
@@ -41,7 +46,15 @@ class group_lasso(nonsmooth):
                  weights={},
                  offset=None,
                  quadratic=None,
-                 initial=None):
+                 initial=None,
+                 threads=1):
+        """
+        The argument threads is the number of threads of the proximal
+        map, seminorm and KKT check. Threads are opt-in: the default
+        of 1 runs the serial loops, as processes solving several
+        problems at once (e.g. regreg.paths.lasso.parallel_main)
+        already use the CPUs.
+        """
         primal_shape = np.asarray(penalty_structure).shape
         nonsmooth.__init__(self, primal_shape, offset,
                            quadratic, initial)
@@ -49,19 +62,31 @@ class group_lasso(nonsmooth):
         self.weights = weights
         self.lagrange = lagrange
         self.penalty_structure = penalty_structure
-        self._groups = -np.ones(self.primal_shape, np.int)
-        groups = set(np.unique(self.penalty_structure)).difference( \
-            set([UNPENALIZED, L1_PENALTY, POSITIVE_PART]))
-        self._weight_array = np.zeros(len(groups))
-
-        self._l1_penalty = np.nonzero(self.penalty_structure == L1_PENALTY)[0]
-        self._positive_part = np.nonzero(self.penalty_structure == POSITIVE_PART)[0]
-        self._unpenalized = np.nonzero(self.penalty_structure == UNPENALIZED)[0]
-
-        for idx, label in enumerate(groups):
-            g = self.penalty_structure == label
-            self._groups[g] = idx
-            self._weight_array[idx] = self.weights.get(label, np.sqrt(g.sum()))
+        self.threads = threads
+
+        structure = np.asarray(self.penalty_structure)
+        self._l1_penalty = np.nonzero(structure == L1_PENALTY)[0]
+        self._positive_part = np.nonzero(structure == POSITIVE_PART)[0]
+        self._unpenalized = np.nonzero(structure == UNPENALIZED)[0]
+
+        labels, label_idx = np.unique(structure, return_inverse=True)
+        grouped = ~np.in1d(labels, [UNPENALIZED, L1_PENALTY, POSITIVE_PART])
+        group_idx = -np.ones(labels.shape, np.int)
+        group_idx[grouped] = np.arange(grouped.sum())
+        self._groups = group_idx[label_idx].astype(np.int)
+
+        # grouped (CSR-like) layout of the coordinates: the members of
+        # group j are _group_members[_group_offsets[j]:_group_offsets[j+1]],
+        # in increasing order
+        members = np.nonzero(self._groups >= 0)[0]
+        order = np.argsort(self._groups[members], kind='mergesort')
+        self._group_members = members[order].astype(np.int)
+        sizes = np.bincount(self._groups[members], minlength=grouped.sum())
+        self._group_offsets = np.hstack([0, np.cumsum(sizes)]).astype(np.int)
+
+        self._weight_array = np.array([self.weights.get(label, np.sqrt(size))
+                                       for label, size in zip(labels[grouped], sizes)],
+                                      np.float)
 
     def __eq__(self, other):
         if self.__class__ == other.__class__:
@@ -77,7 +102,8 @@ class group_lasso(nonsmooth):
                               weights=self.weights,
                               offset=copy(self.offset),
                               initial=self.coefs,
-                              quadratic=self.quadratic)
+                              quadratic=self.quadratic,
+                              threads=self.threads)
     
     def __repr__(self):
         if self.quadratic.iszero:
@@ -105,7 +131,8 @@ class group_lasso(nonsmooth):
                        self.lagrange,
                        weights=self.weights,
                        offset=offset,
-                       quadratic=outq)
+                       quadratic=outq,
+                       threads=self.threads)
         else:
             atom = smooth_conjugate(self)
         self._conjugate = atom
@@ -161,15 +188,46 @@ class group_lasso(nonsmooth):
         
     def seminorm(self, x, check_feasibility=False):
         x_offset = self.apply_offset(x)
-        v = seminorm_group_lasso(x_offset,
-                                 self._l1_penalty,
-                                 self._unpenalized,
-                                 self._positive_part,
-                                 self._groups, 
-                                 self._weight_array,
-                                 int(check_feasibility))
+        v = seminorm_group_lasso_grouped(x_offset,
+                                         self._l1_penalty,
+                                         self._unpenalized,
+                                         self._positive_part,
+                                         self._group_offsets, 
+                                         self._group_members, 
+                                         self._weight_array,
+                                         int(check_feasibility),
+                                         threads=self.threads)
         return v * self.lagrange
 
+    def dual_seminorm(self, u):
+        r"""
+        The smallest :math:`\lambda` such that the conjugate of
+        the seminorm with lagrange :math:`\lambda` is 0 at u
+        (not including the offset or quadratic).
+        This is :math:`\max(\|u_{L1}\|_{\infty}, \max_g \|u_g\|_2 / w_g,
+        \max u_{+})`, and is np.inf if u is nonzero on the
+        unpenalized coordinates or negative on the positive part
+        coordinates.
+        """
+        u = np.asarray(u)
+        if np.any(u[self._unpenalized] != 0):
+            return np.inf
+        upos = u[self._positive_part]
+        if np.any(upos < 0):
+            return np.inf
+        value = 0.
+        if self._l1_penalty.shape[0] > 0:
+            value = max(value, np.fabs(u[self._l1_penalty]).max())
+        if upos.shape[0] > 0:
+            value = max(value, upos.max())
+        grouped = self._groups >= 0
+        if np.any(grouped):
+            norms = np.sqrt(np.bincount(self._groups[grouped],
+                                        weights=u[grouped]**2,
+                                        minlength=self._weight_array.shape[0]))
+            value = max(value, (norms / self._weight_array).max())
+        return value
+
     def proximal(self, proxq, prox_control=None):
         r"""
         The proximal operator. If the atom is in
@@ -194,14 +252,16 @@ class group_lasso(nonsmooth):
         if totalq.coef == 0:
             raise ValueError('lipschitz + quadratic coef must be positive')
 
-        prox_arg = -totalq.linear_term / totalq.coef
+        prox_arg = np.asarray(-totalq.linear_term / totalq.coef, default_dtype())
 
-        eta = prox_group_lasso(prox_arg, self.lagrange, totalq.coef, 
-                               self._l1_penalty,
-                               self._unpenalized,
-                               self._positive_part,
-                               self._groups, 
-                               self._weight_array)
+        eta = prox_group_lasso_grouped(prox_arg, self.lagrange, totalq.coef, 
+                                       self._l1_penalty,
+                                       self._unpenalized,
+                                       self._positive_part,
+                                       self._group_offsets, 
+                                       self._group_members, 
+                                       self._weight_array,
+                                       threads=self.threads)
 
         if offset is None:
             return eta
@@ -225,13 +285,15 @@ class group_lasso_conjugate(group_lasso):
                  weights={},
                  offset=None,
                  quadratic=None,
-                 initial=None):
+                 initial=None,
+                 threads=1):
 
         group_lasso.__init__(self, penalty_structure, bound, 
                              weights=weights,
                              offset=offset,
                              quadratic=quadratic,
-                             initial=initial)
+                             initial=initial,
+                             threads=threads)
         del(self.lagrange)
         self.bound = bound
 #         primal_shape = np.asarray(penalty_structure).shape
@@ -269,7 +331,8 @@ class group_lasso_conjugate(group_lasso):
                               weights=self.weights,
                               offset=copy(self.offset),
                               initial=self.coefs,
-                              quadratic=self.quadratic)
+                              quadratic=self.quadratic,
+                              threads=self.threads)
     
     def __repr__(self):
         if self.quadratic.iszero:
@@ -297,7 +360,8 @@ class group_lasso_conjugate(group_lasso):
                        self.bound,
                        weights=self.weights,
                        offset=offset,
-                       quadratic=outq)
+                       quadratic=outq,
+                       threads=self.threads)
         else:
             atom = smooth_conjugate(self)
         self._conjugate = atom
@@ -386,14 +450,16 @@ class group_lasso_conjugate(group_lasso):
         if totalq.coef == 0:
             raise ValueError('lipschitz + quadratic coef must be positive')
 
-        prox_arg = -totalq.linear_term / totalq.coef
+        prox_arg = np.asarray(-totalq.linear_term / totalq.coef, default_dtype())
 
-        eta = project_group_lasso(prox_arg, self.bound, 
-                                  self._l1_penalty,
-                                  self._unpenalized,
-                                  self._positive_part,
-                                  self._groups, 
-                                  self._weight_array)
+        eta = project_group_lasso_grouped(prox_arg, self.bound, 
+                                          self._l1_penalty,
+                                          self._unpenalized,
+                                          self._positive_part,
+                                          self._group_offsets, 
+                                          self._group_members, 
+                                          self._weight_array,
+                                          threads=self.threads)
 
         if offset is None:
             return eta
@@ -418,13 +484,15 @@ def strong_set(glasso, lagrange_cur, lagrange_new, grad,
 
 def check_KKT(glasso, grad, solution, lagrange, tol=1.e-2):
 
-    failing = check_KKT_group_lasso(grad, 
-                                    solution, 
-                                    lagrange,
-                                    glasso._l1_penalty, 
-                                    glasso._unpenalized,
-                                    glasso._positive_part, 
-                                    glasso._groups,
-                                    glasso._weight_array,
-                                    tol=tol)
+    failing = check_KKT_group_lasso_grouped(np.asarray(grad, np.float), 
+                                            np.asarray(solution, np.float), 
+                                            lagrange,
+                                            glasso._l1_penalty, 
+                                            glasso._unpenalized,
+                                            glasso._positive_part, 
+                                            glasso._group_offsets,
+                                            glasso._group_members,
+                                            glasso._weight_array,
+                                            tol=tol,
+                                            threads=glasso.threads)
     return failing > 0
@@ -1,5 +1,9 @@
 import numpy as np, sys
 cimport numpy as np
+cimport cython
+from cython cimport floating
+from cython.parallel cimport prange
+from libc.math cimport sqrt
 
 """
 Implements prox and dual of group LASSO, strong set, seminorm and dual seminorm.
@@ -12,8 +16,12 @@ ctypedef np.int_t DTYPE_int_t
 
 #TODO: Add some documentation to this!
 
-def prox_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] prox_center, 
-                     DTYPE_float_t lagrange, DTYPE_float_t lipschitz,
+# The arrays of coefficients (prox_center, x) may be float32 or
+# float64 (the fused type floating), and the results have the same dtype.
+# The weights are float64 and the group norms are accumulated in float64.
+
+def prox_group_lasso(np.ndarray[floating, ndim=1] prox_center, 
+                     double lagrange, double lipschitz,
                      np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
                      np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
                      np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
@@ -33,7 +41,8 @@ def prox_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] prox_center,
     
     for j in range(weights.shape[0]):
         norms[j] = np.sqrt(norms[j])
-        projection[groups == j] = prox_center[groups == j] / norms[j] * min(norms[j], lf * weights[j])
+        if norms[j] > 0:
+            projection[groups == j] = prox_center[groups == j] / norms[j] * min(norms[j], lf * weights[j])
     
     projection[l1_penalty] = prox_center[l1_penalty] * np.minimum(1, lf / np.fabs(prox_center[l1_penalty]))
     projection[unpenalized] = 0
@@ -41,8 +50,8 @@ def prox_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] prox_center,
     
     return prox_center - projection
 
-def project_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] prox_center, 
-                     DTYPE_float_t bound, 
+def project_group_lasso(np.ndarray[floating, ndim=1] prox_center, 
+                     double bound, 
                      np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
                      np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
                      np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
@@ -60,7 +69,8 @@ def project_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] prox_center,
     
     for j in range(weights.shape[0]):
         norms[j] = np.sqrt(norms[j])
-        projection[groups == j] = prox_center[groups == j] / norms[j] * min(norms[j], bound * weights[j])
+        if norms[j] > 0:
+            projection[groups == j] = prox_center[groups == j] / norms[j] * min(norms[j], bound * weights[j])
     
     projection[l1_penalty] = prox_center[l1_penalty] * np.minimum(1, bound / np.fabs(prox_center[l1_penalty]))
     projection[unpenalized] = 0
@@ -68,7 +78,7 @@ def project_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] prox_center,
     
     return projection
 
-def seminorm_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] x, 
+def seminorm_group_lasso(np.ndarray[floating, ndim=1] x, 
                          np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
                          np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
                          np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
@@ -78,7 +88,7 @@ def seminorm_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] x,
     
     cdef np.ndarray norms = np.zeros_like(weights)
     cdef int i, j
-    cdef DTYPE_float_t value
+    cdef double value
     cdef int p = groups.shape[0]
     
     for i in range(p):
@@ -100,10 +110,10 @@ def seminorm_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] x,
     return value
 
 
-def strong_set_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] x, 
-                           DTYPE_float_t lagrange_new,
-                           DTYPE_float_t lagrange_cur,
-                           DTYPE_float_t slope_estimate,
+def strong_set_group_lasso(np.ndarray[floating, ndim=1] x, 
+                           double lagrange_new,
+                           double lagrange_cur,
+                           double slope_estimate,
                            np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
                            np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
                            np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
@@ -128,22 +138,18 @@ def strong_set_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] x,
 
     return 1 - value
 
-def check_KKT_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] grad, 
-                          np.ndarray[DTYPE_float_t, ndim=1] solution, 
-                          DTYPE_float_t lagrange,
-                          np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
-                          np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
-                          np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
-                          np.ndarray[DTYPE_int_t, ndim=1] groups,
-                          np.ndarray[DTYPE_float_t, ndim=1] weights,
-			  DTYPE_float_t tol=1.e-2):
-    
-    cdef np.ndarray failing = np.zeros_like(grad)
-    cdef np.ndarray norms = np.zeros_like(weights)
-    cdef np.ndarray snorms = np.zeros_like(weights)
-    cdef int i, j
-    cdef int p = groups.shape[0]
-    
+def _check_KKT_l1_positive(np.ndarray[DTYPE_float_t, ndim=1] grad, 
+                           np.ndarray[DTYPE_float_t, ndim=1] solution, 
+                           np.ndarray[DTYPE_float_t, ndim=1] failing, 
+                           DTYPE_float_t lagrange,
+                           np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
+                           np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
+                           DTYPE_float_t tol):
+    """
+    The checks of check_KKT_group_lasso for the l1 and positive part
+    coordinates, added to failing.
+    """
+
     # L1 check
 
     cdef int debug = 0
@@ -185,6 +191,25 @@ def check_KKT_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] grad,
             print 'positive part (dual) tightness:', -g_pp[active_pp] / lagrange - 1
         failing[positive_part] += failing_pp
 
+def check_KKT_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] grad, 
+                          np.ndarray[DTYPE_float_t, ndim=1] solution, 
+                          DTYPE_float_t lagrange,
+                          np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
+                          np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
+                          np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
+                          np.ndarray[DTYPE_int_t, ndim=1] groups,
+                          np.ndarray[DTYPE_float_t, ndim=1] weights,
+			  DTYPE_float_t tol=1.e-2):
+    
+    cdef np.ndarray failing = np.zeros_like(grad)
+    cdef np.ndarray norms = np.zeros_like(weights)
+    cdef np.ndarray snorms = np.zeros_like(weights)
+    cdef int i, j
+    cdef int p = groups.shape[0]
+    
+    _check_KKT_l1_positive(grad, solution, failing, lagrange, 
+                           l1_penalty, positive_part, tol)
+
     # group norms
 
     for i in range(p):
@@ -207,7 +232,7 @@ def check_KKT_group_lasso(np.ndarray[DTYPE_float_t, ndim=1] grad,
     return failing
 
    
-def seminorm_group_lasso_conjugate(np.ndarray[DTYPE_float_t, ndim=1] x, 
+def seminorm_group_lasso_conjugate(np.ndarray[floating, ndim=1] x, 
                                    np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
                                    np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
                                    np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
@@ -216,7 +241,7 @@ def seminorm_group_lasso_conjugate(np.ndarray[DTYPE_float_t, ndim=1] x,
     
     cdef np.ndarray norms = np.zeros_like(weights)
     cdef int i
-    cdef DTYPE_float_t value
+    cdef double value
     cdef int p = groups.shape[0]
     
     for i in range(p):
@@ -239,3 +264,193 @@ def seminorm_group_lasso_conjugate(np.ndarray[DTYPE_float_t, ndim=1] x,
 
     return value
 
+
+# Versions of the kernels above for the grouped layout of the
+# coordinates built by group_lasso.__init__: the members of group j are
+# group_members[group_offsets[j]:group_offsets[j+1]], in increasing
+# order. Each group is handled by one thread, with the GIL released,
+# in a prange over the groups, instead of a pass over all coordinates
+# for each group. The operations on each group are those of the serial
+# kernels, in the same order, so the results are the same, bit for bit.
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _project_groups(floating[:] x,
+                          floating[:] projection,
+                          DTYPE_int_t[:] group_offsets,
+                          DTYPE_int_t[:] group_members,
+                          DTYPE_float_t[:] weights,
+                          double bound,
+                          int threads):
+    """
+    Project each group of x onto the l2 ball of radius bound * weight.
+    """
+    cdef Py_ssize_t j, k
+    cdef DTYPE_int_t i
+    cdef double norm, factor
+    for j in prange(weights.shape[0], nogil=True, num_threads=threads, schedule='guided'):
+        norm = 0
+        for k in range(group_offsets[j], group_offsets[j+1]):
+            norm = norm + x[group_members[k]]**2
+        norm = sqrt(norm)
+        if norm > 0:
+            factor = bound * weights[j]
+            if norm < factor:
+                factor = norm
+            for k in range(group_offsets[j], group_offsets[j+1]):
+                i = group_members[k]
+                projection[i] = <floating>(<floating>(x[i] / <floating>norm) * <floating>factor)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _group_norms(floating[:] x,
+                       DTYPE_int_t[:] group_offsets,
+                       DTYPE_int_t[:] group_members,
+                       DTYPE_float_t[:] norms,
+                       int threads):
+    """
+    The l2 norm of each group of x.
+    """
+    cdef Py_ssize_t j, k
+    cdef double norm
+    for j in prange(norms.shape[0], nogil=True, num_threads=threads, schedule='guided'):
+        norm = 0
+        for k in range(group_offsets[j], group_offsets[j+1]):
+            norm = norm + x[group_members[k]]**2
+        norms[j] = sqrt(norm)
+
+def prox_group_lasso_grouped(np.ndarray[floating, ndim=1] prox_center, 
+                             double lagrange, double lipschitz,
+                             np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
+                             np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
+                             np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
+                             np.ndarray[DTYPE_int_t, ndim=1] group_offsets,
+                             np.ndarray[DTYPE_int_t, ndim=1] group_members,
+                             np.ndarray[DTYPE_float_t, ndim=1] weights,
+                             int threads=1):
+
+    cdef np.ndarray[floating, ndim=1] projection = np.zeros_like(prox_center)
+    
+    cdef double lf = lagrange / lipschitz
+
+    cdef floating[:] x_view = prox_center, projection_view = projection
+    cdef DTYPE_int_t[:] offsets_view = group_offsets, members_view = group_members
+    cdef DTYPE_float_t[:] weights_view = weights
+    _project_groups(x_view, projection_view, offsets_view, members_view,
+                    weights_view, lf, threads)
+
+    projection[l1_penalty] = prox_center[l1_penalty] * np.minimum(1, lf / np.fabs(prox_center[l1_penalty]))
+    projection[unpenalized] = 0
+    projection[positive_part] = np.minimum(lf, prox_center[positive_part])
+    
+    return prox_center - projection
+
+def project_group_lasso_grouped(np.ndarray[floating, ndim=1] prox_center, 
+                                double bound, 
+                                np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
+                                np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
+                                np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
+                                np.ndarray[DTYPE_int_t, ndim=1] group_offsets,
+                                np.ndarray[DTYPE_int_t, ndim=1] group_members,
+                                np.ndarray[DTYPE_float_t, ndim=1] weights,
+                                int threads=1):
+    
+    cdef np.ndarray[floating, ndim=1] projection = np.zeros_like(prox_center)
+
+    cdef floating[:] x_view = prox_center, projection_view = projection
+    cdef DTYPE_int_t[:] offsets_view = group_offsets, members_view = group_members
+    cdef DTYPE_float_t[:] weights_view = weights
+    _project_groups(x_view, projection_view, offsets_view, members_view,
+                    weights_view, bound, threads)
+
+    projection[l1_penalty] = prox_center[l1_penalty] * np.minimum(1, bound / np.fabs(prox_center[l1_penalty]))
+    projection[unpenalized] = 0
+    projection[positive_part] = np.minimum(bound, prox_center[positive_part])
+    
+    return projection
+
+def seminorm_group_lasso_grouped(np.ndarray[floating, ndim=1] x, 
+                                 np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
+                                 np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
+                                 np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
+                                 np.ndarray[DTYPE_int_t, ndim=1] group_offsets,
+                                 np.ndarray[DTYPE_int_t, ndim=1] group_members,
+                                 np.ndarray[DTYPE_float_t, ndim=1] weights,
+                                 DTYPE_int_t check_feasibility,
+                                 int threads=1):
+    
+    cdef np.ndarray[DTYPE_float_t, ndim=1] norms = np.zeros_like(weights)
+    cdef Py_ssize_t j
+    cdef double value
+    
+    cdef floating[:] x_view = x
+    cdef DTYPE_int_t[:] offsets_view = group_offsets, members_view = group_members
+    cdef DTYPE_float_t[:] norms_view = norms
+    _group_norms(x_view, offsets_view, members_view, norms_view, threads)
+
+    value = np.fabs(x[l1_penalty]).sum()
+    value += np.maximum(x[positive_part], 0).sum()
+
+    # summed in the order of the groups, as in seminorm_group_lasso
+    for j in range(weights.shape[0]):
+        value += weights[j] * norms[j]
+
+    tol = 1.e-5
+    if check_feasibility:
+        xpos = x[positive_part]
+        if tuple(xpos.shape) not in [(),(0,)] and xpos.min() < tol:
+            value = np.inf
+    return value
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _check_KKT_groups(DTYPE_float_t[:] grad,
+                            DTYPE_float_t[:] solution,
+                            DTYPE_float_t[:] failing,
+                            double lagrange,
+                            DTYPE_int_t[:] group_offsets,
+                            DTYPE_int_t[:] group_members,
+                            DTYPE_float_t[:] weights,
+                            double tol,
+                            int threads):
+    cdef Py_ssize_t j, k
+    cdef double norm, snorm, value
+    for j in prange(weights.shape[0], nogil=True, num_threads=threads, schedule='guided'):
+        norm = 0
+        snorm = 0
+        for k in range(group_offsets[j], group_offsets[j+1]):
+            norm = norm + grad[group_members[k]]**2
+            snorm = snorm + solution[group_members[k]]**2
+        norm = sqrt(norm)
+
+        # check that the subgradient is feasible 
+        value = norm > weights[j] * lagrange * (1 + tol)
+
+        # check that the active groups have a tight subgradient
+        if snorm != 0:
+            value = value + (norm < weights[j] * lagrange * (1 - tol))
+
+        for k in range(group_offsets[j], group_offsets[j+1]):
+            failing[group_members[k]] = value
+
+def check_KKT_group_lasso_grouped(np.ndarray[DTYPE_float_t, ndim=1] grad, 
+                                  np.ndarray[DTYPE_float_t, ndim=1] solution, 
+                                  DTYPE_float_t lagrange,
+                                  np.ndarray[DTYPE_int_t, ndim=1] l1_penalty, 
+                                  np.ndarray[DTYPE_int_t, ndim=1] unpenalized,
+                                  np.ndarray[DTYPE_int_t, ndim=1] positive_part, 
+                                  np.ndarray[DTYPE_int_t, ndim=1] group_offsets,
+                                  np.ndarray[DTYPE_int_t, ndim=1] group_members,
+                                  np.ndarray[DTYPE_float_t, ndim=1] weights,
+                                  DTYPE_float_t tol=1.e-2,
+                                  int threads=1):
+
+    cdef np.ndarray[DTYPE_float_t, ndim=1] failing = np.zeros_like(grad)
+
+    _check_KKT_l1_positive(grad, solution, failing, lagrange, 
+                           l1_penalty, positive_part, tol)
+
+    _check_KKT_groups(grad, solution, failing, lagrange, 
+                      group_offsets, group_members, weights, tol, threads)
+
+    return failing
@@ -1,4 +1,3 @@
-import gc
 
 import numpy as np
 import scipy.sparse
@@ -11,6 +10,8 @@ from .separable import separable_problem
 from .simple import simple_problem
 from .identity_quadratic import identity_quadratic as iq
 from .paths import lasso
+from .path_store import path_store
+from .checkpoint import save_checkpoint, load_checkpoint
 
 
 
@@ -231,7 +232,13 @@ class heirnet(lasso):
         final_inv_step = subproblem.final_inv_step
         return final_inv_step
 
-    def main(self, inner_tol=1.e-5):
+    def main(self, inner_tol=1.e-5, checkpoint=None, checkpoint_every=10,
+             resume=False):
+        '''
+        Solve the problem along self.lagrange_sequence, saving
+        checkpoints to the file checkpoint as in lasso.main. If resume,
+        continue from the state saved in checkpoint.
+        '''
 
         # scaling will be needed to get coefficients on original scale   
         if self.Xn.scale:
@@ -240,27 +247,38 @@ class heirnet(lasso):
             scalings = np.ones(self.Xn.primal_shape)
         scalings = self.nonzero.adjoint_map(scalings)
 
-        # take a guess at the inverse step size
-        final_inv_step = self.lipschitz / 1000
-        lseq = self.lagrange_sequence
+        if resume:
+            state = load_checkpoint(checkpoint)
+            self.lagrange_sequence = state['lagrange_sequence']
+            self.solution[:] = state['solution']
+            self.strong = state['strong']
+            final_inv_step = state['final_inv_step']
+            objective, dfs, store = state['objective'], state['dfs'], state['store']
+            lseq = self.lagrange_sequence
+        else:
+            # take a guess at the inverse step size
+            final_inv_step = self.lipschitz / 1000
+            lseq = self.lagrange_sequence
 
-        # first solution corresponding to all zeros except intercept 
+            # first solution corresponding to all zeros except intercept 
 
-        self.solution[:] = self.null_solution.copy()
+            self.solution[:] = self.null_solution.copy()
 
-        self.strong = self.strong_set(lseq[0], lseq[1])
-        grad_solution = self.grad().copy()
+            self.strong = self.strong_set(lseq[0], lseq[1])
 
-        p = self.Xn.primal_shape[0]
+            store = path_store(scalings.shape[0])
+            store.append(self.nonzero.adjoint_map(self.solution) / scalings)
 
-        rescaled_solutions = scipy.sparse.csr_matrix(self.nonzero.adjoint_map(self.solution) / scalings)
+            objective = [self.loss.smooth_objective(self.solution, 'func')]
+            dfs = [1]
 
-        objective = [self.loss.smooth_objective(self.solution, 'func')]
-        dfs = [1]
-        retry_counter = 0
+        grad_solution = self.grad().copy()
 
+        p = self.Xn.primal_shape[0]
+        retry_counter = 0
 
-        for lagrange_new, lagrange_cur in zip(lseq[1:], lseq[:-1]):
+        start = len(objective) - 1
+        for lagrange_new, lagrange_cur in zip(lseq[start+1:], lseq[start:-1]):
             self.lagrange = lagrange_new
             tol = inner_tol
             active_old = self.active.copy()
@@ -299,23 +317,37 @@ class heirnet(lasso):
                     debug=True
                     tol = inner_tol
 
-            rescaled_solution = self.nonzero.adjoint_map(self.solution)
-            rescaled_solutions = scipy.sparse.vstack([rescaled_solutions, rescaled_solution])
+            store.append(self.nonzero.adjoint_map(self.solution))
             objective.append(self.loss.smooth_objective(self.solution, mode='func'))
             dfs.append(active.shape[0])
-            gc.collect()
 
             print lagrange_cur / self.lagrange_max, lagrange_new, (self.solution != 0).sum(), 1. - objective[-1] / objective[0], list(self.lagrange_sequence).index(lagrange_new)#, np.fabs(rescaled_solution).sum()
 
+            if checkpoint is not None and (len(objective) - 1) % checkpoint_every == 0:
+                save_checkpoint(checkpoint, {'lagrange_sequence': lseq,
+                                             'solution': self.solution.copy(),
+                                             'strong': self.strong.copy(),
+                                             'final_inv_step': final_inv_step,
+                                             'objective': objective,
+                                             'dfs': dfs,
+                                             'store': store})
+
         objective = np.array(objective)
         output = {'devratio': 1 - objective / objective.max(),
                   'df': dfs,
                   'lagrange': self.lagrange_sequence,
                   'scalings': scalings,
-                  'beta':rescaled_solutions.T}
+                  'beta':store.finalize()}
 
         return output
 
+    def resume(self, checkpoint, inner_tol=1.e-5, checkpoint_every=10):
+        '''
+        Continue the path of main from the state saved in checkpoint.
+        '''
+        return self.main(inner_tol=inner_tol, checkpoint=checkpoint,
+                         checkpoint_every=checkpoint_every, resume=True)
+
     @staticmethod
     def logistic(X, Y, **keyword_args):
         return lasso(logistic_factory(Y), X, **keyword_args)
@@ -11,9 +11,10 @@ with :math:`\kappa, \mu, \beta, \gamma` = (coef, center, linear_term, constant_t
 
 from copy import copy
 
-from numpy.linalg import norm
 from numpy import all, asarray
 
+from .precision import sum_squares, inner
+
 class identity_quadratic(object):
 
     def __init__(self, coef, center, linear_term, constant_term=0):
@@ -84,16 +85,16 @@ class identity_quadratic(object):
             r = x
         if mode == 'both':
             if linear_term is not None:
-                return (norm(r)**2 * coef / 2. + (linear_term * x).sum() 
+                return (sum_squares(r) * coef / 2. + inner(linear_term, x) 
                         + cons, coef * r + linear_term)
             else:
-                return (norm(r)**2 * coef / 2. + cons,
+                return (sum_squares(r) * coef / 2. + cons,
                         coef * r)
         elif mode == 'func':
             if linear_term is not None:
-                return norm(r)**2 * coef / 2. + (linear_term * x).sum() + cons
+                return sum_squares(r) * coef / 2. + inner(linear_term, x) + cons
             else:
-                return norm(r)**2 * coef / 2. + cons
+                return sum_squares(r) * coef / 2. + cons
         elif mode == 'grad':
             if linear_term is not None:
                 return coef * r + linear_term
@@ -176,7 +177,7 @@ class identity_quadratic(object):
             constant_term = 0 
         if self.center is not None:
             linear_term -= coef * self.center
-            constant_term += coef * norm(self.center)**2/2.
+            constant_term += coef * sum_squares(self.center)/2.
         if self.linear_term is not None:
             linear_term += self.linear_term
 
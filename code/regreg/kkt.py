@@ -0,0 +1,163 @@
+r"""
+Incremental checking of the KKT conditions of regreg.group_lasso
+penalties along a path.
+
+The conditions at :math:`\beta` involve the gradient
+:math:`X^Tu + e` where :math:`u` is the gradient of the loss as a
+function of the linear predictor and :math:`e` is cheap to compute
+(e.g. the gradient of an elastic net term). Rather than computing
+:math:`X^Tu` in full at each check, kkt_checker keeps, for each block
+of columns of X, the value of :math:`X^Tu_b` at the :math:`u_b`
+of the last check that computed it. As
+
+.. math::
+
+   |X_j^Tu - X_j^Tu_b| \leq \|X_j\|_2 \|u - u_b\|_2
+
+a coordinate where the solution is zero is known to pass if this
+bound keeps it below the threshold of check_KKT, and only the blocks
+holding other coordinates are computed, possibly in several threads.
+The failing set is the same as that of check_KKT with the
+full gradient.
+"""
+
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import scipy.sparse
+
+from .affine import normalize, mmap_normalize
+from .group_lasso import check_KKT
+from .screening import column_norms
+
+class kkt_checker(object):
+
+    def __init__(self, glasso, X, block_size=10000, threads=1,
+                 max_references=10):
+        """
+        Parameters
+        ----------
+        glasso : regreg.group_lasso.group_lasso
+            The penalty.
+
+        X : [ndarray, scipy.sparse, regreg.affine.normalize, regreg.affine.mmap_normalize]
+            The design.
+
+        block_size : int
+            Number of columns in each block.
+
+        threads : int
+            Number of threads computing blocks.
+
+        max_references : int
+            Largest number of values of u kept for the bounds. When
+            exceeded, all blocks are computed at the next check.
+        """
+        self.glasso = glasso
+        if scipy.sparse.issparse(X):
+            X = X.tocsc()
+        self.X = X
+        self.block_size = block_size
+        self.threads = threads
+        self.max_references = max_references
+
+        p = glasso.primal_shape[0]
+        self.col_norms = column_norms(X)
+        self.blocks = np.arange(p) // block_size
+        self.nblock = self.blocks[-1] + 1
+
+        # the gradient of each block and the index of its u
+        self.reference_grad = np.zeros(p)
+        self.block_reference = -np.ones(self.nblock, np.int)
+        self.references = {}
+        self._next_reference = 0
+        self.blocks_computed = 0
+
+    def _block_grad(self, u, block):
+        start = block * self.block_size
+        stop = min(start + self.block_size, self.reference_grad.shape[0])
+        X = self.X
+        if isinstance(X, (normalize, mmap_normalize)):
+            return X.adjoint_map_columns(u, start, stop)
+        elif scipy.sparse.issparse(X):
+            return X.T[start:stop] * u
+        return np.dot(u, X[:,start:stop])
+
+    def _compute(self, u, blocks):
+        """
+        Compute the gradient of the blocks at u.
+        """
+        if self.threads > 1 and blocks.shape[0] > 1:
+            pool = ThreadPool(self.threads)
+            try:
+                values = pool.map(lambda block: self._block_grad(u, block), blocks)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            values = [self._block_grad(u, block) for block in blocks]
+
+        reference = self._next_reference
+        self._next_reference += 1
+        self.references[reference] = u.copy()
+        for block, value in zip(blocks, values):
+            start = block * self.block_size
+            self.reference_grad[start:start + value.shape[0]] = value
+        self.block_reference[blocks] = reference
+        self.blocks_computed += blocks.shape[0]
+
+        # drop the values of u no block refers to
+        for key in list(self.references.keys()):
+            if not np.any(self.block_reference == key):
+                del(self.references[key])
+
+    def check(self, u, solution, lagrange, extra=None, tol=1.e-2):
+        """
+        The failing coordinates of check_KKT at solution, for the
+        gradient :math:`X^Tu + \\text{extra}`, and the gradient used.
+        The gradient is exact on the computed blocks, and
+        on the others within the bound of the module docstring.
+        """
+        glasso = self.glasso
+        if extra is None:
+            extra = 0
+
+        if (np.any(self.block_reference < 0) or
+            len(self.references) > self.max_references):
+            compute = np.arange(self.nblock)
+        else:
+            # bound on the change of each coordinate of the gradient
+            distance = np.zeros(self._next_reference)
+            for key, reference in self.references.items():
+                distance[key] = np.linalg.norm(u - reference)
+            change = self.col_norms * distance[self.block_reference[self.blocks]]
+            grad = self.reference_grad + extra
+
+            threshold = lagrange * (1 + tol)
+            exact = solution != 0
+            l1 = glasso._l1_penalty
+            exact[l1] += np.fabs(grad[l1]) + change[l1] > threshold
+            pos = glasso._positive_part
+            exact[pos] += -grad[pos] + change[pos] > threshold
+            grouped = glasso._groups >= 0
+            if np.any(grouped):
+                groups = glasso._groups[grouped]
+                ngroup = glasso._weight_array.shape[0]
+                norms = np.sqrt(np.bincount(groups, weights=grad[grouped]**2,
+                                            minlength=ngroup))
+                changes = np.sqrt(np.bincount(groups, weights=change[grouped]**2,
+                                              minlength=ngroup))
+                active = np.bincount(groups, weights=solution[grouped]**2,
+                                     minlength=ngroup) > 0
+                group_exact = (norms + changes > threshold * glasso._weight_array) + active
+                exact[grouped] = group_exact[groups]
+            exact[glasso._unpenalized] = False
+            compute = np.unique(self.blocks[exact])
+
+        if compute.shape[0] > 0:
+            self._compute(u, compute)
+        grad = self.reference_grad + extra
+        return check_KKT(glasso, grad, solution, lagrange, tol=tol), grad
@@ -0,0 +1,72 @@
+import numpy as np
+cimport numpy as np
+cimport cython
+from cython cimport floating
+from libc.math cimport exp, log1p
+
+"""
+Implements the logistic deviance and its gradient in one pass
+over the linear predictor.
+"""
+
+DTYPE_float = np.float
+ctypedef np.float_t DTYPE_float_t
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def logistic_deviance_terms(np.ndarray[floating, ndim=1] eta,
+                            np.ndarray[DTYPE_float_t, ndim=1] successes,
+                            np.ndarray[DTYPE_float_t, ndim=1] trials,
+                            weights=None,
+                            offset=None,
+                            grad=None,
+                            int func=1):
+    """
+    With the linear predictor eta (+ offset, if not None) and
+    weights w (1 if None), return
+
+        sum_i w_i * (trials_i * log(1 + exp(eta_i)) - successes_i * eta_i)
+
+    (0 if func is 0) and, if grad is not None, store the gradient
+
+        w_i * (trials_i * exp(eta_i) / (1 + exp(eta_i)) - successes_i)
+
+    in grad. eta, offset and grad have the same dtype, float32 or
+    float64. log(1 + exp(eta)) is computed as eta + log1p(exp(-eta))
+    for positive eta, so exp never overflows, and the sum is
+    accumulated in double.
+    """
+    cdef Py_ssize_t i, n = eta.shape[0]
+    cdef bint has_weights = weights is not None
+    cdef bint has_offset = offset is not None
+    cdef bint has_grad = grad is not None
+    cdef np.ndarray[DTYPE_float_t, ndim=1] w
+    cdef np.ndarray[floating, ndim=1] off, g
+    cdef double value = 0, e, t, prob, wi = 1, log1pexp
+
+    if has_weights:
+        w = weights
+    if has_offset:
+        off = offset
+    if has_grad:
+        g = grad
+
+    for i in range(n):
+        e = eta[i]
+        if has_offset:
+            e += off[i]
+        if has_weights:
+            wi = w[i]
+        if e > 0:
+            t = exp(-e)
+            prob = 1. / (1. + t)
+            log1pexp = e + log1p(t)
+        else:
+            t = exp(e)
+            prob = t / (1. + t)
+            log1pexp = log1p(t)
+        if func:
+            value += wi * (trials[i] * log1pexp - successes[i] * e)
+        if has_grad:
+            g[i] = wi * (trials[i] * prob - successes[i])
+    return value
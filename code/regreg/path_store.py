@@ -0,0 +1,144 @@
+"""
+Sparse storage of the solutions along a regularization path.
+
+A path_store receives one solution per value of the lagrange sequence
+and keeps only its nonzero entries, appended to growable CSC buffers
+(row indices, values and column pointers). These are turned into a
+scipy.sparse.csc_matrix with one column per solution once, by finalize,
+so appending a solution costs time linear in its number of nonzeros
+rather than in the number of solutions stored so far.
+
+For very long paths, the solutions can be streamed to disk: if a
+filename is given, every chunk_size solutions are written to a .npz
+file and dropped from memory. path_store.load reads the chunks
+back as one matrix.
+
+>>> import numpy as np
+>>> store = path_store(4)
+>>> store.append(np.array([0, 1., 0, 2.]))
+>>> store.append(np.array([3., 0, 0, 0]))
+>>> store.finalize().toarray().tolist()
+[[0.0, 3.0], [1.0, 0.0], [0.0, 0.0], [2.0, 0.0]]
+"""
+
+import numpy as np
+import scipy.sparse
+
+class path_store(object):
+
+    def __init__(self, shape, size=1000, filename=None, chunk_size=100,
+                 dtype=np.float):
+        """
+        Parameters
+        ----------
+        shape : int
+            Number of coefficients of each solution.
+
+        size : int
+            Initial number of nonzero entries the buffers can hold,
+            doubled whenever they fill up.
+
+        filename : str
+            If not None, the solutions are written to the files
+            '%s_%04d.npz' % (filename, chunk), chunk_size at a time.
+
+        chunk_size : int
+            Number of solutions in each file if filename is not None.
+
+        dtype : np.dtype
+            Type of the stored values.
+        """
+        self.shape = shape
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self._indices = np.zeros(size, np.int)
+        self._data = np.zeros(size, dtype)
+        self._indptr = [0]
+        self._nchunk = 0
+        self._nwritten = 0
+        self.filenames = []
+
+    def __len__(self):
+        return self._nwritten + len(self._indptr) - 1
+
+    def append(self, solution):
+        """
+        Store the nonzero entries of solution, an ndarray of
+        length self.shape.
+        """
+        solution = np.asarray(solution).reshape(-1)
+        indices = np.nonzero(solution)[0]
+        self.append_sparse(indices, solution[indices])
+
+    def append_sparse(self, indices, values):
+        """
+        Store a solution given by the indices and values of
+        its nonzero entries.
+        """
+        start = self._indptr[-1]
+        stop = start + indices.shape[0]
+        if stop > self._indices.shape[0]:
+            size = max(stop, 2 * self._indices.shape[0])
+            self._indices = np.resize(self._indices, size)
+            self._data = np.resize(self._data, size)
+        self._indices[start:stop] = indices
+        self._data[start:stop] = values
+        self._indptr.append(stop)
+
+        if self.filename is not None and len(self._indptr) - 1 == self.chunk_size:
+            self._write_chunk()
+
+    def extend(self, solutions):
+        """
+        Store each column of solutions, a sparse or dense matrix
+        with self.shape rows.
+        """
+        solutions = scipy.sparse.csc_matrix(solutions)
+        for j in range(solutions.shape[1]):
+            entries = slice(solutions.indptr[j], solutions.indptr[j+1])
+            self.append_sparse(solutions.indices[entries],
+                               solutions.data[entries])
+
+    def _matrix(self):
+        nnz = self._indptr[-1]
+        return scipy.sparse.csc_matrix((self._data[:nnz].copy(),
+                                        self._indices[:nnz].copy(),
+                                        np.array(self._indptr)),
+                                       shape=(self.shape, len(self._indptr) - 1))
+
+    def _write_chunk(self):
+        filename = '%s_%04d.npz' % (self.filename, self._nchunk)
+        solutions = self._matrix()
+        np.savez(filename, data=solutions.data, indices=solutions.indices,
+                 indptr=solutions.indptr, shape=solutions.shape)
+        self.filenames.append(filename)
+        self._nchunk += 1
+        self._nwritten += solutions.shape[1]
+        self._indptr = [0]
+
+    def finalize(self):
+        """
+        The stored solutions as a scipy.sparse.csc_matrix with
+        one column per solution, or, if self.filename is not None,
+        the list of files they were written to, which can be read
+        with path_store.load.
+        """
+        if self.filename is None:
+            return self._matrix()
+        if len(self._indptr) > 1:
+            self._write_chunk()
+        return self.filenames
+
+    @staticmethod
+    def load(filenames):
+        """
+        Read the solutions written by a path_store to filenames
+        as one scipy.sparse.csc_matrix.
+        """
+        chunks = []
+        for filename in filenames:
+            chunk = np.load(filename)
+            chunks.append(scipy.sparse.csc_matrix((chunk['data'], chunk['indices'],
+                                                   chunk['indptr']),
+                                                  shape=tuple(chunk['shape'])))
+        return scipy.sparse.hstack(chunks).tocsc()
@@ -1,17 +1,24 @@
 from warnings import warn
-import gc
+from multiprocessing import Pool
 
 import numpy as np
 import scipy.sparse
 
-from .affine import power_L, normalize, selector, identity, adjoint
+from .affine import (power_L, normalize, mmap_normalize, selector, identity, adjoint,
+                     astransform)
 from .atoms import l1norm, constrained_positive_part
 from .smooth import logistic_loss, sum as smooth_sum, affine_smooth
-from .quadratic import squared_error
+from .quadratic import squared_error, gram_matrix, gram_squared_error
 from .separable import separable_problem, separable
 from .simple import simple_problem
 from .identity_quadratic import identity_quadratic as iq
 from .group_lasso import group_lasso, strong_set as strong_set_gl, check_KKT
+from .coordinate import coordinate_descent
+from .telemetry import get_clock, debug_sink, path_dtype
+from .path_store import path_store
+from .screening import column_norms, dual_norm, gap_safe, EDPP
+from .kkt import kkt_checker
+from .checkpoint import save_checkpoint, load_checkpoint
 
 # Constants used below
 
@@ -30,42 +37,105 @@ class lasso(object):
                  lagrange_proportion = 0.05,
                  nstep = 100,
                  scale=True,
-                 center=True):
+                 center=True,
+                 solver='FISTA',
+                 col_stds=None,
+                 rows=None,
+                 screening=None,
+                 incremental_KKT=False,
+                 mmap_block_size=1000,
+                 gram=False):
 
 
         self.loss_factory = loss_factory
 
+        # None, 'gap_safe' or 'EDPP', see regreg.screening
+        if screening not in [None, 'gap_safe', 'EDPP']:
+            raise ValueError("screening should be one of [None, 'gap_safe', 'EDPP']")
+        if screening == 'EDPP' and not isinstance(loss_factory, squared_error_factory):
+            raise ValueError('EDPP screening is only implemented for the squared error loss')
+        if screening is not None and not elastic_net.iszero:
+            raise ValueError('screening is not implemented with an elastic net')
+        self.screening = screening
+
+        # use the squared error loss computed from the Gram matrix of
+        # the normalized design, see regreg.quadratic.gram_squared_error
+        if gram and not isinstance(loss_factory, squared_error_factory):
+            raise ValueError('the Gram matrix is only used with the squared error loss')
+        if gram and screening is not None:
+            raise ValueError('screening is not implemented with the Gram matrix')
+        if gram and solver == 'coordinate':
+            raise ValueError('coordinate descent is not implemented with the Gram matrix')
+        self.gram = gram
+
+        # check the KKT conditions with a regreg.kkt.kkt_checker,
+        # not used with screening, which needs the full gradient,
+        # or with the Gram matrix, whose gradient is cheap
+        self.incremental_KKT = incremental_KKT and screening is None and not gram
+
+        # 'FISTA' or 'coordinate'
+        if solver not in ['FISTA', 'coordinate']:
+            raise ValueError("solver should be one of ['FISTA', 'coordinate']")
+        self.solver = solver
+
         self.scale = scale
         self.center = center
 
         # for group lasso weights, if implied by penalty_structure
         self.group_weights = group_weights
 
-        # normalize X, adding intercept if needed
+        # normalize X, adding intercept if needed.
+        # rows, if not None, are the indices of the rows of X to use,
+        # which are copied only once
         self.intercept = intercept
         p = X.shape[1]
+        if rows is not None:
+            rows = np.asarray(rows)
+            if rows.dtype == np.bool:
+                rows = np.nonzero(rows)[0]
+            if isinstance(X, np.memmap):
+                raise ValueError('rows cannot be used with a memory-mapped design')
+            if scipy.sparse.issparse(X) or not self.intercept:
+                X = X[rows]
         if self.intercept:
             self.penalty_structure = np.ones(p+1) * L1_PENALTY
             self.penalty_structure[0] = UNPENALIZED
             if penalty_structure is not None:
                 self.penalty_structure[1:] = penalty_structure
+        else:
+            self.penalty_structure = np.ones(p) * L1_PENALTY
+            if penalty_structure is not None:
+                self.penalty_structure[:] = penalty_structure
+
+        if isinstance(X, np.memmap):
+            # read from disk mmap_block_size columns at a time, the
+            # column of ones of the intercept is not stored
+            self._Xn = mmap_normalize(X, center=self.center, scale=self.scale,
+                                      intercept=self.intercept, col_stds=col_stds,
+                                      block_size=mmap_block_size)
 
+        elif self.intercept:
             if scipy.sparse.issparse(X):
                 self._X1 = scipy.sparse.hstack([np.ones((X.shape[0], 1)), X]).tocsc() 
+            elif rows is not None:
+                self._X1 = np.empty((rows.shape[0], p+1))
+                self._X1[:,0] = 1
+                np.take(X, rows, axis=0, out=self._X1[:,1:], mode='clip')
             else:
                 self._X1 = np.hstack([np.ones((X.shape[0], 1)), X])
+            # col_stds, if known, are the standard deviations of the columns of X
+            if col_stds is not None:
+                col_stds = np.hstack([1, col_stds])
             if self.scale or self.center:
-                self._Xn = normalize(self._X1, center=self.center, scale=self.scale, intercept_column=0)
+                self._Xn = normalize(self._X1, center=self.center, scale=self.scale, intercept_column=0,
+                                     col_stds=col_stds)
             else:
                 self._Xn = self._X1
 
         else:
-            self.penalty_structure = np.ones(p) * L1_PENALTY
-            if penalty_structure is not None:
-                self.penalty_structure[:] = penalty_structure
-
             if self.scale or self.center:
-                self._Xn = normalize(X, center=self.center, scale=self.scale)
+                self._Xn = normalize(X, center=self.center, scale=self.scale,
+                                     col_stds=col_stds)
             else:
                 self._Xn = X
 
@@ -74,6 +144,8 @@ class lasso(object):
             self._selector = selector(~which_0, self._Xn.primal_shape)
             if self.scale or self.center:
                 self._Xn = self._Xn.slice_columns(~which_0)
+                if self.intercept:
+                    self._Xn.intercept_column = 0
             else:
                 self._Xn = self._Xn[:,~which_0]
         else:
@@ -89,7 +161,7 @@ class lasso(object):
 
     @property
     def shape(self):
-        if self.scale or self.center:
+        if isinstance(self.Xn, (normalize, mmap_normalize)):
             return self.Xn.dual_shape[0], self.Xn.primal_shape[0]
         else:
             return self.Xn.shape
@@ -112,9 +184,22 @@ class lasso(object):
     @property
     def loss(self):
         if not hasattr(self, '_loss'):
-            self._loss = self.loss_factory(self._Xn)
+            if self.gram:
+                self._loss = self.loss_factory.gram(self.gram_matrix, self._Xn)
+            else:
+                self._loss = self.loss_factory(self._Xn)
         return self._loss
 
+    @property
+    def gram_matrix(self):
+        '''
+        The Gram matrix of Xn, whose columns are computed
+        as the variables enter the path.
+        '''
+        if not hasattr(self, '_gram_matrix'):
+            self._gram_matrix = gram_matrix(self._Xn)
+        return self._gram_matrix
+
     @property
     def null_solution(self):
         if not hasattr(self, "_null_soln"):
@@ -129,7 +214,8 @@ class lasso(object):
         if not hasattr(self, "_lagrange_max"):
             null_soln = self.null_solution
             null_grad = self.loss.smooth_objective(null_soln, 'grad')
-            self.penalty = group_lasso(self.penalty_structure, 1., weights=self.group_weights)
+            self.penalty = group_lasso(self.penalty_structure, 1., weights=self.group_weights,
+                                       threads=self.threads)
             conj = self.penalty.conjugate
             self._lagrange_max = conj.seminorm(null_grad)
 
@@ -201,18 +287,164 @@ class lasso(object):
 
         return strong_set_gl(self.penalty, lagrange_cur, lagrange_new, grad, slope_estimate)
 
+    @property
+    def col_norms(self):
+        if not hasattr(self, "_col_norms"):
+            self._col_norms = column_norms(self.Xn)
+        return self._col_norms
+
+    @property
+    def unpenalized_design(self):
+        '''
+        The unpenalized columns of Xn, their Gram matrix and the
+        product of the transpose of Xn with them. Dual points of the
+        screening rules are projected onto the orthogonal complement
+        of these columns.
+        '''
+        if not hasattr(self, "_unpenalized_design"):
+            transform = self.loss.affine_transform
+            n, p = self.shape
+            unpenalized = np.nonzero(self.penalty_structure == UNPENALIZED)[0]
+            Xu = np.zeros((n, unpenalized.shape[0]))
+            basis = np.zeros(p)
+            for i, j in enumerate(unpenalized):
+                basis[j] = 1
+                Xu[:,i] = transform.linear_map(basis)
+                basis[j] = 0
+            XtXu = np.zeros((p, unpenalized.shape[0]))
+            for i in range(unpenalized.shape[0]):
+                XtXu[:,i] = transform.adjoint_map(Xu[:,i])
+            self._unpenalized_design = Xu, np.dot(Xu.T, Xu), XtXu
+        return self._unpenalized_design
+
+    def project_unpenalized(self, u, grad):
+        '''
+        Project u onto the orthogonal complement of the unpenalized
+        columns of Xn, returning the projection and the product of the
+        transpose of Xn with it, where grad is the product with u.
+        '''
+        Xu, gram, XtXu = self.unpenalized_design
+        if Xu.shape[1] == 0:
+            return u, grad
+        coef = np.linalg.solve(gram, np.dot(Xu.T, u))
+        return u - np.dot(Xu, coef), grad - np.dot(XtXu, coef)
+
+    def screen(self, grad=None):
+        '''
+        Coordinates that are zero at the solution with lagrange
+        self.lagrange, by the gap safe rule at self.solution.
+        grad is the gradient of the loss at self.solution.
+        '''
+        if grad is None:
+            grad = self.grad()
+        atom = self.loss.sm_atom
+        value, u = atom.smooth_objective(self.loss.linear_predictor(self.solution), 'both')
+        u, grad = self.project_unpenalized(u, grad)
+
+        # scale the dual point so that it is feasible
+        lagrange = self.lagrange
+        norm = dual_norm(self.penalty, grad)
+        scale = 1.
+        if norm > lagrange:
+            scale = lagrange / norm
+        gap = (value + self.penalty.seminorm(self.solution) 
+               + atom.conjugate_objective(scale * u))
+        return gap_safe(self.penalty, lagrange, scale * grad, gap,
+                        self.loss_factory.hessian_bound(), self.col_norms)
+
+    def screen_EDPP(self, lagrange_cur, lagrange_new, grad=None):
+        '''
+        Coordinates that are zero at the solution with lagrange_new,
+        by the EDPP rule, if self.solution is the solution with
+        lagrange_cur. grad is the gradient of the loss at self.solution.
+        Only for the squared error loss.
+        '''
+        if grad is None:
+            grad = self.grad()
+        atom = self.loss.sm_atom
+        u = atom.smooth_objective(self.loss.linear_predictor(self.solution), 'grad')
+        u, grad = self.project_unpenalized(u, grad)
+        if not hasattr(self, "_EDPP_response"):
+            response = -atom.offset
+            self._EDPP_response = self.project_unpenalized(response,
+                          self.loss.affine_transform.adjoint_map(response))
+        response, grad_response = self._EDPP_response
+
+        # the loss is atom.coef / 2 * ||response - X beta||^2
+        coef = atom.coef
+        return EDPP(self.penalty, lagrange_cur / coef, lagrange_new / coef,
+                    -u / coef, -grad / coef, response, grad_response,
+                    self.col_norms)
+
+    # column blocks and threads of the kkt_checker
+    KKT_block_size = 10000
+    KKT_threads = 1
+
+    # threads of the group lasso kernels, see regreg.group_lasso
+    threads = 1
+
+    @property
+    def kkt_checker(self):
+        if not hasattr(self, "_kkt_checker"):
+            self._kkt_checker = kkt_checker(self.penalty, self.Xn,
+                                            block_size=self.KKT_block_size,
+                                            threads=self.KKT_threads)
+        return self._kkt_checker
+
+    def check_KKT(self, lagrange):
+        '''
+        The coordinates failing the KKT conditions at self.solution
+        with the given lagrange, and the gradient used to check them,
+        as for check_KKT with self.grad(). If self.incremental_KKT,
+        the gradient is exact only where the kkt_checker needed it.
+        '''
+        if not self.incremental_KKT:
+            grad = self.grad()
+            return check_KKT(self.penalty, grad, self.solution, lagrange), grad
+        atom = self.loss.sm_atom
+        u = atom.smooth_objective(self.loss.linear_predictor(self.solution), 'grad')
+        penalized = self.penalty_structure != UNPENALIZED
+        extra = np.zeros(self.solution.shape)
+        extra[penalized] = self.elastic_net.objective(self.solution[penalized], 'grad')
+        return self.kkt_checker.check(u, self.solution, lagrange, extra=extra)
+
+    # number of column subsets of Xn kept by slice_columns
+    slice_cache_size = 4
+
     def slice_columns(self, columns):
-        if self.scale or self.center:
+        '''
+        The columns of Xn in columns, a boolean array. If the
+        intercept is among them, it is the first column of the result.
+
+        The most recent subsets are cached, so while the active and
+        strong sets do not change the same design is returned
+        without copying the columns again.
+        '''
+        columns = np.asarray(columns, np.bool)
+        if not hasattr(self, "_slice_cache"):
+            self._slice_cache = []
+        cache = self._slice_cache
+        for i, (cached_columns, Xslice) in enumerate(cache):
+            if np.array_equal(cached_columns, columns):
+                cache.insert(0, cache.pop(i))
+                return Xslice
+
+        if isinstance(self.Xn, (normalize, mmap_normalize)):
             Xslice = self.Xn.slice_columns(columns)
+            if self.intercept and columns[0]:
+                Xslice.intercept_column = 0
         else:
             Xslice = self.Xn[:,columns]
+        cache.insert(0, (columns.copy(), Xslice))
+        del(cache[self.slice_cache_size:])
         return Xslice
 
     def construct_loss(self, candidate_set, lagrange):
+        if self.gram:
+            # the columns of Xn are not needed
+            return None, self.loss.restricted(candidate_set)
         Xslice = self.slice_columns(candidate_set)
         loss = self.loss_factory(Xslice)
-        if self.intercept:
-            Xslice.intercept_column = 0
         return Xslice, loss
 
     def restricted_problem(self, candidate_set, lagrange):
@@ -225,13 +457,17 @@ class lasso(object):
         restricted_penalty_structure = self.penalty_structure[candidate_set]
         rps = restricted_penalty_structure # shorthand
 
-        sliced_penalty = group_lasso(rps, lagrange, weights=self.group_weights)
+        sliced_penalty = group_lasso(rps, lagrange, weights=self.group_weights,
+                                     threads=self.threads)
         problem_sliced = simple_problem(loss, sliced_penalty)
         candidate_selector = selector(candidate_set, self.Xn.primal_shape)
         return problem_sliced, candidate_selector, restricted_penalty_structure
 
     def solve_subproblem(self, candidate_set, lagrange_new, **solve_args):
     
+        if self.solver == 'coordinate':
+            return self.solve_subproblem_coordinate(candidate_set, lagrange_new, **solve_args)
+
         # try to solve the problem with the active set
         subproblem, selector, penalty_structure = self.restricted_problem(candidate_set, lagrange_new)
         subproblem.coefs[:] = selector.linear_map(self.solution)
@@ -242,7 +478,170 @@ class lasso(object):
         self.final_inv_step = subproblem.final_inv_step
         return self.final_inv_step, grad, sub_soln, penalty_structure
 
-    def main(self, inner_tol=1.e-5):
+    def solve_subproblem_coordinate(self, candidate_set, lagrange_new, tol=1.e-5,
+                                    debug=False, **solve_args):
+        '''
+        Solve the problem restricted to candidate_set by coordinate descent.
+        Other arguments meant for FISTA are ignored.
+        '''
+        Xslice, loss = self.construct_loss(candidate_set, lagrange_new)
+        penalty_structure = self.penalty_structure[candidate_set]
+        penalty = group_lasso(penalty_structure, lagrange_new, weights=self.group_weights,
+                              threads=self.threads)
+        candidate_selector = selector(candidate_set, self.Xn.primal_shape)
+
+        solver = self.loss_factory.coordinate_descent(Xslice, penalty,
+                                                      initial=candidate_selector.linear_map(self.solution))
+        sub_soln = solver.solve(tol=tol, debug=debug)
+        self.solution[:] = candidate_selector.adjoint_map(sub_soln)
+
+        grad = loss.smooth_objective(sub_soln, mode='grad')
+        return self.final_inv_step, grad, sub_soln, penalty_structure
+
+    def main(self, inner_tol=1.e-5, telemetry=None, solver_telemetry=None,
+             debug=False, store=None, checkpoint=None, checkpoint_every=10):
+        """
+        Solve the problem along self.lagrange_sequence.
+
+        If telemetry is not None, it is called once per value of
+        the lagrange sequence with a tuple with fields given by
+        regreg.telemetry.path_dtype.
+
+        If solver_telemetry is not None, it is passed to each FISTA fit
+        of a subproblem, and called once per iteration with a tuple with
+        fields given by regreg.telemetry.FISTA_dtype.
+
+        If debug, the records of the path are printed.
+
+        If self.screening is not None, coordinates found to be zero
+        by the screening rule are left out of each subproblem, see
+        regreg.screening. Those of the gap safe rule are found again as
+        each subproblem is solved, and are not checked with the KKT
+        conditions. The EDPP rule assumes the solution at the previous
+        lagrange is exact, so the coordinates it discards are checked.
+
+        The solutions are kept in store, a regreg.path_store.path_store,
+        a new one in memory if store is None. If store streams
+        the solutions to disk, output['beta'] is the list of its files.
+
+        If checkpoint is not None, the state of the path (the solution,
+        the ever active set, the inverse step size and the path so far)
+        is saved to the file checkpoint every checkpoint_every values
+        of the lagrange sequence, see regreg.checkpoint. If the run is
+        interrupted, resume continues the path from the last checkpoint.
+        """
+        return self.output(*self.solve_path(inner_tol=inner_tol,
+                                             telemetry=telemetry,
+                                             solver_telemetry=solver_telemetry,
+                                             debug=debug,
+                                             store=store,
+                                             checkpoint=checkpoint,
+                                             checkpoint_every=checkpoint_every))
+
+    def resume(self, checkpoint, inner_tol=1.e-5, telemetry=None,
+               solver_telemetry=None, debug=False, checkpoint_every=10):
+        """
+        Continue the path of main from the state saved in the file
+        checkpoint, by a call of main with the same arguments on a
+        lasso constructed as this one, and return the output of main.
+        Checkpoints are saved to the same file as the path continues.
+        """
+        return self.output(*self.solve_path(inner_tol=inner_tol,
+                                             telemetry=telemetry,
+                                             solver_telemetry=solver_telemetry,
+                                             debug=debug,
+                                             checkpoint=checkpoint,
+                                             checkpoint_every=checkpoint_every,
+                                             resume=True))
+
+    def parallel_main(self, inner_tol=1.e-5, nsegment=4, processes=None,
+                      coarse_steps=5, coarse_tol=1.e-3, store=None):
+        """
+        Solve the problem along self.lagrange_sequence, split into
+        nsegment contiguous segments solved in a process pool.
+
+        Each segment after the first is warm started by a short path of
+        coarse_steps values from self.lagrange_max to the value before
+        the segment, solved with inner tolerance coarse_tol. The segment
+        itself is then solved sequentially as in main, whose output
+        this agrees with up to the tolerance of the solver.
+
+        If processes is 1, the segments are solved in this process.
+        The solutions of all segments are collected in store, as in main.
+        """
+        lseq = self.lagrange_sequence
+        # computed once here rather than in each worker
+        self.lagrange_max, self.problem, self.lipschitz
+
+        segments = [(lseq[idx[0]-1:idx[-1]+1], inner_tol,
+                     coarse_steps if idx[0] > 1 else 0, coarse_tol)
+                    for idx in np.array_split(np.arange(1, lseq.shape[0]),
+                                              nsegment)
+                    if idx.shape[0] > 0]
+
+        global _shared
+        _shared['path'] = self
+        try:
+            if processes == 1:
+                results = map(_solve_segment, segments)
+            else:
+                pool = Pool(processes, initializer=_init_worker)
+                try:
+                    results = pool.map(_solve_segment, segments)
+                    pool.close()
+                except:
+                    pool.terminate()
+                    raise
+                finally:
+                    pool.join()
+        finally:
+            _shared.clear()
+
+        # the first value of each segment is its warm start
+        objective, dfs, segment_store, scalings = results[0]
+        if store is None:
+            store = segment_store
+        else:
+            store.extend(segment_store.finalize())
+        for segment_objective, segment_dfs, segment_store, _ in results[1:]:
+            objective.extend(segment_objective[1:])
+            dfs.extend(segment_dfs[1:])
+            store.extend(segment_store.finalize()[:,1:])
+        return self.output(objective, dfs, store, scalings)
+
+    def output(self, objective, dfs, store, scalings):
+        """
+        The output of main from the results of solve_path.
+        """
+        objective = np.array(objective)
+        output = {'devratio': 1 - objective / objective.max(),
+                  'df': dfs,
+                  'lagrange': self.lagrange_sequence,
+                  'scalings': scalings,
+                  'beta':store.finalize()}
+
+        return output
+
+    def solve_path(self, inner_tol=1.e-5, telemetry=None, warm_start=False,
+                   solver_telemetry=None, debug=False, store=None,
+                   checkpoint=None, checkpoint_every=10, resume=False):
+        """
+        Solve the problem along self.lagrange_sequence, returning
+        the objective values, degrees of freedom, a path_store of the
+        solutions (including any columns dropped for having zero
+        scaling) and scalings. The solutions are coefficients of the
+        normalized design, dividing by the scalings gives coefficients
+        on the original scale. The other arguments are as in main.
+
+        If warm_start, start from self.solution and self.ever_active
+        instead of the null solution, which should then be the solution
+        at self.lagrange_sequence[0]. If resume, start from the state
+        saved in the file checkpoint instead, and store is ignored.
+        """
+
+        telemetry = debug_sink(telemetry, path_dtype, debug)
+        clock = get_clock(telemetry)
+        start_time = clock()
 
         # scaling will be needed to get coefficients on original scale   
         if self.Xn.scale:
@@ -251,47 +650,77 @@ class lasso(object):
             scalings = np.ones(self.Xn.primal_shape)
         scalings = self.nonzero.adjoint_map(scalings)
 
-        # take a guess at the inverse step size
-        self.final_inv_step = self.lipschitz / 1000
-        lseq = self.lagrange_sequence # shorthand
+        if resume:
+            state = load_checkpoint(checkpoint)
+            self.lagrange_sequence = state['lagrange_sequence']
+            self.solution[:] = state['solution']
+            self.ever_active = state['ever_active']
+            self.final_inv_step = state['final_inv_step']
+            objective, dfs, store = state['objective'], state['dfs'], state['store']
+            lseq = self.lagrange_sequence
+        else:
+            # take a guess at the inverse step size
+            self.final_inv_step = self.lipschitz / 1000
+            lseq = self.lagrange_sequence # shorthand
+
+            # first solution corresponding to all zeros except intercept 
 
-        # first solution corresponding to all zeros except intercept 
+            if not warm_start:
+                self.solution[:] = self.null_solution.copy()
 
-        self.solution[:] = self.null_solution.copy()
+            if store is None:
+                store = path_store(scalings.shape[0])
+            store.append(self.nonzero.adjoint_map(self.solution))
+
+            objective = [self.loss.smooth_objective(self.solution, 'func')]
+            dfs = [np.sum(self.penalty_structure == UNPENALIZED)]
 
         grad_solution = self.grad().copy()
         strong, strong_selector = self.strong_set(lseq[0], lseq[1], grad=grad_solution)
 
         p = self.shape[0]
-
-        rescaled_solutions = scipy.sparse.csr_matrix(self.nonzero.adjoint_map(self.solution) 
-                                                     / scalings)
-
-        objective = [self.loss.smooth_objective(self.solution, 'func')]
-        dfs = [np.sum(self.penalty_structure == UNPENALIZED)]
         retry_counter = 0
 
         all_failing = np.zeros(grad_solution.shape, np.bool)
 
-        for lagrange_new, lagrange_cur in zip(lseq[1:], lseq[:-1]):
+        # the solution at lseq[i] is objective[i], so the
+        # path continues from lseq[len(objective) - 1]
+        start = len(objective) - 1
+        for lagrange_new, lagrange_cur in zip(lseq[start+1:], lseq[start:-1]):
             self.lagrange = lagrange_new
             tol = inner_tol
             active_old = self.active.copy()
             num_tries = 0
-            debug = False
+            kkt_failures = 0
+            solve_debug = False
             coef_stop = True
+
+            # safe are the coordinates of the gap safe rule,
+            # screened also includes those of EDPP
+            safe = np.zeros(grad_solution.shape, np.bool)
+            if self.screening is not None:
+                safe = self.screen(grad=grad_solution)
+            screened = safe.copy()
+            if self.screening == 'EDPP':
+                screened += self.screen_EDPP(lagrange_cur, lagrange_new, 
+                                             grad=grad_solution)
+
             while True:
                 strong, strong_selector = self.strong_set(lagrange_cur, 
                                                           lagrange_new, grad=grad_solution)
+                if self.screening is not None:
+                    strong *= ~screened
+                    strong_selector = selector(strong, strong.shape)
 
-                subproblem_set = self.ever_active + all_failing
+                subproblem_set = self.ever_active * ~screened + all_failing
                 self.final_inv_step, grad, sub_soln, penalty_structure \
                     = self.solve_subproblem(subproblem_set,
                                             lagrange_new,
                                             tol=tol,
                                             start_inv_step=self.final_inv_step,
-                                            debug=debug,
-                                            coef_stop=coef_stop)
+                                            debug=solve_debug,
+                                            coef_stop=coef_stop,
+                                            telemetry=solver_telemetry)
 
                 p = self.shape[1]
 
@@ -308,17 +737,25 @@ class lasso(object):
                 strong_failing = check_KKT(strong_penalty, strong_grad, strong_soln, lagrange_new) 
 
                 if np.any(strong_failing):
-                    all_failing += strong_selector.adjoint_map(strong_failing)
+                    kkt_failures += 1
+                    all_failing += strong_selector.adjoint_map(strong_failing) != 0
                 else:
                     self.solution[subproblem_set][:] = sub_soln
-                    grad_solution = self.grad()
-                    all_failing = check_KKT(self.penalty, grad_solution, self.solution, lagrange_new)
+                    all_failing, grad_solution = self.check_KKT(lagrange_new)
+                    if self.screening is not None:
+                        safe += self.screen(grad=grad_solution)
+                        all_failing *= ~safe
+                        # EDPP was wrong about these, e.g. as the
+                        # previous solution was not exact
+                        screened = safe + screened * ~all_failing
 
                     if not all_failing.sum():
                         self.ever_active += self.solution != 0
                         break
                     else:
-                        print 'failing:', np.nonzero(all_failing)[0]
+                        if debug:
+                            print 'failing:', np.nonzero(all_failing)[0]
+                        kkt_failures += 1
                         retry_counter += 1
                         self.ever_active += all_failing
 
@@ -330,26 +767,31 @@ class lasso(object):
                     self.solution[~subproblem_set][:] = 0
                     grad_solution = self.grad()
 
-                    debug = True
+                    # print the progress of the subproblem from now on
+                    solve_debug = debug
                     tol = inner_tol
                     #stop
 
-            rescaled_solution = self.nonzero.adjoint_map(self.solution)
-            rescaled_solutions = scipy.sparse.vstack([rescaled_solutions, rescaled_solution])
+            store.append(self.nonzero.adjoint_map(self.solution))
             objective.append(self.loss.smooth_objective(self.solution, mode='func'))
             dfs.append(self.ever_active.shape[0])
-            gc.collect()
 
-            print lagrange_cur / self.lagrange_max, lagrange_new, (self.solution != 0).sum(), 1. - objective[-1] / objective[0], list(self.lagrange_sequence).index(lagrange_new), np.fabs(rescaled_solution).sum()
+            if telemetry is not None:
+                telemetry((len(objective) - 1, lagrange_new,
+                           (self.solution != 0).sum(), self.ever_active.sum(),
+                           strong.sum(), screened.sum(), num_tries, kkt_failures,
+                           objective[-1], clock() - start_time))
 
-        objective = np.array(objective)
-        output = {'devratio': 1 - objective / objective.max(),
-                  'df': dfs,
-                  'lagrange': self.lagrange_sequence,
-                  'scalings': scalings,
-                  'beta':rescaled_solutions.T}
+            if checkpoint is not None and (len(objective) - 1) % checkpoint_every == 0:
+                save_checkpoint(checkpoint, {'lagrange_sequence': lseq,
+                                             'solution': self.solution.copy(),
+                                             'ever_active': self.ever_active.copy(),
+                                             'final_inv_step': self.final_inv_step,
+                                             'objective': objective,
+                                             'dfs': dfs,
+                                             'store': store})
 
-        return output
+        return objective, dfs, store, scalings
 
     # Some common loss factories
 
@@ -361,6 +803,49 @@ class lasso(object):
     def squared_error(cls, X, Y, *args, **keyword_args):
         return cls(squared_error_factory(Y), X, *args, **keyword_args)
 
+# the path solved by lasso.parallel_main, set before the process pool
+# is created so that workers share it with the parent
+_shared = {}
+
+def _single_threaded(path):
+    """
+    Run the group lasso kernels and KKT checks of path on one thread,
+    as in the workers of a process pool, which already use the CPUs.
+    """
+    path.threads = path.KKT_threads = 1
+    if hasattr(path, 'penalty'):
+        path.penalty.threads = 1
+    if hasattr(path, '_kkt_checker'):
+        path._kkt_checker.threads = 1
+
+def _init_worker():
+    """
+    Initializer of the workers of lasso.parallel_main.
+    """
+    _single_threaded(_shared['path'])
+
+def _solve_segment(args):
+    """
+    Solve a segment of a path for lasso.parallel_main.
+    The state of the path is restored afterwards, as a worker
+    may solve several segments.
+    """
+    lagrange_sequence, inner_tol, coarse_steps, coarse_tol = args
+    path = _shared['path']
+    state = (path.solution.copy(), path.ever_active.copy(),
+             path.lagrange_sequence, path.lagrange)
+    try:
+        # a coarse path from lagrange_max to the start of the segment
+        warm_start = coarse_steps > 0
+        if warm_start:
+            path.lagrange_sequence = path.lagrange_max * np.exp(np.linspace(0, np.log(lagrange_sequence[0] / path.lagrange_max), max(coarse_steps, 2)))
+            path.solve_path(inner_tol=coarse_tol)
+        path.lagrange_sequence = lagrange_sequence
+        return path.solve_path(inner_tol=inner_tol, warm_start=warm_start)
+    finally:
+        solution, path.ever_active, path.lagrange_sequence, path.lagrange = state
+        path.solution[:] = solution
+
 class loss_factory(object):
 
     def __init__(self, response):
@@ -369,6 +854,35 @@ class loss_factory(object):
     def __call__(self, X):
         raise NotImplementedError
 
+    def coordinate_descent(self, X, penalty, initial=None):
+        '''
+        A regreg.coordinate.coordinate_descent instance
+        for the loss of self.__call__(X).
+        '''
+        raise NotImplementedError
+
+    def gram(self, G, X):
+        '''
+        The loss of self.__call__(X) computed from
+        G, the Gram matrix of X.
+        '''
+        raise NotImplementedError
+
+    def hessian_bound(self):
+        '''
+        An upper bound on the Hessian of the loss of self.__call__(X)
+        as a function of the linear predictor, used by the
+        gap safe screening rule.
+        '''
+        raise NotImplementedError
+
+    def errors(self, linear_predictor):
+        '''
+        Prediction errors of the columns of linear_predictor
+        for each entry of self.response, used for cross-validation.
+        '''
+        raise NotImplementedError
+
     def get_response(self):
         return self._response
 
@@ -381,12 +895,44 @@ class logistic_factory(loss_factory):
     def __call__(self, X):
         return logistic_loss(X, self.response, coef=0.5)
 
+    def coordinate_descent(self, X, penalty, initial=None):
+        return coordinate_descent.logistic(X, self.response, penalty,
+                                           coef=0.5, initial=initial)
+
+    def hessian_bound(self):
+        # the variance of a Bernoulli is at most 1/4
+        n = self.response.shape[0]
+        return 0.25 / n
+
+    def errors(self, linear_predictor):
+        # binomial deviance
+        Y = self.response.reshape((-1,1))
+        return 2 * (np.logaddexp(0, linear_predictor) - Y * linear_predictor)
+
 class squared_error_factory(loss_factory):
 
     def __call__(self, X):
         n = self.response.shape[0]
         return squared_error(X, self.response, coef=1./n)
 
+    def coordinate_descent(self, X, penalty, initial=None):
+        n = self.response.shape[0]
+        return coordinate_descent.squared_error(X, self.response, penalty,
+                                                coef=1./n, initial=initial)
+
+    def gram(self, G, X):
+        n = self.response.shape[0]
+        XTY = astransform(X).adjoint_map(self.response)
+        return gram_squared_error(G, XTY, np.sum(self.response**2), coef=1./n)
+
+    def hessian_bound(self):
+        n = self.response.shape[0]
+        return 1. / n
+
+    def errors(self, linear_predictor):
+        Y = self.response.reshape((-1,1))
+        return (Y - linear_predictor)**2
+
 
 class nesta(lasso):
 
@@ -412,9 +958,6 @@ class nesta(lasso):
             nesta_loss = atom.smoothed(iq(self.epsilon, self.dual_term, 0, 0))
         loss = smooth_sum([loss, nesta_loss])
 
-        if self.intercept:
-            Xslice.intercept_column = 0
-
         return Xslice, loss
 
     def set_dual_term(self, lagrange, dual_term):
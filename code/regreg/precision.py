@@ -0,0 +1,90 @@
+"""
+The floating point dtype regreg computes in.
+
+By default problems are built and solved in float64. With
+
+    set_default_dtype(np.float32)
+
+or within a ``with precision(np.float32):`` block, the arrays regreg
+allocates (composite coefs, solver buffers, the outputs of the
+proximal maps) are float32, and float64 data handed to an
+affine_transform is cast down to float32 when the transform is
+built, so a problem built and solved in this mode stays in
+float32, halving its memory and bandwidth.
+
+Arrays are never cast up: float32 data in float64 mode is
+left as it is.
+
+Sums of squares and inner products that enter objective values
+and the stopping rules of the solvers are accumulated in float64,
+see sum_squares and inner.
+"""
+
+import numpy as np
+
+_default_dtype = np.dtype(np.float64)
+
+def default_dtype():
+    """
+    The dtype of the arrays regreg allocates.
+    """
+    return _default_dtype
+
+def set_default_dtype(dtype):
+    """
+    Set the dtype of the arrays regreg allocates,
+    np.float32 or np.float64. Returns the previous one.
+    """
+    global _default_dtype
+    dtype = np.dtype(dtype)
+    if dtype not in [np.dtype(np.float32), np.dtype(np.float64)]:
+        raise ValueError('dtype should be float32 or float64')
+    old, _default_dtype = _default_dtype, dtype
+    return old
+
+class precision(object):
+
+    """
+    Context manager setting the default dtype within a block.
+    """
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+
+    def __enter__(self):
+        self.old = set_default_dtype(self.dtype)
+        return self
+
+    def __exit__(self, *exc):
+        set_default_dtype(self.old)
+
+def cast(X):
+    """
+    Cast a floating point ndarray or sparse matrix X down to
+    the default dtype if it is wider. Anything else is returned as is.
+    """
+    dtype = getattr(X, 'dtype', None)
+    if (dtype is not None and dtype.kind == 'f'
+        and dtype.itemsize > _default_dtype.itemsize):
+        return X.astype(_default_dtype)
+    return X
+
+def sum_squares(x):
+    """
+    The sum of squares of the entries of x, accumulated in float64.
+    """
+    x = np.asarray(x)
+    if x.dtype == np.float32:
+        return np.sum(np.square(x), dtype=np.float64)
+    x = x.reshape(-1)
+    return np.dot(x, x)
+
+def inner(x, y):
+    """
+    The sum of the entries of x * y (broadcast if the shapes differ),
+    accumulated in float64.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if x.dtype == np.float32 or y.dtype == np.float32 or x.shape != y.shape:
+        return np.sum(np.multiply(x, y), dtype=np.float64)
+    return np.dot(x.reshape(-1), y.reshape(-1))
@@ -1,5 +1,6 @@
 import numpy as np, sys
 cimport numpy as np
+from cython cimport floating
 
 """
 Implements (expected) linear time projections onto \ell_1 ball as described in
@@ -14,11 +15,14 @@ ctypedef np.int_t DTYPE_int_t
 
 #TODO: Add some documentation to this!
 
+# The projections and soft-thresholding take float32 or float64
+# arrays (the fused type floating) and return arrays of the same
+# dtype; sums are accumulated in double.
 
-def projl1(np.ndarray[DTYPE_float_t, ndim=1]  x, 
-           DTYPE_float_t bound=1.):
+def projl1(np.ndarray[floating, ndim=1]  x, 
+           double bound=1.):
 
-    cdef np.ndarray[DTYPE_float_t, ndim=1] sorted_x = np.sort(np.fabs(x))
+    cdef np.ndarray[floating, ndim=1] sorted_x = np.sort(np.fabs(x))
     cdef int p = x.shape[0]
     
     cdef double csum = 0.
@@ -33,13 +37,17 @@ def projl1(np.ndarray[DTYPE_float_t, ndim=1]  x,
     if stop:
         cut = next + (csum - (i+1)*next - bound)/(i)
         return soft_threshold(x,cut)
+    elif csum > bound:
+        # the cut is below the smallest entry
+        cut = (csum - bound) / p
+        return soft_threshold(x,cut)
     else:
         return x
 
                                                             
 
-def projl1_2(np.ndarray[DTYPE_float_t, ndim=1]  x, 
-             DTYPE_float_t bound=1.):
+def projl1_2(np.ndarray[floating, ndim=1]  x, 
+             double bound=1.):
 
 
 
@@ -47,12 +55,12 @@ def projl1_2(np.ndarray[DTYPE_float_t, ndim=1]  x,
     cdef np.ndarray[DTYPE_int_t, ndim=2] U = np.empty((3,p),dtype=int)
     cdef int lenU = p
     cdef int Urow = 0
-    cdef DTYPE_float_t s = 0
-    cdef DTYPE_float_t rho = 0
+    cdef double s = 0
+    cdef double rho = 0
 
 
     cdef int u, k, i, kind, Grow, Lrow, Gcol, Lcol, first
-    cdef DTYPE_float_t xu, xk, ds, drho, eta
+    cdef double xu, xk, ds, drho, eta
 
     first = 1
     while lenU:
@@ -117,12 +125,12 @@ def projl1_2(np.ndarray[DTYPE_float_t, ndim=1]  x,
     return soft_threshold(x, eta)
         
 
-cdef soft_threshold(np.ndarray[DTYPE_float_t, ndim=1] x,
-                    DTYPE_float_t lagrange):
+cdef soft_threshold(np.ndarray[floating, ndim=1] x,
+                    double lagrange):
 
     cdef int p = x.shape[0]
-    cdef np.ndarray[DTYPE_float_t, ndim=1] y = np.empty(p)
-    cdef DTYPE_float_t xi
+    cdef np.ndarray[floating, ndim=1] y = np.empty(p, x.dtype)
+    cdef double xi
     cdef int i
     for i in range(p):
         xi = x[i]
@@ -25,6 +25,10 @@ def projl1(x,
     if stop:
         cut = next + (csum - (i+1)*next - bound)/(i)
         return np.sign(x) * np.maximum(np.fabs(x)-cut,0.)
+    elif csum > bound:
+        # the cut is below the smallest entry
+        cut = (csum - bound) / p
+        return np.sign(x) * np.maximum(np.fabs(x)-cut,0.)
     else:
         return x
 
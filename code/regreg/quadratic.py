@@ -5,11 +5,12 @@ try:
 except ImportError:
     warnings.warn('cannot import some cholesky solvers from scipy')
 
-from .affine import affine_transform
+from .affine import affine_transform, astransform
 from .smooth import smooth_atom
 from .composite import smooth_conjugate
 from .cones import zero
 from .identity_quadratic import identity_quadratic
+from .precision import sum_squares, inner
 
 class quadratic(smooth_atom):
     """
@@ -50,30 +51,48 @@ class quadratic(smooth_atom):
         x = self.apply_offset(x)
         if self.Q is None:
             if mode == 'both':
-                f, g  = self.scale(np.linalg.norm(x)**2) / 2., self.scale(x)
+                f, g  = self.scale(sum_squares(x)) / 2., self.scale(x)
                 return f, g
             elif mode == 'grad':
                 f, g = None, self.scale(x)
                 return g
             elif mode == 'func':
-                f, g = self.scale(np.linalg.norm(x)**2) / 2., None
+                f, g = self.scale(sum_squares(x)) / 2., None
                 return f
             else:
                 raise ValueError("mode incorrectly specified")
         else:
             if mode == 'both':
-                f, g = self.scale(np.sum(x * self.Q_transform.linear_map(x))) / 2., self.scale(self.Q_transform.linear_map(x))
+                f, g = self.scale(inner(x, self.Q_transform.linear_map(x))) / 2., self.scale(self.Q_transform.linear_map(x))
                 return f, g
             elif mode == 'grad':
                 f, g = None, self.scale(self.Q_transform.linear_map(x))
                 return g
             elif mode == 'func':
-                f, g = self.scale(np.sum(x * self.Q_transform.linear_map(x))) / 2., None
+                f, g = self.scale(inner(x, self.Q_transform.linear_map(x))) / 2., None
                 return f
             else:
                 raise ValueError("mode incorrectly specified")
 
 
+    def conjugate_objective(self, u):
+        """
+        Evaluate the convex conjugate of smooth_objective at u,
+        not including self.quadratic. Only implemented when Q is None.
+        """
+        if self.Q is not None:
+            raise NotImplementedError('conjugate_objective only implemented when Q is None')
+        u = np.asarray(u)
+        if self.coef == 0:
+            if np.any(u != 0):
+                return np.inf
+            value = 0.
+        else:
+            value = np.linalg.norm(u)**2 / (2. * self.coef)
+        if self.offset is not None:
+            value -= np.sum(u * self.offset)
+        return value
+
     def get_conjugate(self, factor=False, as_quadratic=False):
 
         if self.Q is None:
@@ -161,3 +180,146 @@ def squared_error(X, Y, coef=1):
 def signal_approximator(signal, coef=1):
     return quadratic.shift(-signal, coef=coef)
 
+
+class gram_matrix(object):
+
+    '''
+    The Gram matrix :math:`X^TX` of a design X, computed a few
+    columns at a time as they are needed and kept, so that only the
+    columns of the variables that enter a path are ever formed.
+
+    If X has a gram_columns method, as regreg.affine.normalize does,
+    the columns are computed by it, otherwise as
+    :math:`X^T(XE)` for the standard basis vectors E.
+    '''
+
+    def __init__(self, X, size=10):
+        '''
+        Parameters
+        ----------
+        X : ndarray, scipy.sparse or a transform
+            The design.
+
+        size : int
+            Initial number of columns that can be kept, doubled
+            whenever it is reached.
+        '''
+        self.X = X
+        if hasattr(X, 'gram_columns'):
+            self._transform = None
+            p = X.primal_shape[0]
+        else:
+            self._transform = astransform(X)
+            p = self._transform.primal_shape[0]
+        self.primal_shape = (p,)
+        # where each column is kept, -1 if not computed
+        self._position = -np.ones(p, np.int)
+        self._columns = np.zeros((p, size))
+        self._ncol = 0
+
+    def _compute(self, index):
+        if self._transform is None:
+            return self.X.gram_columns(index)
+        basis = np.zeros((self.primal_shape[0], index.shape[0]))
+        basis[index, np.arange(index.shape[0])] = 1
+        transform = self._transform
+        return transform.adjoint_map(transform.linear_map(basis))
+
+    def columns(self, index):
+        """
+        The columns of the Gram matrix in index,
+        an array of indices or a boolean array.
+        """
+        index = np.arange(self.primal_shape[0])[index]
+        new = np.unique(index[self._position[index] < 0])
+        if new.shape[0] > 0:
+            stop = self._ncol + new.shape[0]
+            if stop > self._columns.shape[1]:
+                columns = np.zeros((self.primal_shape[0],
+                                    max(stop, 2 * self._columns.shape[1])))
+                columns[:,:self._ncol] = self._columns[:,:self._ncol]
+                self._columns = columns
+            self._columns[:,self._ncol:stop] = self._compute(new)
+            self._position[new] = np.arange(self._ncol, stop)
+            self._ncol = stop
+        return self._columns[:,self._position[index]]
+
+    def submatrix(self, index):
+        """
+        The Gram matrix of the columns of X in index.
+        """
+        index = np.arange(self.primal_shape[0])[index]
+        return self.columns(index)[index]
+
+    def product(self, beta):
+        """
+        The product of the Gram matrix with beta, using only
+        the columns where beta is nonzero.
+        """
+        nonzero = np.nonzero(beta)[0]
+        return np.dot(self.columns(nonzero), beta[nonzero])
+
+class gram_squared_error(smooth_atom):
+
+    r"""
+    The squared error loss :math:`\frac{C}{2}\|Y-X\beta\|^2_2`
+    computed from :math:`G=X^TX`, :math:`X^TY` and :math:`Y^TY`,
+    so that its value and gradient cost
+    :math:`O(p \cdot \#\{\beta \neq 0\})` rather than :math:`O(np)`.
+
+    G is an ndarray or a gram_matrix.
+    """
+
+    objective_template = r"""\frac{C}{2}\left\|Y - X%(var)s\right\|^2_2"""
+
+    def __init__(self, G, XTY, YTY, coef=1., quadratic=None, initial=None):
+        smooth_atom.__init__(self,
+                             XTY.shape,
+                             coef=coef,
+                             quadratic=quadratic,
+                             initial=initial)
+        self.G = G
+        self.XTY = XTY
+        self.YTY = YTY
+
+    def smooth_objective(self, beta, mode='both', check_feasibility=False):
+        """
+        Evaluate a smooth function and/or its gradient
+
+        if mode == 'both', return both function value and gradient
+        if mode == 'grad', return only the gradient
+        if mode == 'func', return only the function value
+        """
+        if isinstance(self.G, gram_matrix):
+            Gbeta = self.G.product(beta)
+        else:
+            Gbeta = np.dot(self.G, beta)
+        if mode in ['both', 'func']:
+            f = self.scale((np.dot(beta, Gbeta) - 2 * np.dot(beta, self.XTY) + self.YTY) / 2.)
+        if mode in ['both', 'grad']:
+            g = self.scale(Gbeta - self.XTY)
+        if mode == 'both':
+            return f, g
+        elif mode == 'grad':
+            return g
+        elif mode == 'func':
+            return f
+        else:
+            raise ValueError("mode incorrectly specified")
+
+    def restricted(self, index):
+        """
+        The loss as a function of the coefficients in index only,
+        with the others set to 0, with an ndarray Gram matrix,
+        unless index is every coefficient: a gram_matrix is then
+        kept, so its columns are still only computed as needed.
+        """
+        if isinstance(self.G, gram_matrix):
+            p = self.G.primal_shape[0]
+            index = np.arange(p)[index]
+            if np.array_equal(index, np.arange(p)):
+                return gram_squared_error(self.G, self.XTY, self.YTY, coef=self.coef)
+            G = self.G.submatrix(index)
+        else:
+            G = self.G[index][:,index]
+        return gram_squared_error(G, self.XTY[index], self.YTY, coef=self.coef)
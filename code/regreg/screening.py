@@ -0,0 +1,170 @@
+r"""
+Safe screening rules for the penalties of regreg.group_lasso.
+
+A safe rule finds coordinates that are zero at the solution of
+
+.. math::
+
+   \minimize_{\beta} F(X\beta) + \lambda h(\beta)
+
+without solving it, from a ball in :math:`\mathbb{R}^n` known to contain
+the dual optimum :math:`\hat{u} = \nabla F(X\hat{\beta})`. Coordinate
+j of the l1 part is zero if :math:`|X_j^T\hat{u}| < \lambda`, so it is
+enough that this holds on the whole ball. This is the sphere test of
+sphere_test, for a ball with center u and radius r it reads
+
+.. math::
+
+   |X_j^Tu| + r\|X_j\|_2 < \lambda
+
+and similarly for the groups (with :math:`\|X_g\|_2` bounded by the
+Frobenius norm) and the positive part coordinates.
+
+The gap safe rule (Fercoq, Gramfort and Salmon, 2015) takes the ball
+centered at a feasible dual point u of radius
+:math:`\sqrt{2L(P(\beta)-D(u))}`, where :math:`L` bounds the Hessian of
+F and :math:`P(\beta)-D(u)` is a duality gap. It is safe at any
+:math:`\beta` and the ball shrinks to a point as :math:`\beta`
+converges, so more coordinates are discarded as a solver converges.
+The EDPP rule (Wang, Wonka and Ye, 2015) for the squared error
+loss takes a smaller ball built from the solution at a larger
+value of :math:`\lambda`, and is safe only if that solution is exact.
+"""
+
+import numpy as np
+import scipy.sparse
+
+from .affine import normalize, mmap_normalize
+
+def column_norms(X):
+    """
+    Euclidean norms of the columns of X, an ndarray, a scipy.sparse
+    matrix, a regreg.affine.normalize or a regreg.affine.mmap_normalize.
+    Other linear transforms are applied to each standard basis vector.
+    """
+    if isinstance(X, mmap_normalize):
+        return X.column_norms()
+    if isinstance(X, normalize):
+        M = X.M
+        n = M.shape[0]
+        if X.sparseM:
+            sums = np.asarray(M.sum(0)).reshape(-1)
+            sums2 = np.asarray(M.multiply(M).sum(0)).reshape(-1)
+        else:
+            sums = M.sum(0)
+            sums2 = (M**2).sum(0)
+        if X.center:
+            sums2 = np.maximum(sums2 - sums**2 / n, 0)
+        if X.scale:
+            sums2 = sums2 / X.col_stds**2
+        if X.intercept_column is not None and X.center:
+            sums2[X.intercept_column] = n * (X.value if X.scale else 1)
+        return np.sqrt(sums2)
+    elif scipy.sparse.issparse(X):
+        return np.sqrt(np.asarray(X.multiply(X).sum(0)).reshape(-1))
+    elif isinstance(X, np.ndarray):
+        return np.sqrt((X**2).sum(0))
+    p = X.primal_shape[0]
+    norms = np.zeros(p)
+    basis = np.zeros(p)
+    for j in range(p):
+        basis[j] = 1
+        norms[j] = np.linalg.norm(X.linear_map(basis))
+        basis[j] = 0
+    return norms
+
+def dual_norm(glasso, grad):
+    r"""
+    The smallest :math:`\lambda` such that :math:`-\text{grad}`
+    is feasible for the dual of glasso with lagrange :math:`\lambda`,
+    ignoring the unpenalized coordinates. The positive part coordinates
+    are those of a nonnegativity constraint, as in the proximal map of
+    glasso, so only :math:`-\text{grad} \leq \lambda` is needed there.
+    """
+    value = 0.
+    if glasso._l1_penalty.shape[0] > 0:
+        value = max(value, np.fabs(grad[glasso._l1_penalty]).max())
+    if glasso._positive_part.shape[0] > 0:
+        value = max(value, -grad[glasso._positive_part].max())
+    grouped = glasso._groups >= 0
+    if np.any(grouped):
+        norms = np.sqrt(np.bincount(glasso._groups[grouped],
+                                    weights=grad[grouped]**2,
+                                    minlength=glasso._weight_array.shape[0]))
+        value = max(value, (norms / glasso._weight_array).max())
+    return value
+
+def sphere_test(glasso, grad, radius, col_norms, lagrange, tol=1.e-8):
+    """
+    Coordinates that are zero at the solution with the given lagrange
+    if the dual optimum lies in the ball with the given radius around
+    a point u, where grad is :math:`X^Tu` and col_norms are the
+    norms of the columns of X. Returns a boolean array,
+    the unpenalized coordinates are never screened.
+
+    The test is made with lagrange reduced by a relative tol, so
+    that round-off does not discard coordinates of active groups,
+    at which the tests hold with equality when the radius is 0.
+    """
+    lagrange = lagrange * (1 - tol)
+    screened = np.zeros(grad.shape, np.bool)
+    l1 = glasso._l1_penalty
+    screened[l1] = np.fabs(grad[l1]) + radius * col_norms[l1] < lagrange
+    pos = glasso._positive_part
+    screened[pos] = -grad[pos] + radius * col_norms[pos] < lagrange
+    grouped = glasso._groups >= 0
+    if np.any(grouped):
+        groups = glasso._groups[grouped]
+        ngroup = glasso._weight_array.shape[0]
+        norms = np.sqrt(np.bincount(groups, weights=grad[grouped]**2,
+                                    minlength=ngroup))
+        frobenius = np.sqrt(np.bincount(groups, weights=col_norms[grouped]**2,
+                                        minlength=ngroup))
+        inactive = norms + radius * frobenius < lagrange * glasso._weight_array
+        screened[grouped] = inactive[groups]
+    return screened
+
+def gap_safe(glasso, lagrange, grad, gap, hessian_bound, col_norms):
+    """
+    The gap safe rule: coordinates that are zero at the solution,
+    where grad is :math:`X^Tu` for a dual feasible point u
+    with duality gap gap, and hessian_bound bounds the Hessian
+    of the loss as a function of the linear predictor.
+    """
+    radius = np.sqrt(2 * hessian_bound * max(gap, 0))
+    return sphere_test(glasso, grad, radius, col_norms, lagrange)
+
+def EDPP(glasso, lagrange_cur, lagrange_new, residual, grad_residual,
+         response, grad_response, col_norms):
+    r"""
+    The sequential EDPP rule for the squared error loss
+    :math:`\frac{1}{2}\|y-X\beta\|^2_2 + \lambda h(\beta)`:
+    coordinates that are zero at the solution with lagrange_new,
+    given the residual :math:`y-X\hat{\beta}` of the solution
+    with lagrange_cur. grad_residual and grad_response are
+    the products of :math:`X^T` with residual and response.
+    Safe only if the solution with lagrange_cur is exact.
+    """
+    # dual optimum with lagrange_cur
+    theta = residual / lagrange_cur
+    grad_theta = grad_residual / lagrange_cur
+
+    v1 = response / lagrange_cur - theta
+    grad_v1 = grad_response / lagrange_cur - grad_theta
+    v2 = response / lagrange_new - theta
+    grad_v2 = grad_response / lagrange_new - grad_theta
+
+    # the dual optimum is the projection of response / lagrange_new onto
+    # the dual feasible set, which contains theta, so it lies in the ball
+    # with diameter from theta to response / lagrange_new. As the
+    # feasible set lies on one side of the hyperplane through theta
+    # normal to v1, the ball can be shrunk using the part of v2
+    # orthogonal to v1 (Theorem 16 of Wang, Wonka and Ye)
+    norm_v1 = np.sum(v1**2)
+    if norm_v1 > 0:
+        alpha = np.sum(v1 * v2) / norm_v1
+        v2 = v2 - alpha * v1
+        grad_v2 = grad_v2 - alpha * grad_v1
+    radius = 0.5 * np.linalg.norm(v2)
+    grad_center = grad_theta + 0.5 * grad_v2
+    return sphere_test(glasso, -grad_center, radius, col_norms, 1.)
@@ -12,6 +12,7 @@ from .affine import selector
 from .atoms import atom
 from .simple import simple_problem
 from .cones import zero
+from .precision import default_dtype
 
 def has_overlap(shape, groups):
     """
@@ -62,7 +63,7 @@ class separable(atom):
         self.zero_atom = zero(shape)
 
         if initial is None:
-            self.coefs = np.zeros(shape)
+            self.coefs = np.zeros(shape, default_dtype())
 
     def seminorm(self, x, lagrange=None, check_feasibility=False):
         value = 0.
@@ -17,8 +17,14 @@ def configuration(parent_package='',top_path=None):
     config.add_extension('projl1_cython',
                          sources = ["projl1_cython.c"],
                          )
+    # the grouped kernels run in parallel with OpenMP
     config.add_extension('group_lasso_cython',
                          sources = ["group_lasso_cython.c"],
+                         extra_compile_args = ['-fopenmp'],
+                         extra_link_args = ['-fopenmp'],
+                         )
+    config.add_extension('logistic_cython',
+                         sources = ["logistic_cython.c"],
                          )
     return config
 
@@ -4,14 +4,18 @@ a smooth function and a single penalty.
 
 """
 import numpy as np
+from scipy.special import expit
 
 from .composite import composite
-from .affine import identity, scalar_multiply, astransform, adjoint
+from .affine import identity, scalar_multiply, astransform, adjoint, power_L
 from .atoms import atom
 from .cones import zero as zero_cone
-from .smooth import zero as zero_smooth, sum as smooth_sum, affine_smooth
+from .smooth import (zero as zero_smooth, sum as smooth_sum, affine_smooth,
+                     logistic_deviance)
+from .quadratic import quadratic
 from .identity_quadratic import identity_quadratic
-from .algorithms import FISTA
+from .algorithms import FISTA, batch_FISTA, accepts_out, out_keywords
+from .precision import default_dtype
 
 class simple_problem(composite):
     
@@ -19,23 +23,70 @@ class simple_problem(composite):
         self.smooth_atom = smooth_atom
         self.proximal_atom = proximal_atom
         self.coefs = self.smooth_atom.coefs = self.proximal_atom.coefs
+        # which of the atoms' methods take out (and work) arguments
+        self._smooth_out = accepts_out(smooth_atom.smooth_objective)
+        self._prox_out, self._prox_work = out_keywords(proximal_atom.proximal)
 
-    def smooth_objective(self, x, mode='both', check_feasibility=False):
+    def smooth_objective(self, x, mode='both', check_feasibility=False,
+                         out=None):
         """
         This class explicitly assumes that
         the proximal_atom has 0 for smooth_objective.
+
+        If out is not None, the gradient is stored in out.
         """
+        if out is None or mode == 'func':
+            vs = self.smooth_atom.smooth_objective(x, mode, check_feasibility)
+            return vs
+        if self._smooth_out:
+            return self.smooth_atom.smooth_objective(x, mode, check_feasibility, out=out)
         vs = self.smooth_atom.smooth_objective(x, mode, check_feasibility)
-        return vs
+        if mode == 'both':
+            out[:] = vs[1]
+            return vs[0], out
+        out[:] = vs
+        return out
 
     def nonsmooth_objective(self, x, check_feasibility=False):
         vn = self.proximal_atom.nonsmooth_objective(x, check_feasibility=check_feasibility)
         vs = self.smooth_atom.nonsmooth_objective(x, check_feasibility=check_feasibility)
         return vn + vs + self.quadratic.objective(x, 'func')
 
-    def proximal(self, proxq):
+    def proximal(self, proxq, out=None, work=None):
+        if out is not None and self.smooth_atom.quadratic.iszero and self.quadratic.iszero:
+            # skip the sum of quadratics, which would allocate
+            # new linear terms
+            if self._prox_out:
+                if work is not None and self._prox_work:
+                    self.proximal_atom.proximal(proxq, out=out, work=work)
+                else:
+                    self.proximal_atom.proximal(proxq, out=out)
+                # as proximal_atom.solve would, in an array of the
+                # atom's own: out belongs to the caller
+                atom_coefs = self.proximal_atom.coefs
+                if (atom_coefs is self.coefs or 
+                    not isinstance(atom_coefs, np.ndarray) or
+                    atom_coefs.shape != out.shape or 
+                    not atom_coefs.flags.writeable):
+                    self.proximal_atom.coefs = out.copy()
+                else:
+                    atom_coefs[:] = out
+                return out
         proxq = proxq + self.smooth_atom.quadratic + self.quadratic
-        return self.proximal_atom.solve(proxq)
+        value = self.proximal_atom.solve(proxq)
+        if out is not None:
+            out[:] = value
+            return out
+        return value
+
+    def duality_gap(self, x):
+        """
+        A duality gap at x, see regreg.dual_problem.duality_gap.
+        """
+        from .dual_problem import duality_gap
+        if not self.quadratic.iszero:
+            raise NotImplementedError('duality gap not implemented with a quadratic term')
+        return duality_gap(x, [self.smooth_atom], self.proximal_atom)[0]
 
     @staticmethod
     def smooth(smooth_atom):
@@ -66,9 +117,9 @@ class simple_problem(composite):
             oldq = self.quadratic
 
         solver = FISTA(self)
-        solver.composite.coefs[:] = self.coefs
         solver.fit(**fit_args)
         self.final_inv_step = solver.inv_step
+        self.final_duality_gap = solver.duality_gap
 
         if return_optimum:
             value = (self.objective(self.coefs), self.coefs)
@@ -77,6 +128,269 @@ class simple_problem(composite):
         self.quadratic = oldq
         return value
 
+
+class batch_problem(composite):
+
+    r"""
+    K problems sharing a linear transform, with stacked coefficients.
+    The k-th problem is
+
+    .. math::
+
+       \minimize_{\beta_k} f_k(X\beta_k) + h_k(\beta_k)
+
+    and the coefficients are stored as the columns of an
+    array of shape (p,K). The linear predictor for all K problems is
+    computed with a single matrix-matrix product :math:`XB`, and the
+    gradients with a single :math:`X^TG`.
+
+    If all K problems share one proximal atom whose proximal map acts
+    on each column of a 2D array, the K proximal maps are computed
+    at once, as are the K losses built by the `squared_error` and
+    `logistic` constructors.
+
+    All objective values are returned as arrays of shape (K,).
+    The methods take an optional `columns` argument, an
+    array of column indices, in which case the array arguments hold only
+    those columns. This is used by `regreg.algorithms.batch_FISTA`
+    to drop columns once they have converged.
+    """
+
+    def __init__(self, transform, smooth_atoms, proximal_atom):
+        self.transform = astransform(transform)
+        self.smooth_atoms = list(smooth_atoms)
+        K = len(self.smooth_atoms)
+        if isinstance(proximal_atom, (list, tuple)):
+            if len(proximal_atom) != K:
+                raise ValueError('need one proximal_atom per smooth_atom')
+            self.proximal_atoms = list(proximal_atom)
+            self._shared_atom = None
+        else:
+            self.proximal_atoms = [proximal_atom] * K
+            self._shared_atom = proximal_atom
+        # evaluates all K smooth atoms at once, if not None
+        self._stacked_loss = None
+
+        self.primal_shape = self.transform.primal_shape + (K,)
+        self.dual_shape = self.transform.dual_shape + (K,)
+        self.coefs = np.zeros(self.primal_shape, default_dtype())
+
+        # the quadratics of the smooth atoms live on the linear predictor
+        self._smooth_quadratics = [(k, atom.quadratic) for k, atom in 
+                                   enumerate(self.smooth_atoms) 
+                                   if not atom.quadratic.iszero]
+
+    @property
+    def K(self):
+        return len(self.smooth_atoms)
+
+    def get_lipschitz(self):
+        """
+        A Lipschitz constant for the gradients of all K smooth functions:
+        the largest curvature of the losses times power_L of the transform.
+        Only known for the losses built by `squared_error` and `logistic`,
+        otherwise it must be set.
+        """
+        if not hasattr(self, '_lipschitz'):
+            if self._stacked_loss is None:
+                raise ValueError('no Lipschitz constant known for these smooth atoms, '
+                                 'set the lipschitz attribute or use backtracking')
+            self._lipschitz = power_L(self.transform) * self._stacked_loss.lipschitz
+        return self._lipschitz + self.quadratic.coef
+    lipschitz = property(get_lipschitz, composite.set_lipschitz)
+
+    def _columns(self, columns):
+        if columns is None:
+            return np.arange(self.K)
+        return np.asarray(columns)
+
+    def smooth_objective(self, x, mode='both', check_feasibility=False,
+                         columns=None):
+        """
+        Evaluate the K smooth functions and/or their gradients.
+
+        if mode == 'both', return both function values and gradients
+        if mode == 'grad', return only the gradients
+        if mode == 'func', return only the function values
+        """
+        columns = self._columns(columns)
+        if mode not in ['both', 'func', 'grad']:
+            raise ValueError("mode incorrectly specified")
+
+        eta = self.transform.affine_map(x)
+        if self._stacked_loss is not None:
+            value = self._stacked_loss.smooth_objective(eta, mode, columns)
+            if mode == 'both':
+                f, G = value
+            elif mode == 'grad':
+                G = value
+            else:
+                f = value
+        else:
+            f = np.zeros(columns.shape[0])
+            if mode != 'func':
+                G = np.empty(eta.shape)
+            for i, k in enumerate(columns):
+                atom = self.smooth_atoms[k]
+                if mode == 'both':
+                    f[i], G[:,i] = atom.smooth_objective(eta[:,i], mode='both')
+                elif mode == 'grad':
+                    G[:,i] = atom.smooth_objective(eta[:,i], mode='grad')
+                else:
+                    f[i] = atom.smooth_objective(eta[:,i], mode='func')
+
+        for k, q in self._smooth_quadratics:
+            i = np.nonzero(columns == k)[0]
+            if i.shape[0]:
+                i = i[0]
+                if mode == 'both':
+                    v, g = q.objective(eta[:,i], 'both')
+                    f[i] += v; G[:,i] += g
+                elif mode == 'grad':
+                    G[:,i] += q.objective(eta[:,i], 'grad')
+                else:
+                    f[i] += q.objective(eta[:,i], 'func')
+
+        if mode == 'func':
+            return f
+        g = self.transform.adjoint_map(G)
+        if mode == 'grad':
+            return g
+        return f, g
+
+    def nonsmooth_objective(self, x, check_feasibility=False, columns=None):
+        columns = self._columns(columns)
+        v = np.zeros(columns.shape[0])
+        for i, k in enumerate(columns):
+            v[i] = self.proximal_atoms[k].nonsmooth_objective(x[:,i], 
+                                                              check_feasibility=check_feasibility)
+        if not self.quadratic.iszero:
+            for i in range(columns.shape[0]):
+                v[i] += self.quadratic.objective(x[:,i], 'func')
+        return v
+
+    def objective(self, x, check_feasibility=False, columns=None):
+        return (self.smooth_objective(x, mode='func', columns=columns) + 
+                self.nonsmooth_objective(x, check_feasibility=check_feasibility, 
+                                         columns=columns))
+
+    def proximal(self, proxq, columns=None):
+        """
+        Solve the K proximal problems. The coef of proxq may be
+        an array with one entry per column.
+        """
+        columns = self._columns(columns)
+        coef = np.ones(columns.shape[0]) * proxq.coef
+        center, linear_term = proxq.center, proxq.linear_term
+
+        atom = self._shared_atom
+        if atom is not None and getattr(atom, 'columnwise_prox', False):
+            # all columns at once, with the quadratic of the problem
+            # added to that of each column
+            q = self.quadratic.collapsed()
+            lipschitz = coef + q.coef
+            prox_arg = coef * center - linear_term
+            if q.linear_term is not None:
+                prox_arg -= np.reshape(q.linear_term, (-1,1))
+            prox_arg /= lipschitz
+            if atom.bound is not None:
+                return atom.bound_prox(prox_arg, lipschitz=lipschitz, bound=atom.bound)
+            return atom.lagrange_prox(prox_arg, lipschitz=lipschitz, lagrange=atom.lagrange)
+
+        output = np.empty(self.transform.primal_shape + (columns.shape[0],))
+        for i, k in enumerate(columns):
+            q = identity_quadratic(coef[i], center[:,i], linear_term[:,i], 0)
+            output[:,i] = self.proximal_atoms[k].proximal(q + self.quadratic)
+        return output
+
+    def solve(self, return_optimum=False, **fit_args):
+        solver = batch_FISTA(self)
+        solver.fit(**fit_args)
+        self.final_inv_step = solver.inv_step
+        self.converged = solver.converged
+
+        if return_optimum:
+            return self.objective(self.coefs), self.coefs
+        return self.coefs
+
+    @classmethod
+    def squared_error(cls, X, Y, proximal_atom, coef=1.):
+        r"""
+        One squared error loss :math:`\frac{c}{2}\|Y_k-X\beta_k\|^2_2` per column of Y.
+        """
+        Y = np.asarray(Y)
+        smooth_atoms = [quadratic.shift(-Y[:,k], coef=coef) for k in range(Y.shape[1])]
+        problem = cls(X, smooth_atoms, proximal_atom)
+        problem._stacked_loss = _stacked_squared_error(Y, coef)
+        return problem
+
+    @classmethod
+    def logistic(cls, X, Y, proximal_atom, trials=None, coef=1.):
+        """
+        One logistic loss per column of the binary (or count) 
+        response Y, scaled by coef/n as in `regreg.smooth.logistic_loss`.
+        """
+        Y = np.asarray(Y)
+        n = Y.shape[0]
+        smooth_atoms = []
+        for k in range(Y.shape[1]):
+            if trials is not None:
+                trials_k = np.asarray(trials)[:,k]
+            else:
+                trials_k = None
+            smooth_atoms.append(logistic_deviance(Y[:,k].shape, Y[:,k],
+                                                  trials=trials_k,
+                                                  coef=coef/n))
+        problem = cls(X, smooth_atoms, proximal_atom)
+        if trials is None:
+            trials = np.ones(Y.shape)
+        problem._stacked_loss = _stacked_logistic(Y, np.asarray(trials), coef/n)
+        return problem
+
+
+class _stacked_squared_error(object):
+    """
+    The smooth atoms of `batch_problem.squared_error`
+    evaluated on all columns of the linear predictor.
+    """
+
+    def __init__(self, Y, coef):
+        self.Y, self.coef = Y, coef
+        self.lipschitz = coef
+
+    def smooth_objective(self, eta, mode, columns):
+        r = eta - self.Y[:,columns]
+        if mode == 'grad':
+            return self.coef * r
+        f = 0.5 * self.coef * (r**2).sum(0)
+        if mode == 'func':
+            return f
+        return f, self.coef * r
+
+
+class _stacked_logistic(object):
+    """
+    The smooth atoms of `batch_problem.logistic`
+    evaluated on all columns of the linear predictor.
+    """
+
+    def __init__(self, Y, trials, coef):
+        self.Y, self.trials, self.coef = Y, trials, coef
+        # the second derivative of 2 * coef * trials * log(1+exp(eta))
+        # is at most coef * trials / 2
+        self.lipschitz = 0.5 * coef * trials.max()
+
+    def smooth_objective(self, eta, mode, columns):
+        Y, trials = self.Y[:,columns], self.trials[:,columns]
+        if mode != 'func':
+            G = 2 * self.coef * (trials * expit(eta) - Y)
+            if mode == 'grad':
+                return G
+        f = 2 * self.coef * (trials * np.logaddexp(0, eta) - Y * eta).sum(0)
+        if mode == 'func':
+            return f
+        return f, G
+
     
 def gengrad(simple_problem, L, tol=1.0e-8, max_its=1000, debug=False,
             coef_stop=False):
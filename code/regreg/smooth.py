@@ -1,11 +1,14 @@
 import numpy as np
 from scipy import sparse
+from scipy.special import xlogy
 import warnings
 import inspect
 
 from .composite import smooth as smooth_composite
 from .affine import affine_transform, linear_transform
 from .identity_quadratic import identity_quadratic
+from .precision import default_dtype
+from .logistic_cython import logistic_deviance_terms
 
 class smooth_atom(smooth_composite):
 
@@ -27,7 +30,7 @@ class smooth_atom(smooth_composite):
         self.coef = coef
         if coef < 0:
             raise ValueError('coefs must be nonnegative to ensure convexity (assuming all atoms are indeed convex)')
-        self.coefs = np.zeros(self.primal_shape)
+        self.coefs = np.zeros(self.primal_shape, default_dtype())
 
     def smooth_objective(self, x, mode='both', check_feasibility=False):
         raise NotImplementedError
@@ -86,6 +89,16 @@ class smooth_atom(smooth_composite):
     def get_conjugate(self):
         raise NotImplementedError('each smooth loss should implement its own get_conjugate')
 
+    def conjugate_objective(self, u):
+        """
+        Evaluate the convex conjugate of smooth_objective at u,
+        i.e. :math:`\\sup_x u^Tx - f(x)`, not including self.quadratic.
+        Returns np.inf if u is not in the domain of the conjugate.
+
+        Used to compute duality gaps, see regreg.dual_problem.duality_gap.
+        """
+        raise NotImplementedError('each smooth loss should implement its own conjugate_objective')
+
     @property
     def conjugate(self):
         return self.get_conjugate()
@@ -112,14 +125,100 @@ class affine_smooth(smooth_atom):
     # smooth_obj(*args, **keywords)
     # else, it is assumed to be an instance of smooth_function
  
-    def __init__(self, smooth_atom, atransform, store_grad=True, diag=False):
+    # relative tolerance used to decide that a point lies on the
+    # line through two cached points
+    cache_tol = 1.e-12
+
+    def __init__(self, smooth_atom, atransform, store_grad=True, diag=False,
+                 cache_size=0):
         self.store_grad = store_grad
         self.sm_atom = smooth_atom
         if not isinstance(atransform, affine_transform):
             atransform = linear_transform(atransform, diag=diag)
         self.affine_transform = atransform
         self.primal_shape = atransform.primal_shape
-        self.coefs = np.zeros(self.primal_shape)
+        self.coefs = np.zeros(self.primal_shape, default_dtype())
+        self.cache_size = cache_size
+
+    def get_cache_size(self):
+        return self._cache_size
+
+    def set_cache_size(self, cache_size):
+        """
+        Number of recent points whose linear predictors are kept.
+        A value of 0 disables the cache.
+        """
+        self._cache_size = cache_size
+        self.clear_cache()
+    cache_size = property(get_cache_size, set_cache_size)
+
+    def clear_cache(self):
+        self._predictor_cache = []
+        self.cache_info = {'computed':0,
+                           'repeated':0,
+                           'extrapolated':0}
+
+    @property
+    def matvecs_saved(self):
+        """
+        Number of calls to affine_transform.affine_map avoided by the cache.
+        """
+        return self.cache_info['repeated'] + self.cache_info['extrapolated']
+
+    def linear_predictor(self, x):
+        r"""
+        Return :math:`Dx+\alpha` where :math:`D` is the linear part of 
+        self.affine_transform and :math:`\alpha` its offset.
+
+        If self.cache_size > 0, the values for the most recent points
+        are cached. A repeated point is looked up, and a point of the form
+        :math:`b + w(b-o)` for two cached points :math:`b,o`
+        (such as FISTA's Nesterov extrapolation) is computed by linearity
+        as :math:`(Db+\alpha) + w(Db - Do)`, without applying :math:`D`.
+
+        The returned array may be shared with the cache, so it
+        is marked read-only.
+        """
+        if self._cache_size <= 0:
+            return self.affine_transform.affine_map(x)
+
+        cache = self._predictor_cache
+        x_flat = np.asarray(x).reshape(-1)
+
+        for i, (point, eta) in enumerate(cache):
+            if np.array_equal(point, x_flat):
+                self.cache_info['repeated'] += 1
+                cache.insert(0, cache.pop(i))
+                return eta
+
+        eta = None
+        x_norm = np.linalg.norm(x_flat)
+        for b, eta_b in cache:
+            for o, eta_o in cache:
+                if o is b:
+                    continue
+                d = b - o
+                dd = np.dot(d, d)
+                if dd == 0:
+                    continue
+                w = np.dot(x_flat - b, d) / dd
+                resid = x_flat - b
+                resid -= w * d
+                if np.linalg.norm(resid) <= self.cache_tol * max(x_norm, 1.):
+                    eta = eta_b + w * (eta_b - eta_o)
+                    self.cache_info['extrapolated'] += 1
+                    break
+            if eta is not None:
+                break
+
+        if eta is None:
+            eta = self.affine_transform.affine_map(x)
+            self.cache_info['computed'] += 1
+
+        eta.flags.writeable = False
+        cache.insert(0, (x_flat.copy(), eta))
+        del(cache[self._cache_size:])
+        return eta
 
     def latexify(self, var='x', idx=''):
         obj = self.sm_atom.latexify(var='D_{%s}%s' % (idx, var), idx=idx)
@@ -134,24 +233,42 @@ class affine_smooth(smooth_atom):
         self.sm_atom.coef = coef
     coef = property(_get_coef, _set_coef)
 
-    def smooth_objective(self, x, mode='both', check_feasibility=False):
-        eta = self.affine_transform.affine_map(x)
+    def smooth_objective(self, x, mode='both', check_feasibility=False,
+                         out=None):
+        """
+        Evaluate a smooth function and/or its gradient
+
+        if mode == 'both', return both function value and gradient
+        if mode == 'grad', return only the gradient
+        if mode == 'func', return only the function value
+
+        If out is not None, the gradient is stored in out.
+        """
+        eta = self.linear_predictor(x)
         if mode == 'both':
             v, g = self.sm_atom.smooth_objective(eta, mode='both')
             if self.store_grad:
                 self.grad = g
-            g = self.affine_transform.adjoint_map(g).reshape(self.primal_shape)
+            g = self._adjoint(g, out)
             return v, g
         elif mode == 'grad':
             g = self.sm_atom.smooth_objective(eta, mode='grad')
             if self.store_grad:
                 self.grad = g
-            g = self.affine_transform.adjoint_map(g).reshape(self.primal_shape)
+            g = self._adjoint(g, out)
             return g 
         elif mode == 'func':
             v = self.sm_atom.smooth_objective(eta, mode='func')
             return v 
 
+    def _adjoint(self, g, out=None):
+        if out is None:
+            return self.affine_transform.adjoint_map(g).reshape(self.primal_shape)
+        if out.shape == self.affine_transform.primal_shape:
+            return self.affine_transform.adjoint_map(g, out=out)
+        out[:] = self.affine_transform.adjoint_map(g).reshape(self.primal_shape)
+        return out
+
 #     @property
 #     def composite(self):
 #         initial = np.zeros(self.primal_shape)
@@ -166,10 +283,11 @@ class affine_smooth(smooth_atom):
             return None
 
     def __repr__(self):
-        return ("affine_smooth(%s, %s, store_grad=%s)" % 
+        return ("affine_smooth(%s, %s, store_grad=%s, cache_size=%d)" % 
                 (str(self.sm_atom),
                 str(self.affine_transform),
-                self.store_grad))
+                self.store_grad,
+                self.cache_size))
 
 class zero(smooth_atom):
 
@@ -182,6 +300,11 @@ class zero(smooth_atom):
             return np.zeros(x.shape)
         raise ValueError("Mode not specified correctly")
 
+    def conjugate_objective(self, u):
+        if np.any(u != 0):
+            return np.inf
+        return 0.
+
 class logistic_deviance(smooth_atom):
 
     """
@@ -189,12 +312,16 @@ class logistic_deviance(smooth_atom):
     """
 
     objective_template = r"""\ell^{L}\left(%(var)s\right)"""
+    # relative slack allowed for fitted probabilities
+    # outside [0,1] in conjugate_objective
+    conjugate_tol = 1.e-10
     #TODO: Make init more standard, replace np.dot with shape friendly alternatives in case successes.shape is (n,1)
 
     def __init__(self, primal_shape, successes, 
                  trials=None, coef=1., offset=None,
                  quadratic=None,
-                 initial=None):
+                 initial=None,
+                 weights=None):
 
         smooth_atom.__init__(self,
                              primal_shape,
@@ -220,13 +347,30 @@ class logistic_deviance(smooth_atom):
                 raise ValueError("Response coded as negative number - should be non-negative number of successes")
             self.trials = trials * 1.
 
-        saturated = self.successes / self.trials
-        deviance_terms = np.log(saturated) * self.successes + np.log(1-saturated) * (self.trials - self.successes)
+        # sample weights of the deviance terms, None for 1
+        if weights is not None:
+            weights = np.asarray(weights, np.float)
+            if np.min(weights) < 0:
+                raise ValueError("weights should be non-negative")
+        self.weights = weights
+
+        # the terms are 0 for saturated probabilities of 0 or 1,
+        # and for 0 trials
+        with np.errstate(divide='ignore', invalid='ignore'):
+            saturated = self.successes / self.trials
+            deviance_terms = (xlogy(self.successes, saturated) + 
+                              xlogy(self.trials - self.successes, 1 - saturated))
+        if weights is not None:
+            deviance_terms = deviance_terms * weights
         deviance_constant = -2 * coef * deviance_terms[~np.isnan(deviance_terms)].sum()
 
         devq = identity_quadratic(0,0,0,-deviance_constant)
         self.quadratic += devq
 
+        # contiguous float copies for logistic_deviance_terms
+        self._successes = np.ascontiguousarray(self.successes, np.float).reshape(-1)
+        self._trials = np.ascontiguousarray(self.trials, np.float).reshape(-1)
+
     def smooth_objective(self, x, mode='both', check_feasibility=False):
         """
         Evaluate a smooth function and/or its gradient
@@ -235,47 +379,56 @@ class logistic_deviance(smooth_atom):
         if mode == 'grad', return only the gradient
         if mode == 'func', return only the function value
         """
-        
-        #Check for overflow in np.exp (can occur during initial backtracking steps)
-        x = self.apply_offset(x)
-        if np.max(x) > 1e2:
-            overflow = True
-            not_overflow_ind = np.where(x <= 1e2)[0]
-            exp_x = np.exp(x[not_overflow_ind])
+        if mode not in ['both', 'grad', 'func']:
+            raise ValueError("mode incorrectly specified")
+
+        # the offset is added to x and the deviance and gradient are
+        # computed in one pass by logistic_deviance_terms
+        x = np.asarray(x)
+        if x.dtype not in [np.float32, np.float64]:
+            x = x.astype(np.float)
+        offset = self.offset
+        if offset is not None:
+            offset = np.asarray(offset, x.dtype).reshape(-1)
+        if mode != 'func':
+            g = np.empty(x.shape, x.dtype)
+            grad = g.reshape(-1)
         else:
-            overflow = False
-            exp_x = np.exp(x)
-            
+            grad = None
+        value = logistic_deviance_terms(x.reshape(-1), self._successes, self._trials,
+                                        self.weights, offset, grad,
+                                        int(mode != 'grad'))
+
         if mode == 'both':
-            ratio = self.trials * 1.
-            if overflow:
-                log_exp_x = x * 1.
-                log_exp_x[not_overflow_ind] = np.log(1.+exp_x)
-                ratio[not_overflow_ind] *= exp_x/(1.+exp_x)
-            else:
-                log_exp_x = np.log(1.+exp_x)
-                ratio *= exp_x/(1.+exp_x)
-                
-            f, g = -2 * self.scale((np.dot(self.successes,x) - np.sum(self.trials*log_exp_x))), -2 * self.scale(self.successes-ratio)
-            return f, g
+            g *= 2 * self.coef
+            return self.scale(2 * value), g
         elif mode == 'grad':
-            ratio = self.trials * 1.
-            if overflow:
-                ratio[not_overflow_ind] *= exp_x/(1.+exp_x)
-            else:
-                ratio *= exp_x/(1.+exp_x)
-            f, g = None, - 2 * self.scale(self.successes-ratio)
+            g *= 2 * self.coef
             return g
-        elif mode == 'func':
-            if overflow:
-                log_exp_x = x * 1.
-                log_exp_x[not_overflow_ind] = np.log(1.+exp_x)
-            else:
-                log_exp_x = np.log(1.+exp_x)
-            f, g = -2 * self.scale(np.dot(self.successes,x) - np.sum(self.trials * log_exp_x)), None
-            return f
         else:
-            raise ValueError("mode incorrectly specified")
+            return self.scale(2 * value)
+
+    def conjugate_objective(self, u):
+        """
+        Evaluate the convex conjugate of smooth_objective at u,
+        not including self.quadratic. This is a sum of binary
+        entropies of the fitted probabilities
+        :math:`(u + 2cwy)/(2cwn)`, which must lie in [0,1],
+        with w the weights.
+        """
+        u = np.asarray(u)
+        a = 2. * self.coef
+        if self.weights is not None:
+            a = a * self.weights
+        prob = (u + a * self.successes) / (a * self.trials)
+        if np.any(prob < -self.conjugate_tol) or np.any(prob > 1 + self.conjugate_tol):
+            return np.inf
+        prob = np.clip(prob, 0, 1)
+        value = a * np.sum(self.trials * (xlogy(prob, prob) + 
+                                          xlogy(1 - prob, 1 - prob)))
+        if self.offset is not None:
+            value -= np.sum(u * self.offset)
+        return value
 
 
 class poisson_deviance(smooth_atom):
@@ -416,7 +569,7 @@ class multinomial_deviance(smooth_atom):
             raise ValueError("mode incorrectly specified")
 
 
-def logistic_loss(X, Y, trials=None, coef=1.):
+def logistic_loss(X, Y, trials=None, coef=1., weights=None):
     '''
     Construct a logistic loss function for successes Y and
     affine transform X.
@@ -429,12 +582,16 @@ def logistic_loss(X, Y, trials=None, coef=1.):
 
     Y : ndarray
 
+    weights : ndarray
+        Optional non-negative sample weights.
+
     '''
     n = Y.shape[0]
     loss = affine_smooth(logistic_deviance(Y.shape, 
                                            Y,
                                            coef=coef/n,
-                                           trials=trials), 
+                                           trials=trials,
+                                           weights=weights), 
                          X)
     return loss
 
@@ -4,7 +4,9 @@ matrix completion problems and other low-rank factorization
 problems.
 
 """
-from md5 import md5
+from collections import OrderedDict
+import weakref
+
 import numpy as np
 try:
     from projl1_cython import projl1
@@ -12,8 +14,85 @@ except ImportError:
     from projl1_python import projl1
     
 from atoms import atom, conjugate_seminorm_pairs
+from affine import astransform
+from factored_matrix import block_krylov, low_rank_sparse
 from copy import copy
 
+def frozen(X):
+    """
+    Whether X is an ndarray that cannot be modified in place: neither
+    it nor any array whose memory it views is writeable.
+    """
+    while isinstance(X, np.ndarray):
+        if X.flags.writeable:
+            return False
+        X = X.base
+    return X is None
+
+class svd_cache(object):
+
+    """
+    A least recently used cache of the SVDs of the last few arrays
+    seen by an svd_atom, shared with its conjugate.
+
+    numpy keeps no write counter for an array, so only frozen arrays
+    (see frozen) are cached: an array that cannot be modified in
+    place keeps its SVD, and an entry is keyed on the identity of the
+    array, so looking it up costs O(1). The SVD of a writeable array
+    is never reused. The arrays returned by the proximal maps of the
+    atoms are frozen, so the objective at a proximal step needs no SVD;
+    to have the SVD of an array of your own reused, set
+    X.flags.writeable = False.
+    """
+
+    # number of arrays whose SVD is kept
+    size = 4
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self.computed = 0
+        self.hits = 0
+
+    def get(self, X):
+        """
+        The cached SVD of X, or None.
+        """
+        entry = self._entries.get(id(X))
+        if entry is not None:
+            ref, UDV = entry
+            if ref() is X and frozen(X):
+                # most recently used entries are last
+                del self._entries[id(X)]
+                self._entries[id(X)] = entry
+                self.hits += 1
+                return UDV
+            del self._entries[id(X)]
+
+    def set(self, X, UDV):
+        """
+        Store UDV as the SVD of X, if X is frozen.
+        """
+        if not frozen(X):
+            return
+        self._entries.pop(id(X), None)
+        self._entries[id(X)] = (weakref.ref(X), UDV)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def svd(self, X):
+        """
+        The SVD of X, computed only if it is not cached.
+        """
+        UDV = self.get(X)
+        if UDV is None:
+            UDV = np.linalg.svd(X, full_matrices=0)
+            self.computed += 1
+            self.set(X, UDV)
+        return UDV
+
+    def clear(self):
+        self._entries.clear()
+
 class svd_atom(atom):
     
     _doc_dict = {'linear':r' + \text{Tr}(\eta^T X)',
@@ -22,18 +101,29 @@ class svd_atom(atom):
                  'shape':r'p \times q',
                  'var':r'X'}
     
+    @property
+    def SVD_cache(self):
+        """
+        The svd_cache of the atom, shared with its conjugate.
+        """
+        if not hasattr(self, '_SVD_cache'):
+            self._SVD_cache = svd_cache()
+        return self._SVD_cache
+
     def compute_and_store_svd(self, X):
         """
         Compute and store svd of X for use in multiple function calls.
         """
-        self._md5x = md5(X).hexdigest()
+        X = np.asarray(X)
         self._X = X
         self.SVD = np.linalg.svd(X, full_matrices=0)
+        self.SVD_cache.set(X, self.SVD)
         return self.SVD
 
     def setX(self, X):
-        if not hasattr(self, "_md5x") or md5(X).hexdigest() != self._md5x:
-            self.compute_and_store_svd(X)
+        X = np.asarray(X)
+        self._X = X
+        self.SVD = self.SVD_cache.svd(X)
     def getX(self):
         if hasattr(self, "_X"):
             return self._X
@@ -42,7 +132,8 @@ class svd_atom(atom):
 
     def get_conjugate(self):
         atom.get_conjugate(self)
-        # share the SVD with the conjugate
+        # share the SVD and its cache with the conjugate
+        self._conjugate._SVD_cache = self.SVD_cache
         if hasattr(self, "_X"):
             for attr in ['_X', '_U' ,'_D', '_V']:
                 setattr(self._conjugate, attr, getattr(self, attr))
@@ -125,6 +216,18 @@ class nuclear_norm(svd_atom):
     """
     prox_tol = 1.0e-10
 
+    # If True, lagrange_prox computes only the leading singular
+    # triplets that survive soft-thresholding with block_krylov,
+    # warm started from the previous call, instead of a full SVD.
+    # It always does for a low_rank_sparse X, returning a low_rank_sparse.
+    truncated_prox = False
+    # rank computed at the first call
+    truncated_initial_rank = 10
+    # extra Ritz vectors kept at a restart of block_krylov
+    truncated_extra_rank = 5
+    # relative tolerance of block_krylov in the truncated prox
+    truncated_tol = 1.e-6
+
     objective_template = r"""\|%(var)s\|_*"""
     _doc_dict = copy(svd_atom._doc_dict)
     _doc_dict['objective'] = objective_template % {'var': r'X + A'}
@@ -132,7 +235,7 @@ class nuclear_norm(svd_atom):
     def seminorm(self, X, check_feasibility=False,
                  lagrange=None):
         # This will compute an svd of X
-        # if the md5 hash of X doesn't match.
+        # if it is not in self.SVD_cache.
         lagrange = atom.seminorm(self, X, lagrange=lagrange,
                                  check_feasibility=check_feasibility)
         self.X = X
@@ -142,7 +245,7 @@ class nuclear_norm(svd_atom):
 
     def constraint(self, X, bound=None):
         # This will compute an svd of X
-        # if the md5 hash of X doesn't match.
+        # if it is not in self.SVD_cache.
         bound = atom.constraint(self, X, bound=bound)
         self.X = X
         _, D, _ = self.SVD
@@ -155,17 +258,65 @@ class nuclear_norm(svd_atom):
 
     def lagrange_prox(self, X,  lipschitz=1, lagrange=None):
         lagrange = svd_atom.lagrange_prox(self, X, lipschitz, lagrange)
-        self.X = X
-        U, D, V = self.SVD
+        if self.truncated_prox or isinstance(X, low_rank_sparse):
+            U, D, V = self.truncated_svd(X, lagrange/lipschitz)
+        else:
+            self.X = X
+            U, D, V = self.SVD
         D_soft_thresholded = np.maximum(D - lagrange/lipschitz, 0)
         keepD = D_soft_thresholded > 0
         self.SVD = U[:,keepD], D_soft_thresholded[keepD], V[keepD]
         c = self.conjugate
         c.SVD = self.SVD
+        if isinstance(X, low_rank_sparse):
+            # the result stays factored
+            return low_rank_sparse(*self.SVD)
         self._X = np.dot(U[:,keepD], D_soft_thresholded[keepD][:,np.newaxis] * V[keepD])
+        # frozen and cached, so the objective at the result needs no SVD
+        self._X.flags.writeable = False
+        self.SVD_cache.set(self._X, self.SVD)
         return self.X
     lagrange_prox.__doc__ = svd_atom.lagrange_prox.__doc__ % _doc_dict
 
+    def truncated_svd(self, X, threshold):
+        """
+        The leading singular triplets of X, including all singular
+        values above threshold, computed with block_krylov.
+
+        The rank computed is one more than the rank kept at the
+        previous call (self.truncated_initial_rank at the first call),
+        starting from the previous left singular vectors. It is doubled,
+        keeping the triplets found, until the smallest singular
+        value computed is below threshold. The number of products
+        with X or X^T is stored as self.truncated_matvecs.
+
+        X may be a low_rank_sparse matrix, which is never formed.
+        """
+        if not isinstance(X, low_rank_sparse):
+            X = astransform(X)
+        max_rank = min(X.dual_shape[0], X.primal_shape[0])
+        if hasattr(self, '_kept_rank'):
+            rank = self._kept_rank + 1
+        else:
+            rank = self.truncated_initial_rank
+        engine = block_krylov(X, block_size=rank + self.truncated_extra_rank,
+                              initial=getattr(self, '_prox_U', None))
+        while True:
+            rank = min(rank, max_rank)
+            U, D, V = engine.svd(rank, tol=self.truncated_tol,
+                                 extra_rank=self.truncated_extra_rank)
+            if not D.shape[0] or D.max() == 0: # X is 0
+                U, D, V = (np.zeros((X.dual_shape[0], 0)), np.zeros(0),
+                           np.zeros((0, X.primal_shape[0])))
+                break
+            if D.shape[0] < rank or D.min() <= threshold or rank == max_rank:
+                break
+            rank *= 2
+        self.truncated_matvecs = engine.matvecs
+        self._prox_U = U
+        self._kept_rank = (D > threshold).sum()
+        return U, D, V
+
     def bound_prox(self, X, lipschitz=1, bound=None):
         bound = svd_atom.bound_prox(self, X, lipschitz, bound)
         self.X = X
@@ -177,6 +328,9 @@ class nuclear_norm(svd_atom):
         c = self.conjugate
         c.SVD = self.SVD
         self._X = np.dot(U[:,keepD], D_projected[keepD][:,np.newaxis] * V[keepD])
+        # frozen and cached, so the objective at the result needs no SVD
+        self._X.flags.writeable = False
+        self.SVD_cache.set(self._X, self.SVD)
         return self.X
 
     bound_prox.__doc__ = svd_atom.bound_prox.__doc__ % _doc_dict
@@ -194,7 +348,7 @@ class operator_norm(svd_atom):
 
     def seminorm(self, X, lagrange=None, check_feasibility=False):
         # This will compute an svd of X
-        # if the md5 hash of X doesn't match.
+        # if it is not in self.SVD_cache.
         lagrange = atom.seminorm(self, X, lagrange=lagrange,
                                  check_feasibility=check_feasibility)
         self.X = X
@@ -204,7 +358,7 @@ class operator_norm(svd_atom):
 
     def constraint(self, X, bound=None):
         # This will compute an svd of X
-        # if the md5 hash of X doesn't match.
+        # if it is not in self.SVD_cache.
         bound = atom.constraint(self, X, bound=bound)
         self.X = X
         _, D, _ = self.SVD
@@ -225,6 +379,9 @@ class operator_norm(svd_atom):
         c = self.conjugate
         c.SVD = self.SVD
         self._X = np.dot(U[:,keepD], D_soft_thresholded[keepD][:,np.newaxis] * V[keepD])
+        # frozen and cached, so the objective at the result needs no SVD
+        self._X.flags.writeable = False
+        self.SVD_cache.set(self._X, self.SVD)
         return self.X
     lagrange_prox.__doc__ = svd_atom.lagrange_prox.__doc__ % _doc_dict
 
@@ -0,0 +1,150 @@
+"""
+Per-iteration records of the solvers.
+
+A telemetry sink is any callable taking one record, a tuple
+whose entries are the fields of the solver's dtype below, in order.
+The class recorder stores the records in a numpy structured array,
+the class printer prints them. When a solver is run with debug=True,
+its records are printed.
+
+When no sink is given, the solvers do not time anything, so
+the overhead of the hooks is a few comparisons per iteration.
+"""
+
+import time
+import numpy as np
+
+# FISTA.fit: one record per iteration.
+# restart is 1 if the Nesterov weights were reset before the iteration
+# (on schedule or after the objective increased).
+# smooth_time and prox_time are seconds spent in smooth_objective
+# and proximal_step, time is seconds since the start of the fit.
+
+FISTA_dtype = np.dtype([('iteration', np.int),
+                        ('objective', np.float),
+                        ('inv_step', np.float),
+                        ('backtracks', np.int),
+                        ('restart', np.int8),
+                        ('smooth_time', np.float),
+                        ('prox_time', np.float),
+                        ('time', np.float)])
+
+# batch_FISTA.fit: one record per iteration, summed over the columns
+# still running. backtracks counts the increases of the columns' inv_step,
+# restarts the columns whose Nesterov weights were reset and converged
+# the columns that stopped during the iteration.
+
+batch_FISTA_dtype = np.dtype([('iteration', np.int),
+                              ('active', np.int),
+                              ('max_rel_change', np.float),
+                              ('backtracks', np.int),
+                              ('restarts', np.int),
+                              ('converged', np.int),
+                              ('time', np.float)])
+
+# lasso.main: one record per value of the lagrange sequence.
+# screened is the number of coordinates discarded by the screening rule.
+
+path_dtype = np.dtype([('index', np.int),
+                       ('lagrange', np.float),
+                       ('active', np.int),
+                       ('ever_active', np.int),
+                       ('strong', np.int),
+                       ('screened', np.int),
+                       ('tries', np.int),
+                       ('kkt_failures', np.int),
+                       ('objective', np.float),
+                       ('time', np.float)])
+
+# admm_problem.fit: one record per iteration.
+# beta_time and z_time are seconds spent in solve_beta and solve_z.
+
+ADMM_dtype = np.dtype([('iteration', np.int),
+                       ('coef_change', np.float),
+                       ('rho', np.float),
+                       ('residual_norm', np.float),
+                       ('dual_residual_norm', np.float),
+                       ('beta_time', np.float),
+                       ('z_time', np.float),
+                       ('time', np.float)])
+
+def no_clock():
+    """
+    Stand-in for time.time when telemetry is disabled.
+    """
+    return 0.
+
+def get_clock(sink):
+    """
+    Return time.time if sink is not None, else no_clock.
+    """
+    if sink is None:
+        return no_clock
+    return time.time
+
+class recorder(object):
+
+    """
+    A telemetry sink storing records in a growable
+    numpy structured array.
+
+    >>> import regreg.api as rr
+    >>> telemetry = rr.recorder(rr.FISTA_dtype)
+    >>> solver.fit(telemetry=telemetry) # doctest: +SKIP
+    >>> telemetry.records['objective'] # doctest: +SKIP
+    """
+
+    def __init__(self, dtype, size=100):
+        self.dtype = np.dtype(dtype)
+        self._records = np.zeros(size, self.dtype)
+        self._n = 0
+
+    def __call__(self, record):
+        if self._n == self._records.shape[0]:
+            self._records = np.resize(self._records, 2 * self._n + 1)
+        self._records[self._n] = record
+        self._n += 1
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def records(self):
+        """
+        The records so far, as a structured array.
+        """
+        return self._records[:self._n]
+
+    def clear(self):
+        self._n = 0
+
+class printer(object):
+
+    """
+    A telemetry sink printing each record on one line,
+    then passing it on to sink if it is not None.
+    """
+
+    def __init__(self, dtype, sink=None):
+        self.dtype = np.dtype(dtype)
+        self.sink = sink
+
+    def __call__(self, record):
+        fields = []
+        for name, value in zip(self.dtype.names, record):
+            if self.dtype[name].kind == 'f':
+                fields.append('%s: %.6e' % (name, value))
+            else:
+                fields.append('%s: %d' % (name, value))
+        print '    '.join(fields)
+        if self.sink is not None:
+            self.sink(record)
+
+def debug_sink(sink, dtype, debug):
+    """
+    The sink a solver uses: sink if not debug, otherwise a printer
+    of records of dtype passing them on to sink.
+    """
+    if not debug:
+        return sink
+    return printer(dtype, sink)
@@ -23,6 +23,7 @@ if __name__ == '__main__':
 
     cython_extension("regreg/projl1_cython.pyx")
     cython_extension("regreg/group_lasso_cython.pyx")
+    cython_extension("regreg/logistic_cython.pyx")
     
     from numpy.distutils.core import setup
 
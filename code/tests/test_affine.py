@@ -244,3 +244,48 @@ def test_normalize_intercept():
         Y[:,0] /= (np.linalg.norm(Y[:,0]) / np.sqrt(Y.shape[0]))
         Y *= np.sqrt(value)
         np.testing.assert_allclose(np.dot(Y, [2,4,6]), Xn.linear_map(np.array([2,4,6])))
+
+def test_parallel_transform():
+    """
+    parallel_transform agrees with the matrix it multiplies
+    for sparse and dense matrices, 1D and 2D arguments.
+    """
+    import scipy.sparse
+    X = np.random.standard_normal((50,30))
+    X[X < 0.5] = 0
+    x = np.random.standard_normal(30)
+    u = np.random.standard_normal((50,2))
+    for M in [X, scipy.sparse.csr_matrix(X), scipy.sparse.csc_matrix(X)]:
+        for threads, nblock in [(1, 3), (3, None), (2, 60)]:
+            T = rr.parallel_transform(M, threads=threads, nblock=nblock)
+            assert_array_almost_equal(T.linear_map(x), np.dot(X, x))
+            assert_array_almost_equal(T.adjoint_map(u), np.dot(X.T, u))
+            L = astransform(T)
+            assert_array_almost_equal(L.adjoint_map(u[:,0]), np.dot(X.T, u[:,0]))
+            T.close()
+
+def test_power_L():
+    """
+    power_L bounds the largest squared singular value from above,
+    and its cached value is reused until it is invalidated.
+    """
+    X = np.random.standard_normal((100,40))
+    L = np.linalg.svd(X, compute_uv=False)[0]**2
+    bound = rr.power_L(X, cache=False)
+    assert_true(L <= bound <= 1.05 * L * (1 + 1.e-8))
+    np.testing.assert_allclose(rr.power_L(X, bound=False, cache=False), L, rtol=1.e-6)
+
+    T = rr.linear_transform(X)
+    bound = rr.power_L(T)
+    assert_equal(rr.power_L(T), bound)
+    T.linear_operator *= 2
+    assert_equal(rr.power_L(T), bound)
+    rr.invalidate_lipschitz(T)
+    assert_true(rr.power_L(T) >= 4 * L)
+
+    Xn = rr.normalize(X)
+    Ln = np.linalg.svd(Xn.linear_map(np.identity(40)), compute_uv=False)[0]**2
+    assert_true(Ln <= rr.power_L(Xn) <= 1.05 * Ln * (1 + 1.e-8))
+    Xn.col_stds = Xn.col_stds / 2
+    rr.invalidate_lipschitz(Xn)
+    assert_true(rr.power_L(Xn) >= 4 * Ln)
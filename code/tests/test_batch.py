@@ -0,0 +1,122 @@
+import numpy as np
+import regreg.api as rr
+
+def test_batch_lasso():
+    """
+    Check that batch_FISTA solves each column of a
+    multi-response lasso the same way FISTA solves it alone.
+    """
+    n, p, K = 50, 20, 6
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal((n,K))
+    Y[:,::2] += 3 * X[:,:2].sum(1)[:,np.newaxis]
+
+    penalty = rr.l1norm(p, lagrange=2.)
+    batch = rr.batch_problem.squared_error(X, Y, penalty)
+    B = batch.solve(tol=1.e-12, min_its=20)
+
+    assert B.shape == (p,K)
+    assert np.all(batch.converged)
+    # each column keeps its own step size
+    assert batch.final_inv_step.shape == (K,)
+
+    for k in range(K):
+        loss = rr.squared_error(X, Y[:,k])
+        problem = rr.simple_problem(loss, rr.l1norm(p, lagrange=2.))
+        beta = problem.solve(tol=1.e-12, min_its=20)
+        np.testing.assert_allclose(B[:,k], beta, rtol=1.e-4, atol=1.e-4)
+
+    obj = batch.objective(B)
+    assert obj.shape == (K,)
+
+def test_batch_logistic():
+    """
+    Batched logistic regression with a small l1 penalty
+    compared to one FISTA fit per column.
+    """
+    n, p, K = 100, 10, 4
+    X = np.random.standard_normal((n,p))
+    Y = np.random.binomial(1, 0.5, (n,K))
+
+    penalty = rr.l1norm(p, lagrange=0.01)
+    batch = rr.batch_problem.logistic(X, Y, penalty)
+    B = batch.solve(tol=1.e-12, min_its=20)
+
+    for k in range(K):
+        loss = rr.logistic_loss(X, Y[:,k])
+        problem = rr.simple_problem(loss, rr.l1norm(p, lagrange=0.01))
+        beta = problem.solve(tol=1.e-12, min_its=20)
+        np.testing.assert_allclose(B[:,k], beta, rtol=1.e-3, atol=1.e-3)
+
+def test_batch_columns():
+    """
+    The columns keyword restricts the computation to a subset of the problems.
+    """
+    n, p, K = 30, 8, 5
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal((n,K))
+    batch = rr.batch_problem.squared_error(X, Y, rr.l1norm(p, lagrange=1.))
+    B = np.random.standard_normal((p,K))
+
+    f, g = batch.smooth_objective(B, 'both')
+    cols = np.array([1,3])
+    fc, gc = batch.smooth_objective(B[:,cols], 'both', columns=cols)
+    np.testing.assert_allclose(f[cols], fc)
+    np.testing.assert_allclose(g[:,cols], gc)
+    np.testing.assert_allclose(batch.nonsmooth_objective(B)[cols],
+                               batch.nonsmooth_objective(B[:,cols], columns=cols))
+
+def test_batch_stacked():
+    """
+    The stacked losses and the prox of a shared atom agree
+    with the loops over columns used for a list of atoms.
+    """
+    n, p, K = 40, 8, 3
+    X = np.random.standard_normal((n,p))
+    Y = np.random.binomial(1, 0.5, (n,K))
+    B = np.random.standard_normal((p,K))
+    G = np.random.standard_normal((p,K))
+    proxq = rr.identity_quadratic(np.array([1., 2., 3.]), B, G, 0)
+
+    for constructor in [rr.batch_problem.squared_error, rr.batch_problem.logistic]:
+        shared = constructor(X, Y, rr.l1norm(p, lagrange=0.3))
+        looped = constructor(X, Y, [rr.l1norm(p, lagrange=0.3) for _ in range(K)])
+        looped._stacked_loss = None
+        assert shared._stacked_loss is not None
+
+        f1, g1 = shared.smooth_objective(B, 'both')
+        f2, g2 = looped.smooth_objective(B, 'both')
+        np.testing.assert_allclose(f1, f2)
+        np.testing.assert_allclose(g1, g2)
+        np.testing.assert_allclose(shared.proximal(proxq), looped.proximal(proxq))
+
+def test_batch_lipschitz():
+    """
+    With backtrack=False the step size comes from the Lipschitz constant
+    of the batch problem, which gives the same solutions.
+    """
+    n, p, K = 50, 10, 3
+    X = np.random.standard_normal((n,p))
+    Y = np.random.binomial(1, 0.5, (n,K))
+
+    for constructor, lagrange in [(rr.batch_problem.squared_error, 2.),
+                                  (rr.batch_problem.logistic, 0.01)]:
+        batch = constructor(X, Y, rr.l1norm(p, lagrange=lagrange))
+        B1 = batch.solve(tol=1.e-12, min_its=20).copy()
+        L = batch.lipschitz
+        assert np.isfinite(L) and L > 0
+
+        batch.coefs[:] = 0
+        telemetry = rr.recorder(rr.batch_FISTA_dtype)
+        B2 = batch.solve(tol=1.e-12, min_its=20, backtrack=False, 
+                         telemetry=telemetry)
+        assert np.all(np.isfinite(B2))
+        np.testing.assert_allclose(batch.final_inv_step, L)
+        np.testing.assert_allclose(B1, B2, rtol=1.e-4, atol=1.e-4)
+        assert len(telemetry) > 0
+        assert telemetry.records['backtracks'].sum() == 0
+
+    # no Lipschitz constant is known for a list of arbitrary atoms
+    batch = rr.batch_problem(X, [rr.quadratic.shift(-Y[:,k]) for k in range(K)],
+                             rr.l1norm(p, lagrange=1.))
+    np.testing.assert_raises(ValueError, batch.solve, backtrack=False)
@@ -0,0 +1,109 @@
+import numpy as np
+import scipy.sparse
+
+import regreg.api as rr
+from regreg.coordinate import design_column
+
+def test_design_column():
+    """
+    Columns of a normalized design, with and without
+    an intercept, agree with its linear_map.
+    """
+    n, p = 20, 5
+    X = np.random.standard_normal((n,p))
+    X1 = X.copy(); X1[:,0] = 1
+    for M, M1 in [(X, X1), (scipy.sparse.csc_matrix(X), scipy.sparse.csc_matrix(X1))]:
+        for Xn in [rr.normalize(M),
+                   rr.normalize(M1, intercept_column=0),
+                   rr.normalize(M, center=False),
+                   rr.normalize(M, center=False, value=2.),
+                   rr.normalize(M1, scale=False, intercept_column=0),
+                   rr.normalize(M1, value=2., intercept_column=0)]:
+            for j in range(p):
+                e = np.zeros(p); e[j] = 1
+                np.testing.assert_allclose(design_column(Xn, j), Xn.linear_map(e))
+
+def test_lasso():
+    """
+    Coordinate descent and FISTA agree for squared error
+    with L1, unpenalized, positive part and group penalties.
+    """
+    n, p = 100, 12
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + X[:,0] - X[:,5]
+    penalty_structure = np.array([rr.UNPENALIZED] + [rr.L1_PENALTY] * 4 
+                                 + [rr.POSITIVE_PART] * 3 + [0] * 2 + [1] * 2)
+    Xn = rr.normalize(X)
+
+    for ridge in [0, 0.5]:
+        penalty = rr.group_lasso(penalty_structure, 8.)
+        solver = rr.coordinate_descent.squared_error(Xn, Y, penalty, ridge=ridge)
+        solver.solve(tol=1.e-12)
+
+        loss = rr.squared_error(Xn, Y)
+        penalized = penalty_structure != rr.UNPENALIZED
+        problem = rr.container(loss, penalty, rr.quadratic.linear(rr.selector(penalized, (p,)), coef=ridge))
+        problem.solve(tol=1.e-14, min_its=100)
+
+        np.testing.assert_allclose(solver.objective(), problem.objective(problem.coefs), rtol=1.e-6)
+        np.testing.assert_allclose(solver.coefs, problem.coefs, atol=1.e-4)
+        assert np.all(solver.coefs[5:8] >= 0)
+        np.testing.assert_allclose(solver.linear_predictor, Xn.linear_map(solver.coefs))
+
+def test_logistic_sparse():
+    """
+    Coordinate descent and FISTA agree for logistic loss with
+    a sparse normalized design.
+    """
+    n, p = 200, 10
+    X = scipy.sparse.csc_matrix(np.random.standard_normal((n,p)) * np.random.binomial(1, 0.3, (n,p)))
+    Y = np.random.binomial(1, 0.5, n)
+    Xn = rr.normalize(X, center=False)
+
+    penalty = rr.group_lasso(np.array([rr.L1_PENALTY] * p), 0.05)
+    solver = rr.coordinate_descent.logistic(Xn, Y, penalty)
+    solver.solve(tol=1.e-12)
+
+    problem = rr.simple_problem(rr.logistic_loss(Xn, Y), penalty)
+    problem.solve(tol=1.e-14, min_its=100)
+
+    np.testing.assert_allclose(solver.objective(), problem.objective(problem.coefs), rtol=1.e-6)
+    np.testing.assert_allclose(solver.coefs, problem.coefs, atol=1.e-3)
+
+def test_centered_sparse():
+    """
+    Columns of a centered sparse design are kept sparse with a shift,
+    which gives the same solution as FISTA.
+    """
+    n, p = 200, 10
+    X = np.random.standard_normal((n,p)) * np.random.binomial(1, 0.3, (n,p))
+    X = scipy.sparse.csc_matrix(np.hstack([np.ones((n,1)), X]))
+    Y = np.random.binomial(1, 0.5, n)
+    Xn = rr.normalize(X, intercept_column=0)
+    penalty_structure = np.array([rr.UNPENALIZED] + [rr.L1_PENALTY] * (p-2) + [0] * 2)
+
+    for factory, loss in [(rr.coordinate_descent.squared_error, rr.squared_error(Xn, Y)),
+                          (rr.coordinate_descent.logistic, rr.logistic_loss(Xn, Y))]:
+        penalty = rr.group_lasso(penalty_structure, 0.02)
+        solver = factory(Xn, Y, penalty)
+        solver.solve(tol=1.e-12)
+        np.testing.assert_allclose(solver.linear_predictor, Xn.linear_map(solver.coefs), atol=1.e-10)
+
+        problem = rr.simple_problem(loss, penalty)
+        problem.solve(tol=1.e-14, min_its=100)
+        np.testing.assert_allclose(solver.objective(), problem.objective(problem.coefs), rtol=1.e-6)
+        np.testing.assert_allclose(solver.coefs, problem.coefs, atol=1.e-3)
+
+def test_path():
+    """
+    The lasso path is the same with either solver.
+    """
+    n, p = 100, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 2 * X[:,0]
+
+    path1 = rr.lasso.squared_error(X, Y, nstep=10)
+    beta1 = path1.main(inner_tol=1.e-10)['beta'].toarray()
+    path2 = rr.lasso.squared_error(X, Y, nstep=10, solver='coordinate')
+    beta2 = path2.main(inner_tol=1.e-10)['beta'].toarray()
+    np.testing.assert_allclose(beta1, beta2, atol=1.e-4)
@@ -0,0 +1,76 @@
+import numpy as np
+import scipy.sparse
+
+import regreg.api as rr
+
+def test_fold_moments():
+    """
+    Downdated column moments agree with those computed
+    on the training set.
+    """
+    n, p = 60, 8
+    X = np.random.standard_normal((n,p)) + np.arange(p)
+    Y = np.random.standard_normal(n)
+    for M in [X, scipy.sparse.csr_matrix(X)]:
+        cv = rr.lasso_cv.squared_error(M, Y, nfold=4)
+        for fold in range(4):
+            X_train = X[cv.folds != fold]
+            means, stds = cv.fold_moments(fold)
+            np.testing.assert_allclose(means, X_train.mean(0))
+            np.testing.assert_allclose(stds, X_train.std(0))
+            np.testing.assert_allclose(stds[1:], rr.normalize(X_train).col_stds[1:])
+
+def test_cv():
+    """
+    Cross-validation error of a fold agrees with a refit
+    on the training set, and lagrange_1se >= lagrange_min.
+    """
+    n, p = 100, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 2 * X[:,0]
+
+    cv = rr.lasso_cv.squared_error(X, Y, nfold=5, nstep=10)
+    output = cv.main(inner_tol=1.e-10, processes=1)
+    output2 = cv.main(inner_tol=1.e-10, processes=2)
+    np.testing.assert_allclose(output['cvm'], output2['cvm'])
+    assert output['lagrange_1se'] >= output['lagrange_min']
+    assert output['cvm'].min() == output['cvm'][list(output['lagrange']).index(output['lagrange_min'])]
+
+    test = cv.folds == 0
+    path = rr.lasso.squared_error(X[~test], Y[~test])
+    path.lagrange_sequence = cv.lagrange_sequence
+    beta = path.main(inner_tol=1.e-10)['beta'].toarray()
+    X_test = (X[test] - X[~test].mean(0)) / X[~test].std(0)
+    linear_predictor = beta[0] + np.dot(X_test, beta[1:])
+    np.testing.assert_allclose(output['fold_errors'][0], 
+                               ((Y[test][:,np.newaxis] - linear_predictor)**2).mean(0),
+                               rtol=1.e-4)
+
+def test_logistic_cv():
+    """
+    Logistic cross-validation runs along the whole sequence and
+    the error at the end of the path is below that of the null model.
+    """
+    n, p = 200, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.binomial(1, 1. / (1 + np.exp(-2 * X[:,0])))
+    cv = rr.lasso_cv.logistic(X, Y, nfold=3, nstep=8)
+    output = cv.main(processes=1)
+    assert output['cvm'].shape == (8,)
+    assert output['cvm'][-1] < output['cvm'][0]
+
+def test_lasso_rows():
+    """
+    A path on the rows of the design agrees with a path on
+    a copy of those rows.
+    """
+    n, p = 80, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + X[:,0]
+    rows = np.random.permutation(n)[:50]
+    for M in [X, scipy.sparse.csr_matrix(X)]:
+        path1 = rr.lasso.squared_error(M, Y[rows], rows=rows, nstep=5)
+        path2 = rr.lasso.squared_error(M[rows], Y[rows], nstep=5)
+        beta1 = path1.main(inner_tol=1.e-10)['beta'].toarray()
+        beta2 = path2.main(inner_tol=1.e-10)['beta'].toarray()
+        np.testing.assert_allclose(beta1, beta2, rtol=1.e-5, atol=1.e-8)
@@ -0,0 +1,84 @@
+import numpy as np
+import regreg.api as rr
+from nose.tools import assert_raises
+from regreg.dual_problem import duality_gap
+
+def test_lasso_gap():
+    """
+    The duality gap is nonnegative, vanishes at the solution
+    and the gap stopping rule certifies the solution.
+    """
+    n, p = 100, 30
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 2 * X[:,0]
+
+    loss = rr.squared_error(X, Y)
+    penalty = rr.l1norm(p, lagrange=10.)
+    problem = rr.simple_problem(loss, penalty)
+
+    gap, primal, dual = duality_gap(np.random.standard_normal(p), [loss], penalty)
+    assert gap >= 0
+    np.testing.assert_allclose(gap, primal - dual)
+
+    solver = rr.FISTA(problem)
+    solver.fit(tol=1.e-14, min_its=100)
+    assert np.fabs(problem.duality_gap(problem.coefs)) < 1.e-6
+
+    problem.coefs[:] = 0
+    problem.solve(gap_tol=1.e-8, gap_freq=5)
+    assert problem.final_duality_gap < 1.e-8 * max(1, problem.objective(problem.coefs))
+    assert problem.final_duality_gap >= -1.e-8
+
+def test_logistic_group_lasso_gap():
+    """
+    Duality gap for logistic loss with a group lasso penalty
+    in a container.
+    """
+    n, p = 200, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.binomial(1, 0.5, n)
+    loss = rr.logistic_loss(X, Y)
+
+    groups = np.arange(p) / 4
+    groups[:4] = rr.L1_PENALTY
+    # a fraction of the smallest lagrange with solution 0
+    grad = loss.smooth_objective(np.zeros(p), 'grad')
+    lagrange_max = rr.group_lasso(groups, lagrange=1.).dual_seminorm(grad)
+    penalty = rr.group_lasso(groups, lagrange=0.5 * lagrange_max)
+
+    gap = duality_gap(np.random.standard_normal(p) * 0.1, [loss], penalty)[0]
+    assert gap >= 0
+
+    problem = rr.container(loss, penalty)
+    problem.solve(gap_tol=1.e-7, min_its=20, max_its=5000)
+    assert np.any(problem.coefs != 0)
+    assert problem.final_duality_gap < 1.e-7 * max(1, problem.objective(problem.coefs))
+    assert problem.final_duality_gap >= -1.e-7
+
+def test_gap_not_implemented():
+    """
+    A loss without conjugate_objective fails before FISTA iterates.
+    """
+    n, p = 50, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.poisson(2, n)
+    loss = rr.affine_smooth(rr.poisson_deviance((n,), Y), X)
+    problem = rr.simple_problem(loss, rr.l1norm(p, lagrange=1.))
+    solver = rr.FISTA(problem)
+    assert_raises(NotImplementedError, solver.fit, gap_tol=1.e-7)
+    np.testing.assert_equal(problem.coefs, 0)
+
+def test_bound_gap():
+    """
+    Duality gap for a bound form atom, where the dual
+    point needs no scaling.
+    """
+    n, p = 50, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+    loss = rr.squared_error(X, Y)
+    penalty = rr.l1norm(p, bound=0.5)
+    problem = rr.simple_problem(loss, penalty)
+    problem.solve(tol=1.e-14, min_its=100)
+    gap = problem.duality_gap(problem.coefs)
+    assert np.fabs(gap) < 1.e-6
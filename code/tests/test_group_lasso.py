@@ -52,6 +52,38 @@ def test_group_lasso_atom():
 
     np.testing.assert_allclose(z-a2, x2)
 
+def test_grouped_kernels():
+    """
+    The parallel kernels on the grouped layout agree, bit for bit,
+    with the serial kernels on the group labels.
+    """
+    ps = np.hstack([[-1,-2,-2,-3], np.random.permutation(np.repeat(np.arange(50), 4))])
+    penalty = gl.group_lasso(ps, 1.3)
+    # threads are opt-in
+    assert penalty.threads == 1 and penalty.conjugate.threads == 1
+    special = (penalty._l1_penalty, penalty._unpenalized, penalty._positive_part)
+    grouped = penalty._group_offsets, penalty._group_members, penalty._weight_array
+    serial = penalty._groups, penalty._weight_array
+    for dtype in [np.float64, np.float32]:
+        z = (3 * np.random.standard_normal(ps.shape)).astype(dtype)
+        z[penalty._group_members[:4]] = 0
+        for threads in [1, 3]:
+            np.testing.assert_array_equal(
+                gl.prox_group_lasso_grouped(z, 1.3, 0.7, *(special + grouped), threads=threads),
+                gl.prox_group_lasso(z, 1.3, 0.7, *(special + serial)))
+            np.testing.assert_array_equal(
+                gl.project_group_lasso_grouped(z, 1.3, *(special + grouped), threads=threads),
+                gl.project_group_lasso(z, 1.3, *(special + serial)))
+            np.testing.assert_equal(
+                gl.seminorm_group_lasso_grouped(z, *(special + grouped + (0,)), threads=threads),
+                gl.seminorm_group_lasso(z, *(special + serial + (0,))))
+
+    grad = np.random.standard_normal(ps.shape)
+    solution = np.random.standard_normal(ps.shape) * np.random.binomial(1, 0.5, ps.shape)
+    np.testing.assert_array_equal(
+        gl.check_KKT_group_lasso_grouped(grad, solution, 1.3, *(special + grouped), tol=0.5, threads=3),
+        gl.check_KKT_group_lasso(grad, solution, 1.3, *(special + serial), tol=0.5))
+
 # penalty = rr.separable((100,), [rr.l2norm(idx[g].shape, lagrange=lagrange_g) for g in groups], groups)
 # problem = rr.simple_problem(loss, penalty)
 
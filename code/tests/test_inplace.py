@@ -0,0 +1,119 @@
+import inspect
+import numpy as np
+import regreg.api as rr
+
+def test_inplace_lasso():
+    """
+    FISTA's inplace mode reaches the same solution and
+    updates composite.coefs without rebinding it.
+    """
+    n, p = 100, 50
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 3 * X[:,0]
+
+    solutions = []
+    for inplace in [False, True]:
+        loss = rr.squared_error(X, Y)
+        penalty = rr.l1norm(p, lagrange=4.)
+        problem = rr.simple_problem(loss, penalty)
+        coefs = problem.coefs
+        solver = rr.FISTA(problem)
+        solver.fit(tol=1.e-12, inplace=inplace)
+        solutions.append(problem.coefs.copy())
+        if inplace:
+            assert problem.coefs is coefs
+
+    np.testing.assert_allclose(solutions[0], solutions[1], rtol=1.e-6, atol=1.e-8)
+
+def test_inplace_out():
+    """
+    The out arguments agree with the allocating versions.
+    """
+    n, p = 30, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+    loss = rr.squared_error(X, Y)
+    beta = np.random.standard_normal(p)
+
+    out = np.empty(p)
+    f1, g1 = loss.smooth_objective(beta, 'both')
+    f2, g2 = loss.smooth_objective(beta, 'both', out=out)
+    assert g2 is out
+    np.testing.assert_allclose(f1, f2)
+    np.testing.assert_allclose(g1, g2)
+
+    penalty = rr.l1norm(p, lagrange=0.5)
+    q = rr.identity_quadratic(2., beta, g1, 0)
+    out = np.empty(p)
+    np.testing.assert_allclose(penalty.proximal(q), penalty.proximal(q, out=out))
+
+def test_inplace_container():
+    """
+    Composites without `out` support fall back to copying.
+    """
+    n, p = 50, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+
+    solutions = []
+    for inplace in [False, True]:
+        loss = rr.squared_error(X, Y)
+        penalty = rr.l1norm(p, lagrange=2.)
+        problem = rr.container(loss, penalty)
+        solver = rr.FISTA(problem)
+        solver.fit(tol=1.e-12, inplace=inplace)
+        solutions.append(problem.coefs.copy())
+
+    np.testing.assert_allclose(solutions[0], solutions[1], rtol=1.e-6, atol=1.e-8)
+
+def test_inplace_proximal_atom():
+    """
+    In inplace mode the proximal atom still tracks the iterate
+    and keeps no buffers of its own.
+    """
+    n, p = 50, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+
+    loss = rr.squared_error(X, Y)
+    penalty = rr.l1norm(p, lagrange=2.)
+    problem = rr.simple_problem(loss, penalty)
+    solver = rr.FISTA(problem)
+    solver.fit(tol=1.e-12, inplace=True)
+
+    np.testing.assert_allclose(penalty.coefs, problem.coefs)
+    assert not hasattr(penalty, '_scratch')
+    # the atom's coefs are its own, not one of FISTA's buffers
+    assert not np.may_share_memory(penalty.coefs, problem.coefs)
+
+    x = np.random.standard_normal(p)
+    out, work = np.empty(p), np.empty(p)
+    penalty.lagrange_prox(x, lipschitz=2., out=out, work=work)
+    np.testing.assert_allclose(out, penalty.lagrange_prox(x, lipschitz=2.))
+
+def test_inplace_signatures():
+    """
+    The support for out and work is resolved once per fit,
+    not on every iteration.
+    """
+    n, p = 50, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+    problem = rr.simple_problem(rr.squared_error(X, Y), rr.l1norm(p, lagrange=2.))
+
+    getargspec = inspect.getargspec
+    calls = []
+    def counting(method):
+        calls.append(method)
+        return getargspec(method)
+    inspect.getargspec = counting
+    try:
+        solver = rr.FISTA(problem)
+        solver.fit(tol=1.e-12, min_its=50, inplace=True)
+        first = len(calls)
+        solver.fit(tol=1.e-12, min_its=50, inplace=True)
+    finally:
+        inspect.getargspec = getargspec
+    assert first < 10
+    # only FISTA.fit's own check of smooth_objective is repeated
+    assert len(calls) - first == 1
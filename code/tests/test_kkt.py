@@ -0,0 +1,68 @@
+import numpy as np
+import scipy.sparse
+
+import regreg.api as rr
+from regreg.group_lasso import check_KKT
+from regreg.kkt import kkt_checker
+
+def test_kkt_checker():
+    """
+    The failing set of a kkt_checker agrees with that of check_KKT
+    with the full gradient as u and the solution change, and
+    blocks far from failing are not computed.
+    """
+    n, p = 40, 60
+    X = np.random.standard_normal((n,p)) + 1
+    groups = np.repeat(np.arange(12), 5)
+    groups[:10] = -2 # l1
+    groups[10:15] = -3 # positive part
+    groups[15] = -1 # unpenalized
+    glasso = rr.group_lasso(groups, 1.)
+
+    for design in [X, scipy.sparse.csc_matrix(X),
+                   rr.normalize(X, center=True, scale=True),
+                   rr.normalize(scipy.sparse.csc_matrix(X), center=True, scale=True)]:
+        for threads in [1, 2]:
+            if isinstance(design, rr.normalize):
+                full = design.adjoint_map
+            elif scipy.sparse.issparse(design):
+                full = lambda u: design.T * u
+            else:
+                full = lambda u: np.dot(u, design)
+
+            checker = kkt_checker(glasso, design, block_size=7, threads=threads)
+            u = np.random.standard_normal(n)
+            for i in range(10):
+                # far from the threshold only the first block is needed,
+                # for the active coordinates, after the first check
+                if i < 5:
+                    lagrange = np.fabs(full(u)).max() * 2
+                    solution = np.zeros(p)
+                    solution[:3] = np.random.standard_normal(3)
+                else:
+                    lagrange = np.fabs(full(u)).max() * 0.5
+                    solution = np.zeros(p)
+                    solution[np.random.permutation(p)[:3]] = np.random.standard_normal(3)
+                u += 0.01 * np.random.standard_normal(n)
+                failing, grad = checker.check(u, solution, lagrange)
+                np.testing.assert_array_equal(failing,
+                                              check_KKT(glasso, full(u), solution, lagrange))
+                computed = checker.block_reference[checker.blocks] == max(checker.references.keys())
+                np.testing.assert_allclose(grad[computed], full(u)[computed])
+                if i == 4:
+                    assert checker.blocks_computed < 2 * checker.nblock
+
+def test_incremental_KKT():
+    """
+    The path agrees with and without the incremental KKT check.
+    """
+    n, p = 50, 200
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 2 * X[:,0] - X[:,1]
+    for factory, response in [(rr.lasso.squared_error, Y),
+                              (rr.lasso.logistic, Y > 0)]:
+        beta = factory(X, response, nstep=10).main(inner_tol=1.e-10)['beta'].toarray()
+        path = factory(X, response, nstep=10, incremental_KKT=True)
+        path.KKT_block_size = 30
+        beta_incremental = path.main(inner_tol=1.e-10)['beta'].toarray()
+        np.testing.assert_allclose(beta, beta_incremental, atol=1.e-5)
@@ -1,6 +1,7 @@
 import numpy as np
 from numpy import testing as npt
 from numpy.testing import *
+from numpy.testing import dec
 
 from scipy import sparse
 
@@ -99,3 +100,34 @@ def test_logistic_offset():
 
 
 
+
+def test_logistic_weights():
+    """
+    The deviance and gradient with weights and an offset agree with
+    the direct formulas, do not overflow for large linear predictors,
+    and integer weights are equivalent to repeated observations.
+    """
+    n = 50
+    x = np.random.standard_normal(n) * 500
+    successes = np.random.binomial(1, 0.5, n)
+    weights = np.random.binomial(3, 0.5, n)
+    offset = np.random.standard_normal(n)
+    loss = rr.logistic_deviance((n,), successes, coef=0.3,
+                                weights=weights, offset=offset)
+    eta = x + offset
+    f = 0.6 * np.sum(weights * (np.logaddexp(0, eta) - successes * eta))
+    g = 0.6 * weights * (np.exp(-np.logaddexp(0, -eta)) - successes)
+    value, grad = loss.smooth_objective(x, 'both')
+    npt.assert_allclose(value, f)
+    npt.assert_allclose(grad, g, atol=1.e-12)
+    npt.assert_allclose(loss.smooth_objective(x, 'grad'), g, atol=1.e-12)
+    npt.assert_allclose(loss.smooth_objective(x, 'func'), f)
+
+    X = np.random.standard_normal((n,3))
+    idx = np.repeat(np.arange(n), weights)
+    loss = rr.logistic_loss(X, successes, weights=weights, coef=n)
+    repeated = rr.logistic_loss(X[idx], successes[idx], coef=idx.shape[0])
+    beta = np.random.standard_normal(3)
+    npt.assert_allclose(loss.smooth_objective(beta, 'both')[1],
+                        repeated.smooth_objective(beta, 'both')[1])
+    npt.assert_allclose(loss.objective(beta), repeated.objective(beta))
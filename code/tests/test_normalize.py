@@ -524,3 +524,51 @@ def test_centering_fit_inplace(debug=False):
 
     nt.assert_true(np.linalg.norm(coefs - coefs2) / max(np.linalg.norm(coefs),1) < 1.0e-04)
 
+
+def test_mmap_normalize():
+    """
+    mmap_normalize of a memory-mapped design agrees with normalize
+    of the design with a column of ones for the intercept, and
+    a path on the memory-mapped design agrees with the path in memory.
+    """
+    import os, tempfile
+    from regreg.screening import column_norms
+
+    n, p = 40, 25
+    X = np.random.standard_normal((n,p)) + 1
+    Y = np.random.standard_normal(n) + X[:,0]
+    X1 = np.hstack([np.ones((n,1)), X])
+
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'X.npy')
+    try:
+        np.save(filename, np.asfortranarray(X))
+        Xm = np.load(filename, mmap_mode='r')
+
+        for center, scale in [(True, True), (True, False), (False, True)]:
+            L = rr.normalize(X1, center=center, scale=scale, intercept_column=0)
+            Lm = rr.mmap_normalize(Xm, center=center, scale=scale, intercept=True,
+                                   block_size=7)
+            dense = np.array([L.linear_map(e) for e in np.identity(p+1)]).T
+            beta = np.random.standard_normal(p+1)
+            u = np.random.standard_normal(n)
+            np.testing.assert_allclose(Lm.linear_map(beta), np.dot(dense, beta), atol=1.e-10)
+            np.testing.assert_allclose(Lm.adjoint_map(u), np.dot(dense.T, u), atol=1.e-10)
+            np.testing.assert_allclose(Lm.adjoint_map_columns(u, 5, 16), np.dot(dense.T, u)[5:16], atol=1.e-10)
+            np.testing.assert_allclose(column_norms(Lm), np.sqrt((dense**2).sum(0)), atol=1.e-10)
+
+            columns = np.zeros(p+1, np.bool)
+            columns[[0,3,8,20]] = True
+            Lslice = Lm.slice_columns(columns)
+            Lslice.intercept_column = 0
+            np.testing.assert_allclose(Lslice.linear_map(beta[columns]),
+                                       np.dot(dense[:,columns], beta[columns]), atol=1.e-10)
+
+        beta = rr.lasso.squared_error(X, Y, nstep=8).main(inner_tol=1.e-10)['beta'].toarray()
+        beta_mmap = rr.lasso.squared_error(Xm, Y, nstep=8,
+                                           mmap_block_size=4).main(inner_tol=1.e-10)['beta'].toarray()
+        np.testing.assert_allclose(beta, beta_mmap, atol=1.e-5)
+    finally:
+        del(Xm)
+        os.remove(filename)
+        os.rmdir(tmpdir)
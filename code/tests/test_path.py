@@ -1,4 +1,5 @@
 import numpy as np, regreg.api as rr
+from regreg.paths import _single_threaded
 
 def test_path():
     '''
@@ -81,3 +82,124 @@ def test_path_unpenalized():
 
     np.testing.assert_allclose(beta1, beta2)
     np.testing.assert_allclose(beta2, beta3)
+
+def test_parallel_path():
+    """
+    The parallel path agrees with the serial path.
+    """
+    n, p = 100, 30
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 2 * X[:,0] - X[:,1]
+
+    serial = rr.lasso.squared_error(X, Y, nstep=12).main(inner_tol=1.e-10)
+    for processes in [1, 2]:
+        path = rr.lasso.squared_error(X, Y, nstep=12)
+        parallel = path.parallel_main(inner_tol=1.e-10, nsegment=3,
+                                      processes=processes)
+        np.testing.assert_allclose(serial['lagrange'], parallel['lagrange'])
+        np.testing.assert_allclose(serial['devratio'], parallel['devratio'], atol=1.e-6)
+        np.testing.assert_equal(serial['df'], parallel['df'])
+        np.testing.assert_allclose(serial['beta'].toarray(), parallel['beta'].toarray(), atol=1.e-4)
+        # the segments leave the path as they found it
+        np.testing.assert_equal(path.ever_active, path.penalty_structure == rr.UNPENALIZED)
+
+    # the workers of the pool run the group lasso kernels on one thread
+    path = rr.lasso.squared_error(X, Y, nstep=12)
+    path.threads = path.KKT_threads = 2
+    path.lagrange_max
+    assert path.penalty.threads == 2
+    _single_threaded(path)
+    assert path.threads == path.KKT_threads == path.penalty.threads == 1
+
+def test_slice_columns():
+    '''
+    slice_columns returns the cached design for a repeated set of
+    columns, which agrees with the columns of Xn, for dense and
+    sparse designs.
+    '''
+    import scipy.sparse
+    X = np.random.standard_normal((30,8))
+    X[X < 0.5] = 0
+    Y = np.random.standard_normal(30)
+    for M in [X, scipy.sparse.csr_matrix(X)]:
+        path = rr.lasso.squared_error(M, Y)
+        columns = np.zeros(9, np.bool)
+        columns[[0,2,5]] = True
+        Xslice = path.slice_columns(columns)
+        assert path.slice_columns(columns.copy()) is Xslice
+        assert Xslice.intercept_column == 0
+
+        beta = np.random.standard_normal(3)
+        full = np.zeros(9)
+        full[columns] = beta
+        np.testing.assert_allclose(Xslice.linear_map(beta), path.Xn.linear_map(full))
+
+        other = columns.copy()
+        other[3] = True
+        assert path.slice_columns(other) is not Xslice
+        assert path.slice_columns(columns) is Xslice
+
+def test_checkpoint():
+    '''
+    A path resumed from a checkpoint agrees with the path
+    solved without interruption.
+    '''
+    import os, tempfile
+    n, p = 100, 30
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 2 * X[:,0] - X[:,1]
+
+    tmpdir = tempfile.mkdtemp()
+    checkpoint = os.path.join(tmpdir, 'path.pkl')
+    try:
+        # the last checkpoint is at the 8th of 9 steps
+        full = rr.lasso.squared_error(X, Y, nstep=10).main(inner_tol=1.e-10,
+                                                           checkpoint=checkpoint,
+                                                           checkpoint_every=4)
+        resumed = rr.lasso.squared_error(X, Y, nstep=10).resume(checkpoint, inner_tol=1.e-10)
+        np.testing.assert_allclose(full['lagrange'], resumed['lagrange'])
+        np.testing.assert_allclose(full['devratio'], resumed['devratio'], atol=1.e-6)
+        np.testing.assert_equal(full['df'], resumed['df'])
+        np.testing.assert_allclose(full['beta'].toarray(), resumed['beta'].toarray(), atol=1.e-4)
+    finally:
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        os.rmdir(tmpdir)
+
+def test_gram():
+    '''
+    The Gram matrix of a normalized design agrees with that of the
+    normalized columns, and the path computed from it agrees
+    with the path computed from the design.
+    '''
+    import scipy.sparse
+    from regreg.quadratic import gram_matrix
+    n, p = 100, 20
+    X = np.random.standard_normal((n,p)) + 1
+    X[X < 0.8] = 0
+    Y = np.random.standard_normal(n) + X[:,0]
+    for M in [X, scipy.sparse.csr_matrix(X)]:
+        path = rr.lasso.squared_error(M, Y, nstep=10, gram=True)
+        dense = np.array([path.Xn.linear_map(e) for e in np.identity(p+1)]).T
+        G = gram_matrix(path.Xn)
+        index = np.array([4, 0, 11])
+        np.testing.assert_allclose(G.submatrix(index), np.dot(dense.T, dense)[index][:,index],
+                                   atol=1.e-8)
+
+        # record the candidate sets of the subproblems
+        candidates = np.zeros(p+1, np.bool)
+        restricted_problem = path.restricted_problem
+        def recording(candidate_set, lagrange):
+            value = restricted_problem(candidate_set, lagrange)
+            if not np.all(candidate_set):
+                candidates[candidate_set] = True
+            return value
+        path.restricted_problem = recording
+
+        beta = rr.lasso.squared_error(M, Y, nstep=10).main(inner_tol=1.e-10)['beta'].toarray()
+        beta_gram = path.main(inner_tol=1.e-10)['beta'].toarray()
+        np.testing.assert_allclose(beta, beta_gram, atol=1.e-4)
+        # only the columns of the candidate (strong and ever active)
+        # sets were computed, not those of the full problem
+        assert candidates.sum() < p + 1
+        assert path.gram_matrix._ncol <= candidates.sum()
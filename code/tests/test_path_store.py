@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import scipy.sparse
+
+import regreg.api as rr
+
+def test_path_store():
+    """
+    The stored solutions agree with the dense solutions,
+    in memory and streamed to disk.
+    """
+    solutions = np.random.standard_normal((30, 7))
+    solutions[np.random.binomial(1, 0.7, solutions.shape).astype(np.bool)] = 0
+
+    store = rr.path_store(30, size=2)
+    for solution in solutions.T:
+        store.append(solution)
+    assert len(store) == 7
+    np.testing.assert_allclose(store.finalize().toarray(), solutions)
+
+    store = rr.path_store(30)
+    store.extend(scipy.sparse.csr_matrix(solutions))
+    np.testing.assert_allclose(store.finalize().toarray(), solutions)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        store = rr.path_store(30, filename=os.path.join(tmpdir, 'path'), chunk_size=3)
+        for solution in solutions.T:
+            store.append(solution)
+        filenames = store.finalize()
+        assert len(filenames) == 3
+        np.testing.assert_allclose(rr.path_store.load(filenames).toarray(), solutions)
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_lasso_store():
+    """
+    A lasso path streamed to disk agrees with the path in memory.
+    """
+    n, p = 50, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + X[:,0]
+    beta = rr.lasso.squared_error(X, Y, nstep=8).main(inner_tol=1.e-10)['beta']
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        store = rr.path_store(p+1, filename=os.path.join(tmpdir, 'path'), chunk_size=3)
+        path = rr.lasso.squared_error(X, Y, nstep=8)
+        filenames = path.main(inner_tol=1.e-10, store=store)['beta']
+        np.testing.assert_allclose(rr.path_store.load(filenames).toarray(),
+                                   beta.toarray(), atol=1.e-6)
+    finally:
+        shutil.rmtree(tmpdir)
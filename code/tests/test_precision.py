@@ -0,0 +1,64 @@
+import numpy as np
+import scipy.sparse
+
+import regreg.api as rr
+from regreg.precision import (precision, default_dtype, set_default_dtype,
+                              sum_squares, inner)
+from regreg.atoms import projl1
+
+def test_float32_problems():
+    """
+    Problems built and solved in float32 mode stay in float32
+    and agree with float64 up to float32 precision.
+    """
+    n, p = 100, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + X[:,0]
+    groups = np.repeat(np.arange(4), 5)
+    solutions = {}
+    for dtype in [np.float64, np.float32]:
+        with precision(dtype):
+            loss = rr.squared_error(X, Y)
+            for penalty in [rr.l1norm(p, lagrange=10.),
+                            rr.group_lasso(groups, 10.)]:
+                problem = rr.simple_problem(loss, penalty)
+                for inplace in [False, True]:
+                    problem.coefs[:] = 0
+                    rr.FISTA(problem).fit(tol=1.e-10, inplace=inplace)
+                    assert problem.coefs.dtype == dtype
+                    assert loss.smooth_objective(problem.coefs, 'grad').dtype == dtype
+                    solutions[(dtype, penalty.__class__, inplace)] = (problem.coefs.copy(),
+                                                                      problem.objective(problem.coefs))
+        assert default_dtype() == np.float64
+    for (dtype, cls, inplace), (coefs, value) in solutions.items():
+        coefs64, value64 = solutions[(np.float64, cls, False)]
+        np.testing.assert_allclose(coefs, coefs64, atol=1.e-3)
+        np.testing.assert_allclose(value, value64, rtol=1.e-6)
+
+def test_precision():
+    """
+    The precision helpers: projl1 keeps the dtype of its argument,
+    float32 sums of squares are accumulated in float64.
+    """
+    x = np.random.standard_normal(50)
+    for dtype in [np.float32, np.float64]:
+        xd = x.astype(dtype)
+        assert projl1(xd, 1.).dtype == dtype
+        np.testing.assert_allclose(projl1(xd, 1.), projl1(x, 1.), rtol=1.e-5, atol=1.e-6)
+    x32 = np.ones(10**6, np.float32) * 0.1
+    exact = 10**6 * np.float64(np.float32(0.1))**2
+    assert abs(sum_squares(x32) - exact) < 1.e-6 * exact
+    assert abs(inner(x32, x32) - exact) < 1.e-6 * exact
+    assert inner(np.arange(3.), 0) == 0
+
+    old = set_default_dtype(np.float32)
+    try:
+        T = rr.linear_transform(scipy.sparse.csr_matrix(np.identity(3)))
+        assert T.linear_operator.dtype == np.float32
+        T = rr.linear_transform(np.identity(3, np.float32))
+        assert T.linear_map(np.ones(3, np.float32)).dtype == np.float32
+    finally:
+        set_default_dtype(old)
+    T = rr.linear_transform(np.identity(3, np.float32))
+    assert T.linear_operator.dtype == np.float32
+    np.testing.assert_raises(ValueError, set_default_dtype, np.int32)
@@ -0,0 +1,50 @@
+import numpy as np
+import regreg.api as rr
+
+def test_cache_values():
+    """
+    The cached linear predictor agrees with affine_map for repeated
+    and extrapolated points.
+    """
+    n, p = 40, 15
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+    loss = rr.squared_error(X, Y)
+    loss.cache_size = 4
+
+    b = np.random.standard_normal(p)
+    o = np.random.standard_normal(p)
+    for x in [o, b, b, b + 0.7 * (b - o)]:
+        np.testing.assert_allclose(loss.linear_predictor(x), 
+                                   loss.affine_transform.affine_map(x))
+        f1, g1 = loss.smooth_objective(x, 'both')
+        loss.cache_size, cache_size = 0, loss.cache_size
+        f2, g2 = loss.smooth_objective(x, 'both')
+        loss.cache_size = cache_size
+        np.testing.assert_allclose(f1, f2)
+        np.testing.assert_allclose(g1, g2)
+
+    loss.clear_cache()
+    for x in [o, b, b, b + 0.7 * (b - o)]:
+        loss.linear_predictor(x)
+    assert loss.cache_info == {'computed':2, 'repeated':1, 'extrapolated':1}
+    assert loss.matvecs_saved == 2
+
+def test_cache_FISTA():
+    """
+    FISTA with the cache gives the same solution while
+    saving matrix-vector products.
+    """
+    n, p = 100, 30
+    X = np.random.standard_normal((n,p))
+    Y = np.random.binomial(1, 0.5, n)
+
+    solutions = []
+    for cache_size in [0, 4]:
+        loss = rr.logistic_loss(X, Y)
+        loss.cache_size = cache_size
+        problem = rr.simple_problem(loss, rr.l1norm(p, lagrange=0.02))
+        solutions.append(problem.solve(tol=1.e-10))
+    np.testing.assert_allclose(solutions[0], solutions[1], rtol=1.e-6, atol=1.e-8)
+    assert loss.cache_info['extrapolated'] > 0
+    assert loss.matvecs_saved > 0
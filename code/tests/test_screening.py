@@ -0,0 +1,68 @@
+import numpy as np
+import scipy.sparse
+from nose.tools import assert_raises
+
+import regreg.api as rr
+from regreg.screening import column_norms
+
+def test_column_norms():
+    """
+    Column norms of a normalized design agree with those of the
+    normalized matrix.
+    """
+    n, p = 30, 6
+    X = np.random.standard_normal((n,p)) + 2
+    X[:,0] = 1
+    for center, scale in [(True, True), (True, False), (False, True)]:
+        for M in [X, scipy.sparse.csc_matrix(X)]:
+            Xn = rr.normalize(M, center=center, scale=scale, intercept_column=0)
+            dense = np.array([Xn.linear_map(e) for e in np.identity(p)]).T
+            np.testing.assert_allclose(column_norms(Xn), np.sqrt((dense**2).sum(0)))
+
+def test_screening():
+    """
+    Coordinates screened at each step are zero at the solution,
+    and the paths with and without screening agree.
+    """
+    n, p = 50, 200
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 2 * X[:,0] - X[:,1]
+    penalty_structure = np.repeat(np.arange(40), 5)
+    for factory, structure in [(rr.lasso.squared_error, None),
+                               (rr.lasso.logistic, None),
+                               (rr.lasso.squared_error, penalty_structure)]:
+        if factory == rr.lasso.logistic:
+            response = Y > 0
+        else:
+            response = Y
+        beta = factory(X, response, nstep=10, penalty_structure=structure).main(inner_tol=1.e-10)['beta'].toarray()
+
+        methods = ['gap_safe']
+        if factory == rr.lasso.squared_error:
+            methods.append('EDPP')
+        for screening in methods:
+            path = factory(X, response, nstep=10, penalty_structure=structure,
+                           screening=screening)
+            telemetry = rr.recorder(rr.path_dtype)
+            beta_screened = path.main(inner_tol=1.e-10, telemetry=telemetry)['beta'].toarray()
+            np.testing.assert_allclose(beta, beta_screened, atol=1.e-5)
+            assert telemetry.records['screened'].max() > p / 2
+
+            # gap safe screening from the solution at each lagrange
+            for i, lagrange in enumerate(path.lagrange_sequence):
+                path.lagrange = lagrange
+                path.solution[:] = beta[:,i]
+                screened = path.screen()
+                assert np.all(beta[screened,i] == 0)
+
+def test_screening_arguments():
+    """
+    EDPP needs the squared error loss and screening
+    is not implemented with an elastic net.
+    """
+    X = np.random.standard_normal((20,5))
+    Y = np.random.binomial(1, 0.5, 20)
+    assert_raises(ValueError, rr.lasso.logistic, X, Y, screening='EDPP')
+    assert_raises(ValueError, rr.lasso.squared_error, X, Y, screening='other')
+    assert_raises(ValueError, rr.lasso.squared_error, X, Y, screening='gap_safe',
+                  elastic_net=rr.identity_quadratic(1., 0, 0, 0))
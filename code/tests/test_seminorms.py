@@ -209,3 +209,15 @@ def solveit(atom, Z, W, U, linq, L, FISTA, coef_stop):
     yield ac, d.proximal(q), solver.composite.coefs, 'solving atom prox with separable_atom.singleton %s ' % atom
 
 
+
+def test_projl1():
+    """
+    Projection onto the l1 ball when every entry is shrunk
+    by less than the smallest of them.
+    """
+    from regreg.projl1_cython import projl1
+    from regreg.projl1_python import projl1 as projl1_python
+    x = np.array([1., -1.1, 1.2, -1.3])
+    for proj in [projl1, projl1_python]:
+        np.testing.assert_allclose(proj(x, 2.), [0.35, -0.45, 0.55, -0.65])
+        np.testing.assert_allclose(proj(x, 5.), x)
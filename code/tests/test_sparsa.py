@@ -0,0 +1,47 @@
+import numpy as np
+import regreg.api as rr
+
+def test_lasso():
+    """
+    SpaRSA and FISTA agree on a lasso problem.
+    """
+    n, p = 100, 30
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n) + 3 * X[:,0]
+
+    problem = rr.simple_problem(rr.squared_error(X, Y), rr.l1norm(p, lagrange=10.))
+    rr.FISTA(problem).fit(tol=1.e-12, min_its=50)
+    soln1 = problem.coefs.copy()
+
+    problem.coefs[:] = 0
+    obj = rr.SpaRSA(problem).fit(tol=1.e-12, min_its=50)
+    soln2 = problem.coefs
+
+    np.testing.assert_allclose(problem.objective(soln1), problem.objective(soln2), rtol=1.e-6)
+    np.testing.assert_allclose(soln1, soln2, atol=1.e-4)
+
+def test_logistic():
+    """
+    SpaRSA and FISTA agree on a logistic problem in a container,
+    and with memory=1 the objective is monotone.
+    """
+    n, p = 200, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.binomial(1, 0.5, n)
+
+    loss = rr.logistic_loss(X, Y)
+    # a fraction of the smallest lagrange with solution 0
+    lagrange = 0.3 * np.fabs(loss.smooth_objective(np.zeros(p), 'grad')).max()
+    problem = rr.container(loss, rr.l1norm(p, lagrange=lagrange))
+    rr.FISTA(problem).fit(tol=1.e-12, min_its=50)
+    soln1 = problem.coefs.copy()
+    assert np.any(soln1 != 0)
+
+    problem.coefs[:] = 0
+    telemetry = rr.recorder(rr.FISTA_dtype)
+    rr.SpaRSA(problem).fit(tol=1.e-12, min_its=50, memory=1, telemetry=telemetry)
+    soln2 = problem.coefs
+
+    np.testing.assert_allclose(problem.objective(soln1), problem.objective(soln2), rtol=1.e-6)
+    np.testing.assert_allclose(soln1, soln2, atol=1.e-3)
+    assert np.all(np.diff(telemetry.records['objective']) <= 1.e-10)
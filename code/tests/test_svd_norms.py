@@ -50,3 +50,132 @@ def test_proximal_maps():
         for t in solveit(b, Z, W, U, linq, L, FISTA, coef_stop):
             yield t
 
+
+def test_svd_cache():
+    """
+    The SVD of a frozen array is computed once and shared with the
+    conjugate, that of a writeable array is never reused.
+    """
+    X = np.random.standard_normal((10,6))
+    p = S.nuclear_norm(X.shape, lagrange=1.)
+    d = p.conjugate
+    cache = p.SVD_cache
+    nt.assert_true(d.SVD_cache is cache)
+
+    value = p.seminorm(X)
+    np.testing.assert_allclose(value, np.linalg.svd(X, compute_uv=False).sum())
+    X[1:3,1:3] += 10
+    np.testing.assert_allclose(p.seminorm(X), np.linalg.svd(X, compute_uv=False).sum())
+    nt.assert_equal(cache.computed, 2)
+    nt.assert_equal(cache.hits, 0)
+
+    X.flags.writeable = False
+    value = p.seminorm(X)
+    for _ in range(3):
+        nt.assert_equal(p.seminorm(X), value)
+        p.objective(X)
+        d.constraint(X)
+    nt.assert_equal(cache.computed, 3)
+
+    # the proximal map uses the SVD of X and stores that of its result,
+    # which is frozen
+    Y = p.lagrange_prox(X, lipschitz=1.)
+    nt.assert_false(Y.flags.writeable)
+    p.seminorm(Y)
+    nt.assert_equal(cache.computed, 3)
+
+    # a writeable view of a frozen array is not frozen
+    X.flags.writeable = True
+    nt.assert_false(S.frozen(X[:5]))
+
+    for i in range(2 * cache.size):
+        Z = np.random.standard_normal(X.shape)
+        Z.flags.writeable = False
+        p.seminorm(Z)
+    nt.assert_equal(len(cache._entries), cache.size)
+
+def test_truncated_prox():
+    """
+    The truncated nuclear norm prox agrees with the full one,
+    growing the rank when the initial guess is too small.
+    """
+    n, p, k = 60, 40, 5
+    full = S.nuclear_norm((n,p), lagrange=5.)
+    truncated = S.nuclear_norm((n,p), lagrange=5.)
+    truncated.truncated_prox = True
+    truncated.truncated_initial_rank = 1
+    A = np.random.standard_normal((n,k)) * 10
+    B = np.random.standard_normal((k,p))
+    for i in range(3):
+        X = np.dot(A, B) + np.random.standard_normal((n,p))
+        np.testing.assert_allclose(truncated.lagrange_prox(X, lipschitz=2.),
+                                   full.lagrange_prox(X, lipschitz=2.), atol=1.e-8)
+        nt.assert_equal(truncated._kept_rank, full.SVD[1].shape[0])
+        A += 0.1 * np.random.standard_normal((n,k))
+    np.testing.assert_allclose(truncated.lagrange_prox(np.zeros((n,p))), 0)
+
+def test_matrix_completion():
+    """
+    matrix_completion, with factored iterates, reaches the objective
+    value of proximal gradient on dense iterates.
+    """
+    import scipy.sparse
+    n, p, k, lagrange = 60, 40, 3, 2.
+    M = np.dot(np.random.standard_normal((n,k)), np.random.standard_normal((k,p)))
+    mask = np.random.binomial(1, 0.5, (n,p)).astype(np.bool)
+    rows, cols = np.nonzero(mask)
+    observed = scipy.sparse.coo_matrix((M[mask] + 0.1 * np.random.standard_normal(mask.sum()),
+                                        (rows, cols)), shape=(n,p))
+
+    telemetry = rr.recorder(rr.FISTA_dtype)
+    X = rr.matrix_completion(observed, lagrange, telemetry=telemetry)
+    nt.assert_true(isinstance(X, rr.low_rank_sparse))
+    nt.assert_true(len(telemetry) > 0)
+    v = np.random.standard_normal(p)
+    np.testing.assert_allclose(X.linear_map(v), np.dot(X.X, v))
+    np.testing.assert_allclose(X.entries(rows, cols), X.X[mask])
+    X.entries_chunk = 7
+    np.testing.assert_allclose(X.entries(rows, cols), X.X[mask])
+
+    # sums merge the blocks of factors they share
+    W = X.copy()
+    Z = X + 0.5 * (X - W)
+    nt.assert_equal(Z.rank, 2 * X.rank)
+    np.testing.assert_allclose(Z.X, X.X + 0.5 * (X.X - W.X), atol=1.e-10)
+
+    Y = observed.toarray()
+    Z = np.zeros((n,p))
+    for i in range(2000):
+        U, D, V = np.linalg.svd(Z - mask * (Z - Y), full_matrices=0)
+        Z = np.dot(U * np.maximum(D - lagrange, 0), V)
+    objective = lambda Z: (0.5 * np.sum((mask * (Z - Y))**2) + 
+                           lagrange * np.linalg.svd(Z, compute_uv=0).sum())
+    np.testing.assert_allclose(objective(X.X), objective(Z), rtol=1.e-4)
+
+def test_block_krylov():
+    """
+    block_krylov finds the leading singular triplets, keeping those
+    already found when the rank grows, and counts its matvecs.
+    """
+    from regreg.factored_matrix import block_krylov, block_krylov_svd
+    n, p = 100, 50
+    X = np.random.standard_normal((n,p))
+    U0, D0, VT0 = np.linalg.svd(X, full_matrices=0)
+
+    U, D, VT, matvecs = block_krylov_svd(X, r=3, return_matvecs=True)
+    np.testing.assert_allclose(D, D0[:3])
+    np.testing.assert_allclose(np.dot(U * D, VT), np.dot(U0[:,:3] * D0[:3], VT0[:3]), atol=1.e-6)
+    nt.assert_true(0 < matvecs < 2 * 3 * p)
+
+    engine = block_krylov(X, block_size=3)
+    engine.svd(5)
+    first = engine.matvecs
+    U, D, VT = engine.svd(10)
+    np.testing.assert_allclose(D, D0[:10])
+    np.testing.assert_allclose(engine.svd(5)[1], D0[:5])
+    nt.assert_true(engine.matvecs > first)
+
+    # rank deficient
+    Y = np.dot(X[:,:4], X[:4])
+    U, D, VT = block_krylov_svd(Y, r=10)
+    np.testing.assert_allclose(D, np.linalg.svd(Y, compute_uv=False)[:4])
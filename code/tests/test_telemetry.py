@@ -0,0 +1,92 @@
+import sys
+from StringIO import StringIO
+
+import numpy as np
+import regreg.api as rr
+
+def test_FISTA_telemetry():
+    """
+    One record per iteration, and the same solution
+    with or without telemetry.
+    """
+    n, p = 100, 20
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+
+    loss = rr.squared_error(X, Y)
+    penalty = rr.l1norm(p, lagrange=5.)
+    problem = rr.simple_problem(loss, penalty)
+    soln1 = problem.solve(tol=1.e-10, min_its=20).copy()
+
+    telemetry = rr.recorder(rr.FISTA_dtype, size=5)
+    problem.coefs[:] = 0
+    soln2 = problem.solve(tol=1.e-10, min_its=20, telemetry=telemetry)
+    np.testing.assert_allclose(soln1, soln2)
+
+    records = telemetry.records
+    assert records.dtype == rr.FISTA_dtype
+    assert len(telemetry) >= 20
+    np.testing.assert_equal(records['iteration'], np.arange(len(telemetry)))
+    np.testing.assert_allclose(records['objective'][-1], problem.objective(soln2))
+    assert np.all(records['backtracks'] >= 0)
+    assert np.all(records['smooth_time'] >= 0)
+    assert np.all(records['prox_time'] >= 0)
+    assert np.all(np.diff(records['time']) >= 0)
+
+def test_sink():
+    """
+    Any callable can be a sink.
+    """
+    n, p = 50, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+    problem = rr.simple_problem(rr.squared_error(X, Y), rr.l1norm(p, lagrange=2.))
+
+    sink = []
+    problem.solve(min_its=10, restart=3, telemetry=sink.append)
+    assert len(sink) >= 10
+    assert len(sink[0]) == len(rr.FISTA_dtype.names)
+    assert sum([record[4] for record in sink]) >= 3
+
+def test_path_telemetry():
+    """
+    One record per value of the lagrange sequence after the first.
+    """
+    n, p = 100, 30
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+
+    path = rr.lasso.squared_error(X, Y, nstep=10)
+    telemetry = rr.recorder(rr.path_dtype)
+    solver_telemetry = rr.recorder(rr.FISTA_dtype)
+    path.main(telemetry=telemetry, solver_telemetry=solver_telemetry)
+
+    records = telemetry.records
+    assert records.shape == (len(path.lagrange_sequence) - 1,)
+    np.testing.assert_allclose(records['lagrange'], path.lagrange_sequence[1:])
+    assert np.all(records['active'] <= records['ever_active'])
+
+    # each subproblem fit starts its iterations at 0
+    solver_records = solver_telemetry.records
+    fits = (solver_records['iteration'] == 0).sum()
+    assert fits >= records.shape[0]
+    assert np.all(solver_records['inv_step'] > 0)
+
+def test_printer():
+    """
+    With debug=True, the records are printed and passed on to the sink.
+    """
+    n, p = 50, 10
+    X = np.random.standard_normal((n,p))
+    Y = np.random.standard_normal(n)
+    problem = rr.simple_problem(rr.squared_error(X, Y), rr.l1norm(p, lagrange=2.))
+
+    sink = []
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        problem.solve(min_its=5, max_its=5, debug=True, telemetry=sink.append)
+        out = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    assert len(sink) == 5
+    assert out.count('inv_step: ') == 5
@@ -0,0 +1,57 @@
+"""
+Time the products of a sparse design with scipy and with
+regreg.affine.parallel_transform for several numbers of threads,
+and a FISTA fit of a lasso problem with each.
+
+The speedup is bounded by the number of CPUs, printed first.
+"""
+import time
+from multiprocessing import cpu_count
+
+import numpy as np
+import scipy.sparse
+import regreg.api as rr
+
+def timeit(f, x, repeat=20):
+    f(x)
+    toc = time.time()
+    for _ in range(repeat):
+        f(x)
+    return (time.time() - toc) / repeat
+
+n, p, density = 20000, 50000, 0.002
+nnz = int(n * p * density)
+X = scipy.sparse.coo_matrix((np.random.standard_normal(nnz),
+                             (np.random.randint(0, n, nnz), np.random.randint(0, p, nnz))),
+                            shape=(n, p)).tocsr()
+x = np.random.standard_normal(p)
+u = np.random.standard_normal(n)
+print 'CPUs: %d, design: %d x %d with %d nonzeros' % (cpu_count(), n, p, X.nnz)
+
+print "%-12s %8s %12s %12s" % ('operator', 'threads', 'linear (ms)', 'adjoint (ms)')
+XT = X.T.tocsr()
+print "%-12s %8d %12.3f %12.3f" % ('scipy', 1, 1000 * timeit(lambda v: X * v, x),
+                                    1000 * timeit(lambda v: XT * v, u))
+transforms = {}
+for threads in [1, 2, 4, 8]:
+    T = rr.parallel_transform(X, threads=threads)
+    transforms[threads] = T
+    print "%-12s %8d %12.3f %12.3f" % ('parallel', threads, 1000 * timeit(T.linear_map, x),
+                                        1000 * timeit(T.adjoint_map, u))
+
+beta = np.zeros(p); beta[:20] = 1
+Y = X * beta + np.random.standard_normal(n)
+print "%-12s %8s %12s %8s" % ('fit', 'threads', 'objective', 'secs')
+for name, threads, design in ([('scipy', 1, X)] +
+                              [('parallel', t, transforms[t]) for t in sorted(transforms)]):
+    loss = rr.squared_error(design, Y)
+    lagrange = 0.2 * np.fabs(loss.smooth_objective(np.zeros(p), 'grad')).max()
+    problem = rr.container(loss, rr.l1norm(p, lagrange=lagrange))
+    solver = rr.FISTA(problem)
+    toc = time.time()
+    solver.fit(tol=1.e-8, max_its=200)
+    print "%-12s %8d %12.6e %8.3f" % (name, threads, problem.objective(problem.coefs),
+                                      time.time() - toc)
+
+for T in transforms.values():
+    T.close()
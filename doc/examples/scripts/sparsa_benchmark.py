@@ -0,0 +1,59 @@
+"""
+Compare FISTA and SpaRSA on lasso and l1-penalized logistic regression
+problems with correlated (ill-conditioned) designs, and on
+the independent designs of tests/test_sparsa.py.
+
+The lagrange parameters are a fraction of the smallest value
+for which the solution is 0, so the solutions are not trivial.
+"""
+import time
+import numpy as np
+import regreg.api as rr
+
+def design(n, p, rho=0.9):
+    X = np.random.standard_normal((n,p))
+    # AR(1) correlation between columns
+    for j in range(1, p):
+        X[:,j] = rho * X[:,j-1] + np.sqrt(1 - rho**2) * X[:,j]
+    return X
+
+def lasso_problem(loss, p, fraction):
+    lagrange_max = np.fabs(loss.smooth_objective(np.zeros(p), 'grad')).max()
+    return rr.container(loss, rr.l1norm(p, lagrange=fraction * lagrange_max))
+
+def run(problem, solver_class, **fit_args):
+    problem.coefs[:] = 0
+    solver = solver_class(problem)
+    toc = time.time()
+    objective_hist = solver.fit(**fit_args)
+    elapsed = time.time() - toc
+    return (problem.objective(problem.coefs), (problem.coefs != 0).sum(),
+            len(objective_hist), elapsed)
+
+problems = []
+
+# correlated designs
+n, p = 500, 200
+X = design(n, p)
+beta = np.zeros(p); beta[:10] = 2
+Y = np.dot(X, beta) + np.random.standard_normal(n)
+Z = np.random.binomial(1, 1. / (1 + np.exp(-np.dot(X, beta) / 4)))
+problems.append(('lasso AR1', lasso_problem(rr.squared_error(X, Y), p, 0.1)))
+problems.append(('logit AR1', lasso_problem(rr.logistic_loss(X, Z), p, 0.1)))
+
+# the problems of tests/test_sparsa.py
+n, p = 100, 30
+X = np.random.standard_normal((n,p))
+Y = np.random.standard_normal(n) + 3 * X[:,0]
+problems.append(('lasso test', lasso_problem(rr.squared_error(X, Y), p, 0.3)))
+
+n, p = 200, 20
+X = np.random.standard_normal((n,p))
+Z = np.random.binomial(1, 0.5, n)
+problems.append(('logit test', lasso_problem(rr.logistic_loss(X, Z), p, 0.3)))
+
+print "%-10s %-8s %14s %6s %8s %8s" % ('problem', 'solver', 'objective', 'nnz', 'its', 'secs')
+for name, problem in problems:
+    for solver_class in [rr.FISTA, rr.SpaRSA]:
+        obj, nnz, its, secs = run(problem, solver_class, tol=1.e-10, max_its=5000)
+        print "%-10s %-8s %14.8e %6d %8d %8.3f" % (name, solver_class.__name__, obj, nnz, its, secs)